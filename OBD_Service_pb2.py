@@ -20,7 +20,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   package='',
   syntax='proto3',
   serialized_options=None,
-  serialized_pb=_b('\n\x11OBD_Service.proto\"\x18\n\tStart_OBD\x12\x0b\n\x03MAC\x18\x01 \x01(\t\"\x9d\x01\n\rOBD_CMD_value\x12\x0b\n\x03\x63md\x18\x01 \x01(\t\x12\'\n\x04type\x18\x02 \x01(\x0e\x32\x19.OBD_CMD_value.value_type\x12\x0b\n\x01\x66\x18\x04 \x01(\x02H\x00\x12\x0b\n\x01s\x18\x05 \x01(\tH\x00\x12\x0c\n\x04unit\x18\n \x01(\t\"%\n\nvalue_type\x12\x0c\n\x08Quantity\x10\x00\x12\t\n\x05Other\x10\x01\x42\x07\n\x05value\"s\n\nOBD_Result\x12\x11\n\tconnected\x18\x01 \x01(\x08\x12\x11\n\tengine_on\x18\x02 \x01(\x08\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12\x10\n\x08obd_time\x18\x04 \x01(\t\x12\x1e\n\x06values\x18\x05 \x03(\x0b\x32\x0e.OBD_CMD_value\"\x7f\n\x07OBD_cmd\x12\'\n\x07request\x18\x01 \x01(\x0e\x32\x16.OBD_cmd.RequestResult\x12\x10\n\x08\x63ommands\x18\x02 \x01(\t\x12\r\n\x05rules\x18\x04 \x01(\t\"*\n\rRequestResult\x12\x0b\n\x07\x44\x65\x66\x61ult\x10\x00\x12\x0c\n\x08Specific\x10\x01\"$\n\x11OBD_StatusRequest\x12\x0f\n\x07request\x18\x01 \x01(\t\"\x87\x01\n\nOBD_status\x12\x11\n\tconnected\x18\x01 \x01(\x08\x12\x11\n\tengine_on\x18\x02 \x01(\x08\x12\x13\n\x0b\x61utoconnect\x18\x03 \x01(\x08\x12\r\n\x05state\x18\x07 \x01(\t\x12\x10\n\x08protocol\x18\x04 \x01(\t\x12\x0b\n\x03MAC\x18\x05 \x01(\t\x12\x10\n\x08\x63ommands\x18\x06 \x01(\t2\x9c\x01\n\x0bOBD_Service\x12)\n\x06Status\x12\x12.OBD_StatusRequest\x1a\x0b.OBD_status\x12\"\n\x07\x43onnect\x12\n.Start_OBD\x1a\x0b.OBD_Result\x12\x1f\n\x04Read\x12\x08.OBD_cmd\x1a\x0b.OBD_Result0\x01\x12\x1d\n\x04Stop\x12\x08.OBD_cmd\x1a\x0b.OBD_Resultb\x06proto3')
+  serialized_pb=_b('\n\x11OBD_Service.proto\"*\n\tStart_OBD\x12\x0b\n\x03MAC\x18\x01 \x01(\t\x12\x10\n\x08\x61\x64\x61pters\x18\x02 \x03(\t\"\x9d\x01\n\rOBD_CMD_value\x12\x0b\n\x03\x63md\x18\x01 \x01(\t\x12\'\n\x04type\x18\x02 \x01(\x0e\x32\x19.OBD_CMD_value.value_type\x12\x0b\n\x01\x66\x18\x04 \x01(\x02H\x00\x12\x0b\n\x01s\x18\x05 \x01(\tH\x00\x12\x0c\n\x04unit\x18\n \x01(\t\"%\n\nvalue_type\x12\x0c\n\x08Quantity\x10\x00\x12\t\n\x05Other\x10\x01\x42\x07\n\x05value\",\n\x0cOBD_quantile\x12\r\n\x05level\x18\x01 \x01(\x02\x12\r\n\x05value\x18\x02 \x01(\x02\"\xa5\x01\n\rOBD_CMD_stats\x12\x0b\n\x03\x63md\x18\x01 \x01(\t\x12\x0c\n\x04unit\x18\x02 \x01(\t\x12\r\n\x05\x63ount\x18\x03 \x01(\r\x12\x0b\n\x03min\x18\x04 \x01(\x02\x12\x0b\n\x03max\x18\x05 \x01(\x02\x12\x0c\n\x04mean\x18\x06 \x01(\x02\x12\x10\n\x08variance\x18\x07 \x01(\x02\x12 \n\tquantiles\x18\x08 \x03(\x0b\x32\r.OBD_quantile\x12\x0e\n\x06window\x18\t \x01(\x02\"\xa3\x01\n\nOBD_Result\x12\x11\n\tconnected\x18\x01 \x01(\x08\x12\x11\n\tengine_on\x18\x02 \x01(\x08\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12\x10\n\x08obd_time\x18\x04 \x01(\t\x12\x1e\n\x06values\x18\x05 \x03(\x0b\x32\x0e.OBD_CMD_value\x12\x0f\n\x07\x61\x64\x61pter\x18\x06 \x01(\t\x12\x1d\n\x05stats\x18\x07 \x03(\x0b\x32\x0e.OBD_CMD_stats\"\x90\x01\n\x07OBD_cmd\x12\'\n\x07request\x18\x01 \x01(\x0e\x32\x16.OBD_cmd.RequestResult\x12\x10\n\x08\x63ommands\x18\x02 \x01(\t\x12\r\n\x05rules\x18\x04 \x01(\t\x12\x0f\n\x07\x61\x64\x61pter\x18\x05 \x01(\t\"*\n\rRequestResult\x12\x0b\n\x07\x44\x65\x66\x61ult\x10\x00\x12\x0c\n\x08Specific\x10\x01\"5\n\x11OBD_StatusRequest\x12\x0f\n\x07request\x18\x01 \x01(\t\x12\x0f\n\x07\x61\x64\x61pter\x18\x02 \x01(\t\"\xaa\x01\n\nOBD_status\x12\x11\n\tconnected\x18\x01 \x01(\x08\x12\x11\n\tengine_on\x18\x02 \x01(\x08\x12\x13\n\x0b\x61utoconnect\x18\x03 \x01(\x08\x12\r\n\x05state\x18\x07 \x01(\t\x12\x10\n\x08protocol\x18\x04 \x01(\t\x12\x0b\n\x03MAC\x18\x05 \x01(\t\x12\x10\n\x08\x63ommands\x18\x06 \x01(\t\x12\x0f\n\x07\x61\x64\x61pter\x18\x08 \x01(\t\x12\x10\n\x08\x61\x64\x61pters\x18\t \x03(\t2\x9c\x01\n\x0bOBD_Service\x12)\n\x06Status\x12\x12.OBD_StatusRequest\x1a\x0b.OBD_status\x12\"\n\x07\x43onnect\x12\n.Start_OBD\x1a\x0b.OBD_Result\x12\x1f\n\x04Read\x12\x08.OBD_cmd\x1a\x0b.OBD_Result0\x01\x12\x1d\n\x04Stop\x12\x08.OBD_cmd\x1a\x0b.OBD_Resultb\x06proto3')
 )
 
 
@@ -42,8 +42,8 @@ _OBD_CMD_VALUE_VALUE_TYPE = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=159,
-  serialized_end=196,
+  serialized_start=177,
+  serialized_end=214,
 )
 _sym_db.RegisterEnumDescriptor(_OBD_CMD_VALUE_VALUE_TYPE)
 
@@ -64,8 +64,8 @@ _OBD_CMD_REQUESTRESULT = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=409,
-  serialized_end=451,
+  serialized_start=708,
+  serialized_end=750,
 )
 _sym_db.RegisterEnumDescriptor(_OBD_CMD_REQUESTRESULT)
 
@@ -84,6 +84,13 @@ _START_OBD = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='adapters', full_name='Start_OBD.adapters', index=1,
+      number=2, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
   ],
   extensions=[
   ],
@@ -97,7 +104,7 @@ _START_OBD = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=21,
-  serialized_end=45,
+  serialized_end=63,
 )
 
 
@@ -159,8 +166,133 @@ _OBD_CMD_VALUE = _descriptor.Descriptor(
       name='value', full_name='OBD_CMD_value.value',
       index=0, containing_type=None, fields=[]),
   ],
-  serialized_start=48,
-  serialized_end=205,
+  serialized_start=66,
+  serialized_end=223,
+)
+
+
+_OBD_QUANTILE = _descriptor.Descriptor(
+  name='OBD_quantile',
+  full_name='OBD_quantile',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='level', full_name='OBD_quantile.level', index=0,
+      number=1, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='value', full_name='OBD_quantile.value', index=1,
+      number=2, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=225,
+  serialized_end=269,
+)
+
+
+_OBD_CMD_STATS = _descriptor.Descriptor(
+  name='OBD_CMD_stats',
+  full_name='OBD_CMD_stats',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='cmd', full_name='OBD_CMD_stats.cmd', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='unit', full_name='OBD_CMD_stats.unit', index=1,
+      number=2, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='count', full_name='OBD_CMD_stats.count', index=2,
+      number=3, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='min', full_name='OBD_CMD_stats.min', index=3,
+      number=4, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='max', full_name='OBD_CMD_stats.max', index=4,
+      number=5, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='mean', full_name='OBD_CMD_stats.mean', index=5,
+      number=6, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='variance', full_name='OBD_CMD_stats.variance', index=6,
+      number=7, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='quantiles', full_name='OBD_CMD_stats.quantiles', index=7,
+      number=8, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='window', full_name='OBD_CMD_stats.window', index=8,
+      number=9, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=272,
+  serialized_end=437,
 )
 
 
@@ -206,6 +338,20 @@ _OBD_RESULT = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='adapter', full_name='OBD_Result.adapter', index=5,
+      number=6, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='stats', full_name='OBD_Result.stats', index=6,
+      number=7, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
   ],
   extensions=[
   ],
@@ -218,8 +364,8 @@ _OBD_RESULT = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=207,
-  serialized_end=322,
+  serialized_start=440,
+  serialized_end=603,
 )
 
 
@@ -251,6 +397,13 @@ _OBD_CMD = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='adapter', full_name='OBD_cmd.adapter', index=3,
+      number=5, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
   ],
   extensions=[
   ],
@@ -264,8 +417,8 @@ _OBD_CMD = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=324,
-  serialized_end=451,
+  serialized_start=606,
+  serialized_end=750,
 )
 
 
@@ -283,6 +436,13 @@ _OBD_STATUSREQUEST = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='adapter', full_name='OBD_StatusRequest.adapter', index=1,
+      number=2, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
   ],
   extensions=[
   ],
@@ -295,8 +455,8 @@ _OBD_STATUSREQUEST = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=453,
-  serialized_end=489,
+  serialized_start=752,
+  serialized_end=805,
 )
 
 
@@ -356,6 +516,20 @@ _OBD_STATUS = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='adapter', full_name='OBD_status.adapter', index=7,
+      number=8, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='adapters', full_name='OBD_status.adapters', index=8,
+      number=9, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
   ],
   extensions=[
   ],
@@ -368,8 +542,8 @@ _OBD_STATUS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=492,
-  serialized_end=627,
+  serialized_start=808,
+  serialized_end=978,
 )
 
 _OBD_CMD_VALUE.fields_by_name['type'].enum_type = _OBD_CMD_VALUE_VALUE_TYPE
@@ -380,11 +554,15 @@ _OBD_CMD_VALUE.fields_by_name['f'].containing_oneof = _OBD_CMD_VALUE.oneofs_by_n
 _OBD_CMD_VALUE.oneofs_by_name['value'].fields.append(
   _OBD_CMD_VALUE.fields_by_name['s'])
 _OBD_CMD_VALUE.fields_by_name['s'].containing_oneof = _OBD_CMD_VALUE.oneofs_by_name['value']
+_OBD_CMD_STATS.fields_by_name['quantiles'].message_type = _OBD_QUANTILE
 _OBD_RESULT.fields_by_name['values'].message_type = _OBD_CMD_VALUE
+_OBD_RESULT.fields_by_name['stats'].message_type = _OBD_CMD_STATS
 _OBD_CMD.fields_by_name['request'].enum_type = _OBD_CMD_REQUESTRESULT
 _OBD_CMD_REQUESTRESULT.containing_type = _OBD_CMD
 DESCRIPTOR.message_types_by_name['Start_OBD'] = _START_OBD
 DESCRIPTOR.message_types_by_name['OBD_CMD_value'] = _OBD_CMD_VALUE
+DESCRIPTOR.message_types_by_name['OBD_quantile'] = _OBD_QUANTILE
+DESCRIPTOR.message_types_by_name['OBD_CMD_stats'] = _OBD_CMD_STATS
 DESCRIPTOR.message_types_by_name['OBD_Result'] = _OBD_RESULT
 DESCRIPTOR.message_types_by_name['OBD_cmd'] = _OBD_CMD
 DESCRIPTOR.message_types_by_name['OBD_StatusRequest'] = _OBD_STATUSREQUEST
@@ -405,6 +583,20 @@ OBD_CMD_value = _reflection.GeneratedProtocolMessageType('OBD_CMD_value', (_mess
   ))
 _sym_db.RegisterMessage(OBD_CMD_value)
 
+OBD_quantile = _reflection.GeneratedProtocolMessageType('OBD_quantile', (_message.Message,), dict(
+  DESCRIPTOR = _OBD_QUANTILE,
+  __module__ = 'OBD_Service_pb2'
+  # @@protoc_insertion_point(class_scope:OBD_quantile)
+  ))
+_sym_db.RegisterMessage(OBD_quantile)
+
+OBD_CMD_stats = _reflection.GeneratedProtocolMessageType('OBD_CMD_stats', (_message.Message,), dict(
+  DESCRIPTOR = _OBD_CMD_STATS,
+  __module__ = 'OBD_Service_pb2'
+  # @@protoc_insertion_point(class_scope:OBD_CMD_stats)
+  ))
+_sym_db.RegisterMessage(OBD_CMD_stats)
+
 OBD_Result = _reflection.GeneratedProtocolMessageType('OBD_Result', (_message.Message,), dict(
   DESCRIPTOR = _OBD_RESULT,
   __module__ = 'OBD_Service_pb2'
@@ -441,8 +633,8 @@ _OBD_SERVICE = _descriptor.ServiceDescriptor(
   file=DESCRIPTOR,
   index=0,
   serialized_options=None,
-  serialized_start=630,
-  serialized_end=786,
+  serialized_start=981,
+  serialized_end=1137,
   methods=[
   _descriptor.MethodDescriptor(
     name='Status',
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        aggregation.py
+# Purpose:     Windowed statistics on the values read, computed at the edge
+#
+# Created:     18/10/2026
+# Copyright:   (c) Laurent Carre - Sterwen Technology / Solid Run 2019
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+'''
+The aggregation is asked for in the Read rules, for instance:
+
+    {"on_period": 0.5,
+     "aggregate": {"window": 30, "quantiles": [0.5, 0.9, 0.99],
+                   "commands": ["RPM", "SPEED"], "values": false}}
+
+Every value read is then added to its command's accumulator, and once per
+"window" seconds (default 60) a single OBD_Result goes out with the
+statistics of each command over the window: count, min, max, mean,
+variance and the "quantiles" (default 0.5, 0.9 and 0.99). "commands" limits
+the aggregation to some commands (default: all the numeric ones). With
+"values" true, the last values read are sent along with the statistics.
+
+The memory used by a command doesn't depend on the window or the sampling
+rate: the mean and variance are kept with Welford's method, and each
+quantile is estimated with the P-square algorithm (R. Jain and I. Chlamtac,
+"The P2 algorithm for dynamic calculation of quantiles and histograms
+without storing observations", CACM 28(10), 1985), on 5 markers.
+'''
+
+DEFAULT_WINDOW=60.
+DEFAULT_QUANTILES=(0.5,0.9,0.99)
+
+
+class P2Quantile():
+    '''
+    Estimate of one quantile of a stream, in constant memory
+    '''
+
+    def __init__(self,p):
+        if not 0. < p < 1.:
+            raise ValueError("Quantile level must be between 0 and 1: "+str(p))
+        self.p=p
+        self._q=[]      # marker heights, the sorted first samples until there are 5
+        self._n=[0,1,2,3,4]     # marker positions
+        self._desired=[0.,2.*p,4.*p,2.+2.*p,4.]
+        self._increment=[0.,p/2.,p,(1.+p)/2.,1.]
+
+    def add(self,x):
+        q=self._q
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        # the cell the sample falls in, the extreme markers following it
+        if x < q[0]:
+            q[0]=x
+            k=0
+        elif x >= q[4]:
+            q[4]=x
+            k=3
+        else:
+            k=0
+            while x >= q[k+1]:
+                k += 1
+        n=self._n
+        for i in range(k+1,5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increment[i]
+        # the middle markers move towards their desired positions
+        for i in (1,2,3):
+            d=self._desired[i]-n[i]
+            if (d >= 1. and n[i+1]-n[i] > 1) or (d <= -1. and n[i-1]-n[i] < -1):
+                d=1 if d > 0 else -1
+                h=self._parabolic(i,d)
+                if not q[i-1] < h < q[i+1]:
+                    h=self._linear(i,d)
+                q[i]=h
+                n[i] += d
+
+    def _parabolic(self,i,d):
+        q=self._q
+        n=self._n
+        return q[i]+d/(n[i+1]-n[i-1])*((n[i]-n[i-1]+d)*(q[i+1]-q[i])/(n[i+1]-n[i])
+                                        +(n[i+1]-n[i]-d)*(q[i]-q[i-1])/(n[i]-n[i-1]))
+
+    def _linear(self,i,d):
+        q=self._q
+        n=self._n
+        return q[i]+d*(q[i+d]-q[i])/(n[i+d]-n[i])
+
+    def value(self):
+        q=self._q
+        if len(q) == 0:
+            return None
+        if len(q) < 5:
+            # exact, from the samples kept
+            return q[min(int(round(self.p*(len(q)-1))),len(q)-1)]
+        return q[2]
+
+
+class Accumulator():
+    '''
+    count, min, max, mean, variance and quantiles of one command's values
+    '''
+
+    def __init__(self,unit,levels):
+        self.unit=unit
+        self.count=0
+        self.min=None
+        self.max=None
+        self.mean=0.
+        self._m2=0.
+        self._quantiles=[P2Quantile(p) for p in levels]
+
+    def add(self,x):
+        self.count += 1
+        if self.count == 1:
+            self.min=self.max=x
+        else:
+            self.min=min(self.min,x)
+            self.max=max(self.max,x)
+        delta=x-self.mean
+        self.mean += delta/self.count
+        self._m2 += delta*(x-self.mean)
+        for q in self._quantiles:
+            q.add(x)
+
+    @property
+    def variance(self):
+        # of the samples of the window
+        if self.count == 0:
+            return 0.
+        return self._m2/self.count
+
+    def quantiles(self):
+        return [(q.p,q.value()) for q in self._quantiles]
+
+
+class WindowAggregator():
+    '''
+    The accumulators of all the commands, over the current window
+    '''
+
+    def __init__(self,window=DEFAULT_WINDOW,quantiles=DEFAULT_QUANTILES,commands=None,values=False):
+        try:
+            self.window=float(window)
+            self._levels=[float(p) for p in quantiles]
+        except (TypeError,ValueError):
+            raise ValueError("Invalid aggregation window or quantiles")
+        if self.window <= 0.:
+            raise ValueError("Aggregation window must be positive")
+        for p in self._levels:
+            if not 0. < p < 1.:
+                raise ValueError("Quantile level must be between 0 and 1: "+str(p))
+        self._commands=None if commands == None else set(commands)
+        self.values=bool(values)   # send the last values read with the statistics
+        self._accumulators={}   # {command name: Accumulator}
+        self._last={}           # {command name: time of the last value added}
+        self._start=None
+        self.duration=0.        # of the last window flushed
+
+    @staticmethod
+    def fromRules(rules):
+        # None when the rules don't ask for aggregation
+        if rules == None or rules.get('aggregate') == None :
+            return None
+        spec=rules.get('aggregate')
+        if not isinstance(spec,dict):
+            raise ValueError("Invalid aggregation: "+str(spec))
+        return WindowAggregator(spec.get('window',DEFAULT_WINDOW),
+                                spec.get('quantiles',DEFAULT_QUANTILES),
+                                spec.get('commands'),spec.get('values',False))
+
+    def add(self,cmd_values,now):
+        '''
+        adds the values (CMD_Value) read since the last call
+        '''
+        if self._start == None:
+            self._start=now
+        for c in cmd_values:
+            if c._genericType != 0:
+                continue
+            name=c._cmd
+            if self._commands != None and name not in self._commands:
+                continue
+            # a value kept from an earlier cycle is not a new sample
+            t=getattr(c,'_time',now)
+            if name in self._last and t <= self._last[name]:
+                continue
+            self._last[name]=t
+            acc=self._accumulators.get(name)
+            if acc == None:
+                acc=Accumulator(c._unit,self._levels)
+                self._accumulators[name]=acc
+            acc.add(c._magnitude)
+
+    def due(self,now):
+        return self._start != None and now-self._start >= self.window
+
+    def flush(self,now):
+        '''
+        returns [(command name, Accumulator), ...] for the window, and starts the next one
+        '''
+        out=sorted(self._accumulators.items())
+        self.duration=0. if self._start == None else now-self._start
+        self._accumulators={}
+        self._start=now
+        return out
@@ -0,0 +1,99 @@
+"""
+    Per-call time of the BitArray operations the decoders and the command
+    loading rely on, before and after the integer-backed BitArray.
+
+    The "before" figures come from the previous string-backed class,
+    run on the same data.
+
+    Usage:
+
+        python benchmarks/bench_bitarray.py [repeats]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from obd.utils import BitArray  # noqa: E402
+
+
+class LegacyBitArray:
+    """ the BitArray as it was before, for comparison """
+
+    def __init__(self, _bytearray):
+        self.bits = ""
+        for b in _bytearray:
+            v = bin(b)[2:]
+            self.bits += ("0" * (8 - len(v))) + v
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            if key >= 0 and key < len(self.bits):
+                return self.bits[key] == "1"
+            else:
+                return False
+        elif isinstance(key, slice):
+            bits = self.bits[key]
+            if bits:
+                return [b == "1" for b in bits]
+            else:
+                return []
+
+    def num_set(self):
+        return self.bits.count("1")
+
+    def value(self, start, stop):
+        bits = self.bits[start:stop]
+        if bits:
+            return int(bits, 2)
+        else:
+            return 0
+
+    def __iter__(self):
+        return [b == "1" for b in self.bits].__iter__()
+
+
+PIDS = bytearray([0xBE, 0x3F, 0xA8, 0x13])  # a PIDS_A answer
+STATUS = bytearray([0x83, 0x07, 0x65, 0x04])  # a STATUS answer
+
+CASES = {
+    # __load_commands: walk the supported PIDs
+    "pid bitmap": lambda cls: [i for i, bit in enumerate(cls(PIDS)) if bit],
+    # the status decoder
+    "status": lambda cls: (lambda b: (b[0], b.value(1, 8), b[12],
+                                      [b[13 + i] for i in range(3)],
+                                      [b[16 + i] for i in range(8)],
+                                      [b[24 + i] for i in range(8)]))(cls(STATUS)),
+    # the o2_sensors decoder
+    "o2 sensors": lambda cls: (lambda b: (b[:4], b[4:]))(cls(PIDS[:1])),
+    # Protocol.populate_ecu_map
+    "popcount": lambda cls: cls(PIDS).num_set(),
+}
+
+
+def run(f, cls, repeats):
+    f(cls)  # warm up
+    t = time.perf_counter()
+    for _ in range(repeats):
+        f(cls)
+    return (time.perf_counter() - t) / repeats
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print("%d repeats" % repeats)
+    print("%-16s %12s %12s %8s" % ("case", "before (us)", "after (us)", "speedup"))
+    for name, f in CASES.items():
+        assert f(BitArray) == f(LegacyBitArray)
+
+        before = run(f, LegacyBitArray, repeats)
+        after = run(f, BitArray, repeats)
+        print("%-16s %12.2f %12.2f %7.2fx" %
+              (name, before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+    Per-sample CPU time of decoding a response and taking its number and
+    unit apart (as the gateway's CMD_Value does), before and after the
+    plain number fast path in the decoders.
+
+    The "before" figures build the pint Quantity eagerly, as the decoders
+    used to, and read it back with .m and str(.u).
+
+    Usage:
+
+        python benchmarks/bench_decode.py [samples]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import obd  # noqa: E402
+from obd.OBDResponse import OBDResponse  # noqa: E402
+from obd.protocols import ISO_15765_4_11bit_500k  # noqa: E402
+
+RESPONSES = {
+    "RPM": "7E8 04 41 0C 1A F8",
+    "SPEED": "7E8 03 41 0D 32",
+    "COOLANT_TEMP": "7E8 03 41 05 7B",
+    "THROTTLE_POS": "7E8 03 41 11 4C",
+    "INTAKE_PRESSURE": "7E8 03 41 0B 63",
+    "TIMING_ADVANCE": "7E8 03 41 0E 90",
+    "FUEL_RATE": "7E8 04 41 5E 01 F4",
+}
+
+
+def legacy_sample(cmd, messages):
+    """ the decoding as it was before, for comparison """
+    r = OBDResponse(cmd, messages)
+    r.value = cmd.decode(messages)
+    result = r.value
+    if 'Quantity' in str(type(result)):
+        return result.m, str(result.u)
+    return str(result), None
+
+
+def sample(cmd, messages):
+    r = cmd(messages)
+    return r.magnitude, r.unit
+
+
+def run(f, cmd, messages, samples):
+    f(cmd, messages)  # warm up
+    t = time.process_time()
+    for _ in range(samples):
+        f(cmd, messages)
+    return (time.process_time() - t) / samples
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    p = ISO_15765_4_11bit_500k(["7E8 06 41 00 BE 3F A8 13"])
+
+    print("%d samples" % samples)
+    print("%-16s %12s %12s %8s" % ("command", "before (us)", "after (us)", "speedup"))
+    for name, line in RESPONSES.items():
+        cmd = obd.commands[name]
+        messages = p([line])
+        assert sample(cmd, messages) == legacy_sample(cmd, messages)
+
+        before = run(legacy_sample, cmd, messages, samples)
+        after = run(sample, cmd, messages, samples)
+        print("%-16s %12.2f %12.2f %7.2fx" %
+              (name, before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+    Per-response time of the dtc() decoder on a long DTC list, and the
+    import time of obd.codes, before and after the DTC lookup table and
+    the on-demand DTC descriptions.
+
+    The "before" decoder is the previous parse_dtc(), run on the same
+    messages. The "before" import time is that of the previous codes.py,
+    as found in git history (skipped when git isn't available).
+
+    Usage:
+
+        python benchmarks/bench_dtc.py [repeats]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import obd.decoders as decoders  # noqa: E402
+from obd.codes import DTC  # noqa: E402
+from obd.protocols.protocol import Message  # noqa: E402
+from obd.utils import bytes_to_hex  # noqa: E402
+
+# the last python-OBD with the DTC descriptions as a literal
+LEGACY_CODES = "56ffc2a:obd/codes.py"
+
+
+def legacy_parse_dtc(_bytes):
+    """ decoders.parse_dtc as it was before, for comparison """
+    if (len(_bytes) != 2) or (_bytes == (0, 0)):
+        return None
+    dtc = ['P', 'C', 'B', 'U'][_bytes[0] >> 6]
+    dtc += str((_bytes[0] >> 4) & 0b0011)
+    dtc += bytes_to_hex(_bytes)[1:4]
+    return (dtc, DTC.get(dtc, ""))
+
+
+def legacy_dtc(messages):
+    """ decoders.dtc as it was before, for comparison """
+    codes = []
+    d = []
+    for message in messages:
+        d += message.data[2:]
+    for n in range(1, len(d), 2):
+        dtc = legacy_parse_dtc((d[n - 1], d[n]))
+        if dtc is not None:
+            codes.append(dtc)
+    return codes
+
+
+def dtc_messages(count):
+    """ a GET_DTC answer with count codes, from an ECU stuck in a loop """
+    m = Message([])
+    m.data = bytearray([0x43, count])
+    for i in range(count):
+        m.data += bytes([(i * 0x11) & 0xFF, i & 0xFF])
+    return [m]
+
+
+def run(f, messages, repeats):
+    f(messages)  # warm up
+    t = time.perf_counter()
+    for _ in range(repeats):
+        f(messages)
+    return (time.perf_counter() - t) / repeats
+
+
+def import_time(path):
+    """ the time to import the codes module at path, in a fresh interpreter """
+    code = ("import time, importlib.util\n"
+            "t = time.perf_counter()\n"
+            "spec = importlib.util.spec_from_file_location('codes', %r)\n"
+            "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+            "print(time.perf_counter() - t)\n") % path
+    return min(float(subprocess.check_output([sys.executable, "-c", code]))
+               for _ in range(5))
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print("%d repeats" % repeats)
+    print("%-16s %12s %12s %8s" % ("case", "before (us)", "after (us)", "speedup"))
+    for count in (4, 32, 125):
+        messages = dtc_messages(count)
+        assert decoders.dtc(messages) == legacy_dtc(messages)
+
+        before = run(legacy_dtc, messages, repeats)
+        after = run(decoders.dtc, messages, repeats)
+        print("%-16s %12.2f %12.2f %7.2fx" %
+              ("dtc() x%d" % count, before * 1e6, after * 1e6, before / after))
+
+    try:
+        legacy = subprocess.check_output(["git", "-C", ROOT, "show", LEGACY_CODES],
+                                         stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return
+    with tempfile.NamedTemporaryFile(suffix=".py") as f:
+        f.write(legacy)
+        f.flush()
+        before = import_time(f.name)
+    after = import_time(os.path.join(ROOT, "obd", "codes.py"))
+    print("%-16s %12.2f %12.2f %7.2fx" %
+          ("import codes", before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == "__main__":
+    main()
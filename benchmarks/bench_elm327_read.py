@@ -0,0 +1,117 @@
+"""
+    Per-query wall time of ELM327.__read(), before and after the
+    buffered, prompt-delimited reader.
+
+    A scripted adapter answers on the master side of a pseudo terminal,
+    trickling each response out in small chunks (as an rfcomm link does).
+    The "before" figures come from the previous byte-polling reader,
+    patched onto the same ELM327 object.
+
+    Usage (Linux only):
+
+        python benchmarks/bench_elm327_read.py [queries] [chunk] [pause_ms]
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from obd.elm327 import ELM327  # noqa: E402
+
+RESPONSES = {
+    b"ATZ": b"\r\rELM327 v1.5\r\r",
+    b"ATE0": b"ATE0\rOK\r\r",
+    b"ATH1": b"OK\r\r",
+    b"ATL0": b"OK\r\r",
+    b"AT RV": b"12.6V\r\r",
+    b"ATSP0": b"OK\r\r",
+    b"0100": b"7E8 06 41 00 BE 3F A8 13\r\r",
+    b"ATDPN": b"A6\r\r",
+    b"010C": b"7E8 04 41 0C 1A F8\r\r",
+    b"0902": b"7E8 10 14 49 02 01 31 44 34\r"
+             b"7E8 21 47 50 30 30 52 35 35\r"
+             b"7E8 22 42 31 32 33 34 35 36\r\r",
+}
+
+
+def responder(master, chunk, pause):
+    pending = b""
+    while True:
+        try:
+            pending += os.read(master, 1024)
+        except OSError:
+            return
+        while b"\r" in pending:
+            cmd, pending = pending.split(b"\r", 1)
+            response = RESPONSES.get(cmd.strip(), b"?\r\r") + b">"
+            for i in range(0, len(response), chunk):
+                os.write(master, response[i:i + chunk])
+                if pause:
+                    time.sleep(pause)
+
+
+def legacy_read(elm):
+    """ the reader as it was before, for comparison """
+    port = elm._ELM327__port
+
+    def __read(raw=False):
+        buffer = bytearray()
+        while True:
+            data = port.read(port.in_waiting or 1)
+            if not data:
+                break
+            buffer.extend(data)
+            if ELM327.ELM_PROMPT in buffer or ELM327.ELM_LP_ACTIVE in buffer:
+                break
+        buffer = re.sub(b"\x00", b"", buffer)
+        if buffer.endswith(ELM327.ELM_PROMPT):
+            buffer = buffer[:-1]
+        if raw:
+            # lines left undecoded, for the protocol (see ELM327.split_raw_lines())
+            return [s.strip() for s in re.split(b"[\r\n]", buffer) if bool(s)]
+        string = buffer.decode("utf-8", "ignore")
+        return [s.strip() for s in re.split("[\r\n]", string) if bool(s)]
+
+    return __read
+
+
+def run(elm, cmd, queries):
+    elm.send_and_parse(cmd)  # warm up
+    t = time.perf_counter()
+    for _ in range(queries):
+        elm.send_and_parse(cmd)
+    return (time.perf_counter() - t) / queries
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chunk = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    pause = float(sys.argv[3]) / 1000.0 if len(sys.argv) > 3 else 0.0005
+
+    master, slave = os.openpty()
+    t = threading.Thread(target=responder, args=(master, chunk, pause))
+    t.daemon = True
+    t.start()
+
+    elm = ELM327(os.ttyname(slave), None, None, 0.1)
+
+    print("%d queries, %d byte chunks, %.2f ms between chunks" %
+          (queries, chunk, pause * 1000))
+    print("%-6s %12s %12s %8s" % ("cmd", "before (ms)", "after (ms)", "speedup"))
+    for cmd in (b"010C", b"0902"):
+        after = run(elm, cmd, queries)
+        elm._ELM327__read = legacy_read(elm)
+        before = run(elm, cmd, queries)
+        del elm._ELM327__read
+        print("%-6s %12.3f %12.3f %7.2fx" %
+              (cmd.decode(), before * 1000, after * 1000, before / after))
+
+    elm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+    Time taken to sort a recorded session's response lines into OBD lines
+    and adapter messages, and to group the frames by ECU, before and after
+    the translate()-based line classification.
+
+    The recording interleaves single and multi-frame responses from two
+    ECUs with the adapter's "NO DATA", "CAN ERROR" and "SEARCHING..."
+    noise. The "before" figures use the previous per-character isHex()
+    and dict grouping; the "after" figures are given for lines as strings
+    (as ELM327.split_lines() returns them) and as bytes (as send_and_parse()
+    now hands them over).
+
+    Usage:
+
+        python benchmarks/bench_lines.py [lines] [repeats]
+"""
+
+import os
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from obd.protocols import ISO_15765_4_11bit_500k  # noqa: E402
+from obd.protocols.protocol import Frame, split_obd_lines, group_frames  # noqa: E402
+
+SESSION = [
+    "SEARCHING...",
+    "7E8 06 41 00 BE 3F A8 13",
+    "7E9 06 41 00 80 00 00 01",
+    "7E8 04 41 0C 1A F8",
+    "7E8 03 41 0D 32",
+    "NO DATA",
+    "7E8 10 14 49 02 01 31 44 34",
+    "7E8 21 47 50 30 30 52 35 35",
+    "7E8 22 42 31 32 33 34 35 36",
+    "CAN ERROR",
+    "7E8 03 41 05 7B",
+    "7E9 03 41 05 7C",
+    "NO DATA",
+    "7E8 04 41 5E 01 F4",
+]
+
+
+def recording(n):
+    return (SESSION * (n // len(SESSION) + 1))[:n]
+
+
+def legacy_isHex(_hex):
+    return all([c in string.hexdigits for c in _hex])
+
+
+def legacy_classify(p, lines):
+    """ the preprocessing of Protocol.__call__ as it was before, for comparison """
+    obd_lines = []
+    non_obd_lines = []
+    for line in lines:
+        line_no_spaces = line.replace(' ', '') if ' ' in line else line
+        if legacy_isHex(line_no_spaces):
+            obd_lines.append(line_no_spaces)
+        else:
+            non_obd_lines.append(line)
+
+    frames = []
+    for line in obd_lines:
+        frame = Frame(line)
+        if p.parse_frame(frame):
+            frames.append(frame)
+
+    frames_by_ECU = {}
+    for frame in frames:
+        frames_by_ECU.setdefault(frame.tx_id, []).append(frame)
+    return [(ecu, frames_by_ECU[ecu]) for ecu in sorted(frames_by_ECU.keys())], non_obd_lines
+
+
+def classify(p, lines):
+    obd_lines, non_obd_lines = split_obd_lines(lines)
+
+    frames = []
+    for line in obd_lines:
+        frame = Frame(line)
+        if p.parse_frame(frame):
+            frames.append(frame)
+
+    return group_frames(frames), non_obd_lines
+
+
+def run(f, p, lines, repeats):
+    f(p, lines)  # warm up
+    t = time.perf_counter()
+    for _ in range(repeats):
+        f(p, lines)
+    return (time.perf_counter() - t) / repeats
+
+
+def summary(result):
+    groups, non_obd_lines = result
+    return [(ecu, [bytes(f.data) for f in frames]) for ecu, frames in groups], non_obd_lines
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    p = ISO_15765_4_11bit_500k([])
+    lines = recording(n)
+    raw_lines = [l.encode() for l in lines]
+
+    # the lines one response at a time, as the protocol sees them
+    responses = []
+    response = []
+    for line in lines:
+        response.append(line)
+        if not line.startswith("7E8 1") and not line.startswith("7E8 2"):
+            responses.append(response)
+            response = []
+    raw_responses = [[l.encode() for l in r] for r in responses]
+
+    expected = summary(legacy_classify(p, lines))
+    assert summary(classify(p, lines)) == expected
+    assert summary(classify(p, raw_lines)) == expected
+
+    print("%d lines, %d repeats" % (n, repeats))
+    print("%-22s %12s %12s %8s" % ("input", "before (ms)", "after (ms)", "speedup"))
+
+    before = run(legacy_classify, p, lines, repeats)
+    for label, f, batch in (
+            ("one batch (str)", classify, lines),
+            ("one batch (bytes)", classify, raw_lines)):
+        after = run(f, p, batch, repeats)
+        print("%-22s %12.2f %12.2f %7.2fx" %
+              (label, before * 1e3, after * 1e3, before / after))
+
+    def per_response(f, batches):
+        def g(p, _):
+            for r in batches:
+                f(p, r)
+        return g
+
+    before = run(per_response(legacy_classify, responses), p, None, repeats)
+    for label, batches in (("per response (str)", responses),
+                           ("per response (bytes)", raw_responses)):
+        after = run(per_response(classify, batches), p, None, repeats)
+        print("%-22s %12.2f %12.2f %7.2fx" %
+              (label, before * 1e3, after * 1e3, before / after))
+
+
+if __name__ == "__main__":
+    main()
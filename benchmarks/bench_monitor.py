@@ -0,0 +1,147 @@
+"""
+    Time to decode a sweep over every mode 06 MID, before and after the
+    columnar Monitor and batch unpacking of the test results.
+
+    Each MID answers with a few test results, with a mix of UAS IDs. The
+    "before" figures come from the previous decoder, with its Monitor
+    and MonitorTest objects and pint values for every result. The "after"
+    figures are for decoding alone, and for decoding then reading one
+    test of each monitor as a MonitorTest.
+
+    Usage:
+
+        python benchmarks/bench_monitor.py [repeats]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import obd  # noqa: E402
+from obd.codes import TEST_IDS  # noqa: E402
+from obd.decoders import monitor  # noqa: E402
+from obd.OBDResponse import MonitorTest  # noqa: E402
+from obd.protocols.protocol import Message  # noqa: E402
+from obd.UnitsAndScaling import UAS_IDS  # noqa: E402
+
+
+class LegacyMonitor:
+    """ the Monitor as it was before, for comparison """
+
+    def __init__(self):
+        self._tests = {}
+        null_test = MonitorTest()
+        for tid in TEST_IDS:
+            name = TEST_IDS[tid][0]
+            self.__dict__[name] = null_test
+            self._tests[tid] = null_test
+
+    def add_test(self, test):
+        self._tests[test.tid] = test
+        if test.name is not None:
+            self.__dict__[test.name] = test
+
+    @property
+    def tests(self):
+        return [test for test in self._tests.values() if not test.is_null()]
+
+
+def legacy_uas(uas, _bytes):
+    """ UAS.__call__ as it was before, for comparison """
+    value = 0
+    p = 0
+    for b in reversed(_bytes):
+        value += b * (2 ** p)
+        p += 8
+    if uas.signed:
+        bits = len(_bytes) * 8
+        if value & (1 << (bits - 1)):
+            value -= 1 << bits
+    value *= uas.scale
+    value += uas.offset
+    return obd.Unit.Quantity(value, uas.unit)
+
+
+def legacy_parse_monitor_test(d):
+    test = MonitorTest()
+    tid = d[1]
+    test.name, test.desc = TEST_IDS.get(tid, ("Unknown", "Unknown"))
+    uas = UAS_IDS.get(d[2], None)
+    if uas is None:
+        return None
+    if not hasattr(uas, "signed"):
+        legacy = uas
+    else:
+        legacy = lambda _bytes: legacy_uas(uas, _bytes)  # noqa: E731
+    test.tid = tid
+    test.value = legacy(d[3:5])
+    test.min = legacy(d[5:7])
+    test.max = legacy(d[7:])
+    return test
+
+
+def legacy_monitor(messages):
+    """ decoders.monitor as it was before, for comparison """
+    d = messages[0].data[1:]
+    mon = LegacyMonitor()
+    d = d[:len(d) - len(d) % 9]
+    for n in range(0, len(d), 9):
+        test = legacy_parse_monitor_test(d[n:n + 9])
+        if test is not None:
+            mon.add_test(test)
+    return mon
+
+
+def sweep():
+    """ a mode 06 answer for every MID in the command tables """
+    responses = []
+    uas_ids = [0x0A, 0x10, 0x24, 0x16, 0x85, 0x96]  # mV, ms, count, degC, and signed ones
+    for cmd in obd.commands[6]:
+        if cmd is None or cmd.pid is None:
+            continue
+        m = Message([])
+        m.data = bytearray([0x46])
+        for i, tid in enumerate((0x01, 0x05, 0x0B, 0x85)):
+            uas_id = uas_ids[(cmd.pid + i) % len(uas_ids)]
+            m.data += bytearray([cmd.pid, tid, uas_id, 0x0B, 0xB0 + i, 0x00, 0x10, 0xFF, 0xF0])
+        responses.append([m])
+    return responses
+
+
+def read_one(messages):
+    mon = monitor(messages)
+    return mon.RTL_THRESHOLD_VOLTAGE.value
+
+
+def run(f, responses, repeats):
+    for messages in responses:  # warm up
+        f(messages)
+    t = time.perf_counter()
+    for _ in range(repeats):
+        for messages in responses:
+            f(messages)
+    return (time.perf_counter() - t) / repeats
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    responses = sweep()
+
+    for messages in responses:
+        old, new = legacy_monitor(messages), monitor(messages)
+        assert [(t.tid, t.value, t.min, t.max) for t in old.tests] == \
+            [(t.tid, t.value, t.min, t.max) for t in new.tests]
+
+    print("%d repeats of a sweep over %d MIDs" % (repeats, len(responses)))
+    print("%-16s %12s %12s %8s" % ("case", "before (us)", "after (us)", "speedup"))
+    before = run(legacy_monitor, responses, repeats)
+    for name, f in (("decode", monitor), ("decode + read", read_one)):
+        after = run(f, responses, repeats)
+        print("%-16s %12.2f %12.2f %7.2fx" %
+              (name, before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+    Per-response parse time of the CAN protocols, before and after the
+    zero-copy Frame/Message parsing.
+
+    Runs recorded multi-frame responses (a VIN, DTC lists from two ECUs,
+    and a block of mode 06 monitor results) through Protocol.__call__.
+    The "before" figures come from the previous dict-backed Frame and
+    copying parsers, patched onto the same protocol objects.
+
+    Usage:
+
+        python benchmarks/bench_parse.py [repeats]
+"""
+
+import os
+import sys
+import time
+from binascii import unhexlify
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import obd.protocols.protocol as protocol  # noqa: E402
+from obd.protocols import ISO_15765_4_11bit_500k, ISO_15765_4_29bit_500k  # noqa: E402
+from obd.utils import contiguous  # noqa: E402
+
+TRACES = {
+    "VIN": [
+        "7E8 10 14 49 02 01 31 44 34",
+        "7E8 21 47 50 30 30 52 35 35",
+        "7E8 22 42 31 32 33 34 35 36",
+    ],
+    "DTC": [
+        "7E8 10 0E 43 06 01 43 01 96",
+        "7E8 21 02 34 02 CD 03 57 0A",
+        "7E8 22 24 00 00 00 00 00 00",
+        "7E9 10 0A 43 04 07 01 07 02",
+        "7E9 21 07 03 07 04 00 00 00",
+    ],
+    "mode 06": [
+        "7E8 10 33 46 01 01 0A 0B B0",
+        "7E8 21 0B 93 0C 4A 01 0B 0A",
+        "7E8 22 0A 0B 93 0C 4A 01 0C",
+        "7E8 23 0A 0B B0 0B 93 0C 4A",
+        "7E8 24 01 0D 0A 0B 93 0B 93",
+        "7E8 25 0C 4A 01 0E 0A 0B 93",
+        "7E8 26 0B 93 0C 4A 01 0F 0A",
+        "7E8 27 0B 93 0B 93 0C 4A 00",
+    ],
+}
+
+
+def to_29bit(lines):
+    return ["18 DA F1 %s %s" % ("10" if l.startswith("7E8") else "18", l[4:]) for l in lines]
+
+
+class LegacyFrame(object):
+    """ the Frame as it was before, for comparison """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.data = bytearray()
+        self.priority = None
+        self.addr_mode = None
+        self.rx_id = None
+        self.tx_id = None
+        self.can_id = None
+        self.type = None
+        self.seq_index = 0
+        self.data_len = None
+
+
+def legacy_parse_frame(self, frame):
+    """ CANProtocol.parse_frame as it was before, for comparison """
+    raw = frame.raw
+    if self.id_bits == 11:
+        raw = "00000" + raw
+    if len(raw) & 1:
+        return False
+    raw_bytes = bytearray(unhexlify(raw))
+    if len(raw_bytes) < 6 or len(raw_bytes) > 12:
+        return False
+    v = 0
+    for i, b in enumerate(reversed(raw_bytes[:4])):
+        v += b * (2 ** (8 * i))
+    frame.can_id = v
+    if self.id_bits == 11:
+        frame.priority = raw_bytes[2] & 0x0F
+        frame.addr_mode = raw_bytes[3] & 0xF0
+        if frame.addr_mode == 0xD0:
+            frame.rx_id = raw_bytes[3] & 0x0F
+            frame.tx_id = 0xF1
+        elif raw_bytes[3] & 0x08:
+            frame.rx_id = 0xF1
+            frame.tx_id = raw_bytes[3] & 0x07
+        else:
+            frame.tx_id = 0xF1
+            frame.rx_id = raw_bytes[3] & 0x07
+    else:
+        frame.priority = raw_bytes[0]
+        frame.addr_mode = raw_bytes[1]
+        frame.rx_id = raw_bytes[2]
+        frame.tx_id = raw_bytes[3]
+    frame.data = raw_bytes[4:]
+    frame.type = frame.data[0] & 0xF0
+    if frame.type not in [self.FRAME_TYPE_SF, self.FRAME_TYPE_FF, self.FRAME_TYPE_CF]:
+        return False
+    if frame.type == self.FRAME_TYPE_SF:
+        frame.data_len = frame.data[0] & 0x0F
+        if frame.data_len == 0:
+            return False
+    elif frame.type == self.FRAME_TYPE_FF:
+        frame.data_len = (frame.data[0] & 0x0F) << 8
+        frame.data_len += frame.data[1]
+        if frame.data_len == 0:
+            return False
+    elif frame.type == self.FRAME_TYPE_CF:
+        frame.seq_index = frame.data[0] & 0x0F
+    return True
+
+
+def legacy_parse_message(self, message):
+    """ CANProtocol.parse_message as it was before, for comparison """
+    frames = message.frames
+    if len(frames) == 1:
+        frame = frames[0]
+        if frame.type != self.FRAME_TYPE_SF:
+            return False
+        message.data = frame.data[1:1 + frame.data_len]
+    else:
+        ff = [f for f in frames if f.type == self.FRAME_TYPE_FF]
+        cf = [f for f in frames if f.type == self.FRAME_TYPE_CF]
+        if len(ff) != 1 or len(cf) == 0:
+            return False
+        for prev, curr in zip(cf, cf[1:]):
+            seq = (prev.seq_index & ~0x0F) + curr.seq_index
+            if seq < prev.seq_index - 7:
+                seq += 0x10
+            curr.seq_index = seq
+        cf = sorted(cf, key=lambda f: f.seq_index)
+        if not contiguous([f.seq_index for f in cf], 1, len(cf)):
+            return False
+        message.data = ff[0].data[2:]
+        for f in cf:
+            message.data += f.data[1:]
+        message.data = message.data[:ff[0].data_len]
+    if message.data[0] == 0x43:
+        message.data = message.data[:(message.data[1] * 2 + 2)]
+    return True
+
+
+def run(p, lines, repeats):
+    p(lines)  # warm up
+    t = time.perf_counter()
+    for _ in range(repeats):
+        p(lines)
+    return (time.perf_counter() - t) / repeats
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print("%d repeats" % repeats)
+    print("%-16s %12s %12s %8s" % ("trace", "before (us)", "after (us)", "speedup"))
+    for cls, convert in ((ISO_15765_4_11bit_500k, list), (ISO_15765_4_29bit_500k, to_29bit)):
+        p = cls([])
+        for name, lines in TRACES.items():
+            lines = convert(lines)
+            assert p(lines)[0].data  # the traces must parse
+
+            after = run(p, lines, repeats)
+
+            frame = protocol.Frame
+            protocol.Frame = LegacyFrame
+            p.parse_frame = legacy_parse_frame.__get__(p)
+            p.parse_message = legacy_parse_message.__get__(p)
+            before = run(p, lines, repeats)
+            protocol.Frame = frame
+            del p.parse_frame
+            del p.parse_message
+
+            label = "%s %s" % (name, "(29)" if p.id_bits == 29 else "(11)")
+            print("%-16s %12.2f %12.2f %7.2fx" %
+                  (label, before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+    Throughput and per-query latency of the whole query path, replaying
+    recorded ELM327 transcripts (benchmarks/transcripts/*.txt).
+
+    Each transcript is a terminal log of one session: a ">CMD" line per
+    command sent (the first one selecting the protocol with ATTPx), then
+    the lines the adapter answered with. The corpus covers CAN 11/29 bit,
+    J1850, ISO 9141, several ECUs answering at once, and error lines.
+
+    Two sets of figures are taken for every transcript:
+
+        - the CPU cost of each stage, in us per query, with no I/O:
+          splitting the adapter's output into lines (the work left to
+          ELM327.__read() once the bytes are in), Protocol.__call__(), and
+          OBDCommand.__call__() with the decoder (the response's value is
+          read, so lazy decoding is paid for).
+
+        - wall time per query through a connected ELM327, with a stand-in
+          adapter replaying the transcript on the master side of a pseudo
+          terminal: mean, median, 95th percentile and queries per second.
+
+    Both paths must yield the same responses. With --json, the results
+    are also written out (or to stdout, for "-"), and --baseline compares
+    them against an earlier --json file, exiting non-zero when a figure
+    got slower than the tolerance allows, to catch regressions between
+    releases.
+
+    Usage (the pseudo terminal needs Linux, see --no-pty):
+
+        python benchmarks/bench_transcripts.py [--repeats N] [--json FILE]
+            [--baseline FILE] [--tolerance 0.25] [--no-pty] [transcript ...]
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import obd  # noqa: E402
+from obd.elm327 import ELM327  # noqa: E402
+
+TRANSCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts")
+
+# answers to the initialization, where a transcript doesn't give its own
+INIT_RESPONSES = {
+    b"ATZ": [b"", b"ELM327 v1.5"],
+    b"ATE0": [b"ATE0", b"OK"],
+    b"ATH1": [b"OK"],
+    b"ATL0": [b"OK"],
+    b"AT RV": [b"12.6V"],
+}
+
+
+class Transcript(object):
+    """ a recorded session: the protocol, and each command with its answer """
+
+    def __init__(self, path):
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.protocol = None
+        self.exchanges = []  # [(b"010C", [b"7E8 04 41 0C 1A F8"]), ...]
+
+        with open(path, "rb") as f:
+            for line in f:
+                line = line.rstrip(b"\r\n")
+                if line.startswith(b"#"):
+                    continue
+                if line.startswith(b">"):
+                    self.exchanges.append((line[1:].strip(), []))
+                elif self.exchanges:
+                    self.exchanges[-1][1].append(line)
+
+        setup = self.exchanges.pop(0)[0]
+        if not setup.startswith(b"ATTP"):
+            raise ValueError("%s: the first command must select a protocol (ATTPx)" % path)
+        self.protocol = setup[4:].decode()
+
+    def setup_responses(self):
+        """ the adapter's answers to the initialization, as they go over the wire """
+        responses = dict((cmd, b"\r".join(lines) + b"\r\r")
+                         for cmd, lines in INIT_RESPONSES.items())
+        responses[b"ATTP" + self.protocol.encode()] = b"OK\r\r"
+        return responses
+
+    def queries(self):
+        """ [(OBDCommand, response bytes, prompt included), ...] """
+        queries = []
+        for cmd, lines in self.exchanges:
+            queries.append((COMMANDS[cmd], b"\r".join(lines) + b"\r\r>"))
+        return queries
+
+
+def command_table():
+    table = {}
+    for mode in obd.commands.modes:
+        for cmd in mode:
+            if cmd is not None:
+                table.setdefault(cmd.command, cmd)
+    for cmd in obd.commands.base_commands():
+        table.setdefault(cmd.command, cmd)
+    return table
+
+
+COMMANDS = command_table()
+
+
+class Replay(threading.Thread):
+    """ answers the commands written to a pseudo terminal from a transcript """
+
+    def __init__(self, transcript):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.master, self.slave = os.openpty()
+        self.port_name = os.ttyname(self.slave)
+        self.answers = transcript.setup_responses()
+        # a command sent twice gets the recorded answers in turn
+        self.queue = {}
+        for cmd, lines in transcript.exchanges:
+            self.queue.setdefault(cmd, []).append(b"\r".join(lines) + b"\r\r")
+        self.sent = dict((cmd, 0) for cmd in self.queue)
+        self.start()
+
+    def run(self):
+        pending = b""
+        while True:
+            try:
+                pending += os.read(self.master, 1024)
+            except OSError:
+                return
+            while b"\r" in pending:
+                cmd, pending = pending.split(b"\r", 1)
+                cmd = cmd.strip()
+                if cmd in self.queue:
+                    answers = self.queue[cmd]
+                    answer = answers[self.sent[cmd] % len(answers)]
+                    self.sent[cmd] += 1
+                else:
+                    answer = self.answers.get(cmd, b"?\r\r")
+                os.write(self.master, answer + b">")
+
+    def close(self):
+        # with every slave side closed, the master's read fails, ending the
+        # thread. Only then can the master go: a thread left reading from
+        # its number would steal from the next pseudo terminal to get it
+        os.close(self.slave)
+        self.join()
+        os.close(self.master)
+
+
+def summary(r):
+    """ what two responses to the same query must agree on """
+    return r.is_null(), r.raw_data
+
+
+def stages(transcript, repeats):
+    """ us per query spent in each stage, and the responses """
+    p = ELM327._SUPPORTED_PROTOCOLS[transcript.protocol]
+    queries = transcript.queries()
+    protocol = p(ELM327.split_lines(bytearray(queries[0][1])))
+
+    # what each stage works on, prepared by the stage before it
+    lines = [ELM327.split_raw_lines(bytearray(raw)) for _, raw in queries]
+    messages = [protocol(l) for l in lines]
+
+    def split():
+        for _, raw in queries:
+            ELM327.split_raw_lines(bytearray(raw))
+
+    def parse():
+        for l in lines:
+            protocol(l)
+
+    def decode():
+        for (cmd, _), m in zip(queries, messages):
+            cmd(m).value
+
+    figures = {}
+    for name, f in (("split", split), ("parse", parse), ("decode", decode)):
+        f()  # warm up
+        t = time.perf_counter()
+        for _ in range(repeats):
+            f()
+        figures[name + "_us"] = (time.perf_counter() - t) / repeats / len(queries) * 1e6
+    figures["total_us"] = figures["split_us"] + figures["parse_us"] + figures["decode_us"]
+    figures["queries_per_s"] = 1e6 / figures["total_us"]
+
+    responses = []
+    for (cmd, _), m in zip(queries, messages):
+        r = cmd(m)
+        r.value
+        responses.append(summary(r))
+    return figures, responses
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def end_to_end(transcript, repeats):
+    """ wall time per query through a connected ELM327, and the responses """
+    adapter = Replay(transcript)
+    elm = ELM327(adapter.port_name, 38400, transcript.protocol, 0.1, check_voltage=True)
+    if elm.status() != obd.OBDStatus.CAR_CONNECTED:
+        elm.close()
+        adapter.close()
+        raise RuntimeError("%s: failed to connect (%s)" % (transcript.name, elm.status()))
+
+    commands = [COMMANDS[cmd] for cmd, _ in transcript.exchanges]
+
+    def query(cmd):
+        r = cmd(elm.send_and_parse(cmd.command))
+        r.value
+        return r
+
+    # start the replay over, at the first recorded answers
+    for cmd in commands:
+        query(cmd)
+    for cmd in adapter.sent:
+        adapter.sent[cmd] = 0
+
+    responses = [summary(query(cmd)) for cmd in commands]
+
+    latencies = []
+    for _ in range(repeats):
+        for cmd in commands:
+            t = time.perf_counter()
+            query(cmd)
+            latencies.append(time.perf_counter() - t)
+    elm.close()
+    adapter.close()
+
+    mean = sum(latencies) / len(latencies)
+    figures = {
+        "mean_us": mean * 1e6,
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p95_us": percentile(latencies, 0.95) * 1e6,
+        "max_us": max(latencies) * 1e6,
+        "queries_per_s": 1.0 / mean,
+    }
+    return figures, responses
+
+
+def regressions(results, baseline, tolerance):
+    """ [(transcript, figure, before, after), ...] slower than allowed """
+    found = []
+    before = dict((r["transcript"], r) for r in baseline["results"])
+    for r in results:
+        if r["transcript"] not in before:
+            continue
+        for group in ("stages", "pty"):
+            old = before[r["transcript"]].get(group) or {}
+            new = r.get(group) or {}
+            for figure in new:
+                # the worst case and the rates are too noisy to hold against
+                if figure.startswith("max") or figure.endswith("per_s") or figure not in old:
+                    continue
+                if new[figure] > old[figure] * (1 + tolerance):
+                    found.append((r["transcript"], "%s.%s" % (group, figure),
+                                  old[figure], new[figure]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("transcripts", nargs="*",
+                        help="transcript files (default: all of benchmarks/transcripts)")
+    parser.add_argument("--repeats", type=int, default=200,
+                        help="passes over each transcript (default: 200)")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON ('-' for stdout)")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against an earlier --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown allowed against the baseline (default: 0.25)")
+    parser.add_argument("--no-pty", action="store_true",
+                        help="only time the stages, without the pseudo terminal")
+    args = parser.parse_args()
+
+    paths = args.transcripts or sorted(glob.glob(os.path.join(TRANSCRIPTS, "*.txt")))
+    use_pty = not args.no_pty and sys.platform.startswith("linux")
+
+    # keep the adapter's chatter out of the figures
+    obd.logger.setLevel(obd.logging.CRITICAL)
+
+    results = []
+    for path in paths:
+        transcript = Transcript(path)
+        result = {
+            "transcript": transcript.name,
+            "protocol": transcript.protocol,
+            "queries": len(transcript.exchanges),
+        }
+        result["stages"], responses = stages(transcript, args.repeats)
+        if use_pty:
+            result["pty"], replayed = end_to_end(transcript, max(args.repeats // 4, 1))
+            assert replayed == responses, "%s: the two paths disagree" % transcript.name
+        results.append(result)
+
+    report = {
+        "benchmark": "transcripts",
+        "obd_version": obd.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeats": args.repeats,
+        "results": results,
+    }
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        print("%d repeats, python %s" % (args.repeats, report["python"]))
+        print("%-12s %5s %9s %9s %10s %10s %11s %11s" %
+              ("transcript", "cmds", "split(us)", "parse(us)", "decode(us)",
+               "total(us)", "pty p50(us)", "pty p95(us)"))
+        for r in results:
+            s = r["stages"]
+            p = r.get("pty")
+            print("%-12s %5d %9.2f %9.2f %10.2f %10.2f %11s %11s" %
+                  (r["transcript"], r["queries"], s["split_us"], s["parse_us"],
+                   s["decode_us"], s["total_us"],
+                   "%.1f" % p["p50_us"] if p else "-",
+                   "%.1f" % p["p95_us"] if p else "-"))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance)
+        out = sys.stderr if args.json == "-" else sys.stdout
+        for name, figure, before, after in found:
+            out.write("regression: %s %s %.3f -> %.3f (%.2fx)\n" %
+                      (name, figure, before, after, after / before))
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,7 @@
 
 from .utils import *
 from .protocols import ECU, ECU_HEADER
+from .protocols.protocol import Message
 from .OBDResponse import OBDResponse
 
 import logging
@@ -58,6 +59,11 @@ class OBDCommand:
         self.fast = fast  # can an extra digit be added to the end of the command? (to make the ELM return early)
         self.header = header  # ECU header used for the queries
 
+        # decoders for physical values (see decoders.quantity()) can skip pint
+        self.__raw_decode = getattr(decoder, "raw", None)
+        self.__unit = getattr(decoder, "unit", None)
+        self.__unit_id = getattr(decoder, "unit_id", None)
+
     def clone(self):
         return OBDCommand(self.name,
                           self.desc,
@@ -87,38 +93,71 @@ class OBDCommand:
         # filter for applicable messages (from the right ECU(s))
         messages = [m for m in messages if (self.ecu & m.ecu) > 0]
 
-        # guarantee data size for the decoder
-        for m in messages:
-            self.__constrain_message_data(m)
+        if not messages:
+            logger.info(str(self) + " did not receive any acceptable messages")
 
         # create the response object with the raw data received
-        # and reference to original command
-        r = OBDResponse(self, messages)
-        if messages:
-            r.value = self.decode(messages)
+        # and reference to original command. Decoding is left until
+        # the value is asked for (see decode_into())
+        return OBDResponse(self, messages, lazy=True)
+
+    def decode_into(self, r):
+        """ decodes the messages of the given response, and sets its value """
+        if not r.messages:
+            return
+
+        # guarantee data size for the decoder, on copies, so that
+        # the response keeps the data as it was received
+        messages = [self.__constrain_message_data(m) for m in r.messages]
+
+        if self.__raw_decode is not None:
+            v = self.__raw_decode(messages)
+            if v is not None:
+                r.set_magnitude(v, self.__unit, self.__unit_id)
         else:
-            logger.info(str(self) + " did not receive any acceptable messages")
+            r.value = self.decode(messages)
 
+    def from_raw(self, raw_data, t=None):
+        """
+            rebuilds an (undecoded) response from the data kept by
+            OBDResponse.raw_data, ie: to decode archived samples later on
+        """
+        messages = []
+        for data in raw_data:
+            m = Message([])
+            m.ecu = self.ecu
+            m.data = bytearray(data)
+            messages.append(m)
+        r = OBDResponse(self, messages, lazy=True)
+        if t is not None:
+            r.time = t
         return r
 
     def __constrain_message_data(self, message):
-        """ pads or chops the data field to the size specified by this command """
-        len_msg_data = len(message.data)
+        """ returns a copy of the message, with the data padded or chopped to the size specified by this command """
+        data = message.data
+        len_msg_data = len(data)
         if self.bytes > 0:
             if len_msg_data > self.bytes:
                 # chop off the right side
-                message.data = message.data[:self.bytes]
+                data = data[:self.bytes]
                 logger.debug(
                     "Message was longer than expected (%s>%s). " +
                     "Trimmed message: %s", len_msg_data, self.bytes,
-                    repr(message.data))
+                    repr(data))
             elif len_msg_data < self.bytes:
                 # pad the right with zeros
-                message.data += (b'\x00' * (self.bytes - len_msg_data))
+                data = data + (b'\x00' * (self.bytes - len_msg_data))
                 logger.debug(
                     "Message was shorter than expected (%s<%s). " +
                     "Padded message: %s", len_msg_data, self.bytes,
-                    repr(message.data))
+                    repr(data))
+        if data is message.data:
+            return message
+        copy = Message(message.frames)
+        copy.ecu = message.ecu
+        copy.data = data
+        return copy
 
     def __str__(self):
         if self.header != ECU_HEADER.ENGINE:
@@ -45,33 +45,118 @@ else:
     string_types = (str,)
 
 
-class OBDResponse:
-    """ Standard response object for any OBDCommand """
+class OBDResponse(object):
+    """
+        Standard response object for any OBDCommand
 
-    def __init__(self, command=None, messages=None):
+        Responses from OBDCommands keep the messages as they were received,
+        and are only decoded when their value (or magnitude, unit, or
+        is_null()) is first asked for. The result is then cached.
+
+        Physical values are kept as a plain number and a unit (see
+        set_magnitude()), and only made into a pint Quantity when the
+        value is asked for. Use magnitude and unit to skip pint entirely.
+    """
+
+    def __init__(self, command=None, messages=None, lazy=False):
         self.command = command
         self.messages = messages if messages else []
-        self.value = None
+        self.__pending = lazy and bool(self.messages)  # decoding left to do
+        self.__value = None
+        self.__magnitude = None
+        self.__unit = None
+        self.__unit_id = None
         self.time = time.time()
 
+    def __decode(self):
+        self.command.decode_into(self)
+        self.__pending = False
+
+    @property
+    def decoded(self):
+        """ whether the messages were decoded already (or never needed to be) """
+        return not self.__pending
+
+    @property
+    def raw_data(self):
+        """ the data of each message, as received, ie: [b'\\x41\\x0C\\x1A\\xF8'] """
+        return [bytes(m.data) for m in self.messages]
+
+    @property
+    def value(self):
+        if self.__pending:
+            self.__decode()
+        if self.__value is None and self.__magnitude is not None:
+            from .UnitsAndScaling import Unit  # local import to avoid cyclic-dependency
+            self.__value = Unit.Quantity(self.__magnitude, self.__unit)
+        return self.__value
+
+    @value.setter
+    def value(self, value):
+        self.__pending = False
+        self.__value = value
+        self.__magnitude = None
+
+    def set_magnitude(self, magnitude, unit, unit_id):
+        """ sets the value as a number in the given pint unit, named unit_id """
+        self.__pending = False
+        self.__value = None
+        self.__magnitude = magnitude
+        self.__unit = unit
+        self.__unit_id = unit_id
+
+    @property
+    def magnitude(self):
+        """ the number in a Quantity value, without building the Quantity """
+        if self.__pending:
+            self.__decode()
+        if self.__magnitude is not None:
+            return self.__magnitude
+        from .UnitsAndScaling import Unit  # local import to avoid cyclic-dependency
+        if isinstance(self.__value, Unit.Quantity):
+            return self.__value.m
+        return None
+
     @property
     def unit(self):
         # for backwards compatibility
-        from obd import Unit  # local import to avoid cyclic-dependency
-        if isinstance(self.value, Unit.Quantity):
-            return str(self.value.u)
-        elif self.value is None:
+        if self.__pending:
+            self.__decode()
+        if self.__magnitude is not None:
+            return self.__unit_id
+        from .UnitsAndScaling import Unit  # local import to avoid cyclic-dependency
+        if isinstance(self.__value, Unit.Quantity):
+            return str(self.__value.u)
+        elif self.__value is None:
             return None
         else:
-            return str(type(self.value))
+            return str(type(self.__value))
 
     def is_null(self):
-        return (not self.messages) or (self.value == None)
+        if self.__pending:
+            self.__decode()
+        return (not self.messages) or (self.__value is None and self.__magnitude is None)
 
     def __str__(self):
         return str(self.value)
 
 
+def decode_all(responses, quantities=True):
+    """
+        Decodes a batch of (lazy) responses, and returns their values in
+        the same order. With quantities=False, physical values are given as
+        plain numbers (see OBDResponse.magnitude), skipping pint. Responses
+        that aren't in the batch are left undecoded.
+    """
+    if quantities:
+        return [r.value for r in responses]
+    values = []
+    for r in responses:
+        m = r.magnitude
+        values.append(r.value if m is None else m)
+    return values
+
+
 """
     Special value types used in OBDResponses
     instantiated in decoders.py
@@ -105,28 +190,86 @@ class StatusTest():
         return "Test %s: %s, %s" % (self.name, a, c)
 
 
-class Monitor:
-    def __init__(self):
-        self._tests = {}  # tid : MonitorTest
+# the TIDs of the standard tests, by name
+_TEST_NAMES = dict((v[0], tid) for tid, v in TEST_IDS.items())
 
-        # make the standard TIDs available as null monitor tests
-        # until real data comes it. This also prevents things from
-        # breaking when the user looks up a standard test that's null.
-        null_test = MonitorTest()
 
-        for tid in TEST_IDS:
-            name = TEST_IDS[tid][0]
-            self.__dict__[name] = null_test
-            self._tests[tid] = null_test
+class Monitor:
+    """
+        The test results of a mode 06 response, kept as columns with one
+        entry per test result, as received. MonitorTest objects (and their
+        pint values) are only built when a test is looked up.
+    """
+
+    def __init__(self):
+        self.tids = []  # Test IDs
+        self.units = []  # pint units of the values (None for booleans)
+        self.values = []  # test values, as plain numbers
+        self.mins = []  # minimum acceptable values
+        self.maxs = []  # maximum acceptable values
+
+        self._rows = {}  # tid : row in the columns (None for add_test())
+        self._tests = {}  # tid : MonitorTest, built on demand
+        self._names = {}  # name : tid, for non-standard tests
+
+    def add_results(self, tids, units, values, mins, maxs):
+        """ adds test results, given as columns of plain numbers and their units """
+        row = len(self.tids)
+        for tid in tids:
+            self._rows[tid] = row
+            self._tests.pop(tid, None)
+            if tid not in TEST_IDS:
+                self._names["Unknown"] = tid
+            row += 1
+        self.tids += tids
+        self.units += units
+        self.values += values
+        self.mins += mins
+        self.maxs += maxs
 
     def add_test(self, test):
+        self._rows[test.tid] = None
         self._tests[test.tid] = test
         if test.name is not None:
-            self.__dict__[test.name] = test
+            self._names[test.name] = test.tid
+
+    @property
+    def passed(self):
+        """ whether each test result (in the columns) passed """
+        return [lo <= v <= hi for v, lo, hi in zip(self.values, self.mins, self.maxs)]
 
     @property
     def tests(self):
-        return [test for test in self._tests.values() if not test.is_null()]
+        # standard tests first, as they were in the original table
+        tids = [tid for tid in TEST_IDS if tid in self._rows]
+        tids += [tid for tid in self._rows if tid not in TEST_IDS]
+        return [test for test in map(self.__getitem__, tids) if not test.is_null()]
+
+    def __test(self, tid):
+        test = self._tests.get(tid)
+        if test is not None:
+            return test
+
+        row = self._rows.get(tid)
+        if row is None:
+            if tid not in TEST_IDS:
+                return MonitorTest()
+            # standard tests are always present, if only as null tests
+            test = MonitorTest()
+        else:
+            from .UnitsAndScaling import Unit  # local import to avoid cyclic-dependency
+            test = MonitorTest()
+            test.tid = tid
+            test.name, test.desc = TEST_IDS.get(tid, ("Unknown", "Unknown"))
+            unit = self.units[row]
+            if unit is None:  # not a physical value, ie: a boolean
+                test.value, test.min, test.max = self.values[row], self.mins[row], self.maxs[row]
+            else:
+                test.value = Unit.Quantity(self.values[row], unit)
+                test.min = Unit.Quantity(self.mins[row], unit)
+                test.max = Unit.Quantity(self.maxs[row], unit)
+        self._tests[tid] = test
+        return test
 
     def __str__(self):
         if len(self.tests) > 0:
@@ -135,13 +278,25 @@ class Monitor:
             return "No tests to report"
 
     def __len__(self):
-        return len(self.tests)
+        return len([tid for tid, row in self._rows.items()
+                    if row is not None or not self._tests[tid].is_null()])
+
+    def __getattr__(self, name):
+        # standard tests by name, ie: monitor.RTL_THRESHOLD_VOLTAGE
+        if not name.startswith("_"):
+            tid = self._names.get(name, _TEST_NAMES.get(name))
+            if tid is not None:
+                return self.__test(tid)
+        raise AttributeError(name)
 
     def __getitem__(self, key):
         if isinstance(key, int):
-            return self._tests.get(key, MonitorTest())
+            return self.__test(key)
         elif isinstance(key, string_types):
-            return self.__dict__.get(key, MonitorTest())
+            tid = self._names.get(key, _TEST_NAMES.get(key))
+            if tid is None:
+                return MonitorTest()
+            return self.__test(tid)
         else:
             logger.warning("Monitor test results can only be retrieved by TID value or property name")
 
@@ -55,7 +55,8 @@ class UAS:
         self.unit = unit
         self.offset = offset
 
-    def __call__(self, _bytes):
+    def raw(self, _bytes):
+        """ the value as a plain number, in self.unit """
         value = bytes_to_int(_bytes)
 
         if self.signed:
@@ -63,7 +64,10 @@ class UAS:
 
         value *= self.scale
         value += self.offset
-        return Unit.Quantity(value, self.unit)
+        return value
+
+    def __call__(self, _bytes):
+        return Unit.Quantity(self.raw(_bytes), self.unit)
 
 
 # dict for looking up standardized UAS IDs with conversion objects
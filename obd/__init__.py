@@ -42,7 +42,9 @@ from .obd import OBD
 from .asynchronous import Async
 from .commands import commands
 from .OBDCommand import OBDCommand
-from .OBDResponse import OBDResponse
+from .OBDResponse import OBDResponse, decode_all
+from .profile import ConnectionProfile, ProfileStore
+from .can_filter import CANFilter
 from .protocols import ECU
 from .utils import scan_serial, OBDStatus
 from .UnitsAndScaling import Unit
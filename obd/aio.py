@@ -0,0 +1,557 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# aio.py                                                               #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+
+"""
+    asyncio flavour of the ELM327 and OBD classes.
+
+    The adapter's file descriptor is watched with the event loop's reader
+    callbacks, so waiting on the car costs neither a thread nor a sleep,
+    and one process can serve many consumers (and several adapters).
+    Responses go through the same Protocol parsers and OBDCommand
+    decoders as the blocking classes.
+
+    This module needs Python 3.5 or later, and isn't imported with the
+    obd package, so that the blocking classes don't: import obd.aio
+"""
+
+import asyncio
+import logging
+import os
+
+import serial
+
+from .OBDResponse import OBDResponse
+from .__version__ import __version__
+from .commands import commands
+from .elm327 import ELM327 as _ELM327
+from .protocols import UnknownProtocol, ECU_HEADER
+from .session import Handshake, Send, Write, Probe, SetBaudrate, QueryState, Steps, Return, \
+    load_commands, test_cmd
+from .utils import scan_serial, OBDStatus
+
+logger = logging.getLogger(__name__)
+
+
+class ELM327(object):
+    """
+        Handles communication with the ELM327 adapter, from an event loop.
+
+        Takes the same arguments as obd.elm327.ELM327, but the
+        initialization happens in connect(), which must be awaited.
+        Commands are sent one at a time; concurrent callers take turns.
+
+        Ports without a file descriptor (loop://, socket://, etc)
+        are not supported.
+    """
+
+    # how long a whole response may take (the serial timeout of the blocking ELM327)
+    RESPONSE_TIMEOUT = 10
+
+    def __init__(self, portname, baudrate=None, protocol=None, timeout=0.1,
+                 check_voltage=True, compact=False):
+        self.__portname = portname
+        self.__baudrate = baudrate
+        self.__protocol_id = protocol
+        self.__check_voltage = check_voltage
+        self.__want_compact = compact
+        self.__compact = False  # whether the adapter dropped the spaces (ATS0)
+        self.timeout = timeout
+
+        self.__status = OBDStatus.NOT_CONNECTED
+        self.__port = None
+        self.__fd = None
+        self.__loop = None
+        self.__lock = None
+        self.__handshake = None  # made anew by each connect()
+        self.__protocol = UnknownProtocol([])
+        self.__buffer = bytearray()  # filled by the reader callback
+        self.__waiter = None  # future, resolved when the prompt arrives
+
+    async def connect(self):
+        """
+            Opens the port, resets the device and connects to the car,
+            the same way obd.elm327.ELM327() does. Returns the status.
+        """
+
+        logger.info("Initializing ELM327 (asyncio): PORT=%s BAUD=%s PROTOCOL=%s" %
+                    (
+                        self.__portname,
+                        "auto" if self.__baudrate is None else self.__baudrate,
+                        "auto" if self.__protocol_id is None else self.__protocol_id,
+                    ))
+
+        # ------------- open port -------------
+        try:
+            self.__port = serial.serial_for_url(self.__portname,
+                                                parity=serial.PARITY_NONE,
+                                                stopbits=1,
+                                                bytesize=8,
+                                                timeout=0)  # the event loop does the waiting
+            self.__fd = self.__port.fileno()
+        except (serial.SerialException, OSError) as e:
+            self.__error(e)
+            return self.__status
+        except (AttributeError, NotImplementedError):
+            self.__error("%s has no file descriptor to watch" % self.__portname)
+            return self.__status
+
+        self.__loop = asyncio.get_event_loop()
+        self.__lock = asyncio.Lock()
+        self.__loop.add_reader(self.__fd, self.__on_readable)
+
+        self.__handshake = Handshake(self.__portname, self.__protocol_id,
+                                     self.__check_voltage, self.__want_compact)
+
+        # ------------------------ find the ELM's baud ------------------------
+        if not await self.__run(self.__handshake.set_baudrate(self.__baudrate)):
+            self.__error("Failed to set baudrate")
+            return self.__status
+
+        # ------------ reset, set up, and connect to the car -----------------
+        ok = await self.__run(self.__handshake.reset())
+        self.__status = self.__handshake.status
+        if not ok:
+            self.__error(self.__handshake.error)
+        elif self.__status == OBDStatus.CAR_CONNECTED:
+            logger.info("Connected Successfully: PORT=%s BAUD=%s PROTOCOL=%s" %
+                        (
+                            self.__portname,
+                            self.__port.baudrate,
+                            self.__protocol.ELM_ID,
+                        ))
+
+        return self.__status
+
+    async def __run(self, steps):
+        """
+            Runs one of the Handshake's generators over the port (see
+            obd.session), and picks up the protocol it ends with.
+            Returns the generator's result.
+        """
+        steps = Steps(steps)
+        try:
+            request = steps.send(None)
+            while True:
+                request = steps.send(await self.__answer(request))
+        except Return as r:
+            result = r.value
+        self.__protocol = self.__handshake.protocol
+        self.__compact = self.__handshake.compact
+        return result
+
+    async def __answer(self, request):
+        """ answers a Handshake request """
+        if isinstance(request, Send):
+            return await self.__send(request.cmd, delay=request.delay)
+        if isinstance(request, Write):
+            self.__write(request.cmd)
+            if request.delay is not None:
+                await asyncio.sleep(request.delay)
+            return None
+        if isinstance(request, Probe):
+            self.__port.baudrate = request.baud
+            self.__port.reset_output_buffer()
+
+            # a nonsense command, see obd.elm327.ELM327.__probe_baudrate()
+            self.__write(b"\x7F\x7F")
+            response = await self.__read(self.timeout)
+            logger.debug("Response from baud %d: %s" % (request.baud, repr(response)))
+            return response.endswith(_ELM327.ELM_PROMPT)
+        if isinstance(request, SetBaudrate):
+            self.__port.baudrate = request.baud
+            return None
+        raise ValueError("Unknown request: %r" % request)
+
+    def __error(self, msg):
+        """ handles fatal failures, print logger.info info and closes serial """
+        self.close()
+        logger.error(str(msg))
+
+    def port_name(self):
+        if self.__port is not None:
+            return self.__port.portstr
+        else:
+            return ""
+
+    def status(self):
+        return self.__status
+
+    def ecus(self):
+        return self.__protocol.ecu_map.values()
+
+    def protocol_name(self):
+        return self.__protocol.ELM_NAME
+
+    def protocol_id(self):
+        return self.__protocol.ELM_ID
+
+    def ecu_map(self):
+        """ returns a copy of the protocol's {tx_id: ECU} map """
+        return dict(self.__protocol.ecu_map)
+
+    def baudrate(self):
+        if self.__port is not None:
+            return self.__port.baudrate
+        else:
+            return None
+
+    def compact(self):
+        """ returns a boolean for whether responses come without spaces (ATS0) """
+        return self.__compact
+
+    def close(self):
+        """
+            Resets the device, and sets all
+            attributes to unconnected states.
+        """
+
+        self.__status = OBDStatus.NOT_CONNECTED
+        self.__protocol = UnknownProtocol([])
+
+        if self.__port is not None:
+            logger.info("closing port")
+            self.__write(b"ATZ")
+            self.__release()
+
+    def __release(self):
+        """ stops watching the port, and closes it """
+        if self.__loop is not None and self.__fd is not None:
+            self.__loop.remove_reader(self.__fd)
+        if self.__port is not None:
+            self.__port.close()
+        self.__port = None
+        self.__fd = None
+
+        # wake up anyone still waiting for a response
+        if self.__waiter is not None and not self.__waiter.done():
+            self.__waiter.set_result(None)
+
+    async def send_and_parse(self, cmd):
+        """
+            send() coroutine used to service all OBDCommands
+
+            Sends the given command string, and parses the
+            response lines with the protocol object.
+
+            An empty command string will re-trigger the previous command
+
+            Returns a list of Message objects
+        """
+
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            logger.info("cannot send_and_parse() when unconnected")
+            return None
+
+        async with self.__lock:
+            lines = await self.__send(cmd)
+        return self.__protocol(lines)
+
+    async def __send(self, cmd, delay=None):
+        """
+            unprotected send() coroutine
+
+            will __write() the given string, no questions asked.
+            returns the response (a list of line strings)
+            after an optional delay.
+        """
+        self.__write(cmd)
+
+        if delay is not None:
+            logger.debug("wait: %d seconds" % delay)
+            await asyncio.sleep(delay)
+
+        buffer = await self.__read(self.RESPONSE_TIMEOUT)
+        if not buffer:
+            logger.warning("Failed to read port")
+        return _ELM327.split_lines(buffer)
+
+    def __write(self, cmd):
+        """
+            "low-level" function to write a string to the port
+        """
+
+        if self.__port is None:
+            logger.info("cannot perform __write() when unconnected")
+            return
+
+        cmd += b"\r"  # terminate with carriage return in accordance with ELM327 and STN11XX specifications
+        logger.debug("write: " + repr(cmd))
+        try:
+            # dump everything in the input buffers, read or not
+            del self.__buffer[:]
+            self.__port.reset_input_buffer()
+            self.__port.write(cmd)
+        except Exception:
+            self.__status = OBDStatus.NOT_CONNECTED
+            self.__release()
+            logger.critical("Device disconnected while writing")
+
+    async def __read(self, timeout):
+        """
+            waits (up to the timeout, in seconds) for the prompt character,
+            and returns everything received until then, as a bytearray
+        """
+
+        if self.__port is not None and _ELM327.ELM_PROMPT not in self.__buffer:
+            self.__waiter = self.__loop.create_future()
+            try:
+                await asyncio.wait_for(self.__waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.__waiter = None
+
+        buffer = bytearray(self.__buffer)
+        del self.__buffer[:]
+
+        # log, and remove the "bytearray(   ...   )" part
+        logger.debug("read: " + repr(buffer)[10:-1])
+        return buffer
+
+    def __on_readable(self):
+        """ reader callback: collects whatever arrived, and wakes __read() on the prompt """
+        try:
+            data = os.read(self.__fd, _ELM327.READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            # readable, yet nothing to read: the other end hung up
+            self.__status = OBDStatus.NOT_CONNECTED
+            self.__release()
+            logger.critical("Device disconnected while reading")
+            return
+
+        # only scan the bytes that just arrived
+        start = len(self.__buffer)
+        self.__buffer.extend(data)
+
+        if self.__waiter is not None and not self.__waiter.done() and \
+           self.__buffer.find(_ELM327.ELM_PROMPT, start) != -1:
+            self.__waiter.set_result(None)
+
+
+class OBD(object):
+    """
+        Class representing an OBD-II connection, for use with asyncio.
+
+        Same arguments as obd.OBD, but the connection is made by awaiting
+        connect() (or by entering an `async with` block), and query()
+        is a coroutine:
+
+            async with obd.aio.OBD("/dev/rfcomm0") as connection:
+                r = await connection.query(obd.commands.RPM)
+    """
+
+    def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True,
+                 timeout=0.1, check_voltage=True, compact=False):
+        self.interface = None
+        self.supported_commands = set(commands.base_commands())
+        self.fast = fast  # global switch for disabling optimizations
+        self.timeout = timeout
+        self.__portstr = portstr
+        self.__baudrate = baudrate
+        self.__protocol = protocol
+        self.__check_voltage = check_voltage
+        self.__compact = compact
+        self.__lock = None  # keeps a query's header, command and response together
+        self.__state = QueryState()  # last command, header and frame counts
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False  # don't suppress any exceptions
+
+    async def connect(self):
+        """
+            Connects to the adapter and the car, and loads the supported
+            commands. Returns the connection status.
+        """
+
+        logger.info("======================= python-OBD (v%s) =======================" % __version__)
+        self.__lock = asyncio.Lock()
+
+        if self.__portstr is None:
+            logger.info("Using scan_serial to select port")
+            port_names = scan_serial()
+            logger.info("Available ports: " + str(port_names))
+
+            if not port_names:
+                logger.warning("No OBD-II adapters found")
+        else:
+            logger.info("Explicit port defined")
+            port_names = [self.__portstr]
+
+        for port in port_names:
+            logger.info("Attempting to use port: " + str(port))
+            self.interface = ELM327(port, self.__baudrate, self.__protocol,
+                                    self.timeout, self.__check_voltage,
+                                    self.__compact)
+            if await self.interface.connect() != OBDStatus.NOT_CONNECTED:
+                break  # success! stop searching for serial
+
+        # if the connection failed, close it
+        if self.status() == OBDStatus.NOT_CONNECTED:
+            # the ELM327 class will report its own errors
+            await self.close()
+        else:
+            await self.__load_commands()
+
+        logger.info("===================================================================")
+        return self.status()
+
+    async def __load_commands(self):
+        """
+            Queries for available PIDs, sets their support status,
+            and compiles a list of command objects.
+        """
+
+        if self.status() != OBDStatus.CAR_CONNECTED:
+            logger.warning("Cannot load commands: No connection to car")
+            return
+
+        steps = load_commands(self.supported_commands, self.test_cmd)
+        try:
+            get = next(steps)
+            while True:
+                get = steps.send(await self.query(get))
+        except StopIteration:
+            pass
+
+    async def __set_header(self, header):
+        cmd = self.__state.header_command(header)
+        if cmd is not None:
+            self.__state.header_sent(header, await self.interface.send_and_parse(cmd))
+
+    async def close(self):
+        """
+            Closes the connection, and clears supported_commands
+        """
+
+        self.supported_commands = set()
+
+        if self.interface is not None:
+            logger.info("Closing connection")
+            if self.status() != OBDStatus.NOT_CONNECTED:
+                await self.__set_header(ECU_HEADER.ENGINE)
+            self.interface.close()
+            self.interface = None
+
+    def status(self):
+        """ returns the OBD connection status """
+        if self.interface is None:
+            return OBDStatus.NOT_CONNECTED
+        else:
+            return self.interface.status()
+
+    def protocol_name(self):
+        """ returns the name of the protocol being used by the ELM327 """
+        if self.interface is None:
+            return ""
+        else:
+            return self.interface.protocol_name()
+
+    def protocol_id(self):
+        """ returns the ID of the protocol being used by the ELM327 """
+        if self.interface is None:
+            return ""
+        else:
+            return self.interface.protocol_id()
+
+    def port_name(self):
+        """ Returns the name of the currently connected port """
+        if self.interface is not None:
+            return self.interface.port_name()
+        else:
+            return ""
+
+    def is_connected(self):
+        """ Returns a boolean for whether a connection with the car was made """
+        return self.status() == OBDStatus.CAR_CONNECTED
+
+    def supports(self, cmd):
+        """
+            Returns a boolean for whether the given command
+            is supported by the car
+        """
+        return cmd in self.supported_commands
+
+    def test_cmd(self, cmd, warn=True):
+        """
+            Returns a boolean for whether a command will
+            be sent without using force=True.
+        """
+        return test_cmd(cmd, self.supported_commands, self.protocol_id(), warn)
+
+    async def query(self, cmd, force=False):
+        """
+            primary API coroutine. Sends commands to the car, and
+            protects against sending unsupported commands.
+        """
+
+        if self.status() == OBDStatus.NOT_CONNECTED:
+            logger.warning("Query failed, no connection available")
+            return OBDResponse()
+
+        # if the user forces, skip all checks
+        if not force and not self.test_cmd(cmd):
+            return OBDResponse()
+
+        async with self.__lock:
+            await self.__set_header(cmd.header)
+
+            logger.info("Sending command: %s" % str(cmd))
+            cmd_string = self.__state.command_string(cmd, self.fast)
+            messages = await self.interface.send_and_parse(cmd_string)
+            self.__state.command_sent(cmd, cmd_string, messages)
+
+        if not messages:
+            logger.info("No valid OBD Messages returned")
+            return OBDResponse()
+
+        return cmd(messages)  # compute a response object
+
+    async def query_many(self, cmds, force=False):
+        """
+            Sends a list of OBDCommands, one after the other,
+            and returns a list of OBDResponses in the same order.
+        """
+        responses = []
+        for c in cmds:
+            responses.append(await self.query(c, force))
+        return responses
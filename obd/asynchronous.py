@@ -30,7 +30,9 @@
 #                                                                      #
 ########################################################################
 
+import math
 import time
+from collections import OrderedDict
 import threading
 import logging
 from .OBDResponse import OBDResponse
@@ -38,6 +40,59 @@ from .obd import OBD
 
 logger = logging.getLogger(__name__)
 
+try:
+    _clock = time.monotonic
+except AttributeError:  # python 2
+    _clock = time.time
+
+
+class WatchStats(object):
+    """
+        Sampling statistics for a watch()ed command: how often it was
+        actually read, how regular that was, and how many of its
+        deadlines went by without a read.
+    """
+
+    def __init__(self, period):
+        self.period = period  # requested seconds between reads
+        self.samples = 0
+        self.missed = 0  # deadlines skipped because the bus was busy
+        self.__last = None
+        self.__intervals = 0
+        self.__mean = 0.0  # running mean and M2 of the read intervals (Welford)
+        self.__m2 = 0.0
+
+    def record(self, t):
+        """ records a read completed at time t """
+        if self.__last is not None:
+            interval = t - self.__last
+            self.__intervals += 1
+            delta = interval - self.__mean
+            self.__mean += delta / self.__intervals
+            self.__m2 += delta * (interval - self.__mean)
+        self.__last = t
+        self.samples += 1
+
+    def restart(self):
+        """ forgets the last read, so that a pause isn't counted as an interval """
+        self.__last = None
+
+    @property
+    def rate(self):
+        """ achieved reads per second """
+        return 1.0 / self.__mean if self.__mean > 0 else 0.0
+
+    @property
+    def jitter(self):
+        """ standard deviation of the read intervals, in seconds """
+        if self.__intervals < 2:
+            return 0.0
+        return math.sqrt(self.__m2 / (self.__intervals - 1))
+
+    def __str__(self):
+        return "WatchStats(period=%.3fs samples=%d rate=%.2fHz jitter=%.1fms missed=%d)" % \
+            (self.period, self.samples, self.rate, self.jitter * 1000, self.missed)
+
 
 class Async(OBD):
     """
@@ -47,12 +102,18 @@ class Async(OBD):
 
     def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True,
                  timeout=0.1, check_voltage=True, start_low_power=False,
-                 delay_cmds=0.25):
+                 delay_cmds=0.25, profile=None, max_baudrate=None,
+                 compact=False):
         self.__thread = None
         super(Async, self).__init__(portstr, baudrate, protocol, fast,
-                                    timeout, check_voltage, start_low_power)
-        self.__commands = {}   # key = OBDCommand, value = Response
+                                    timeout, check_voltage, start_low_power,
+                                    profile, max_baudrate, compact)
+        # key = OBDCommand, value = Response, in watch() order: ties between
+        # deadlines are sent in that order
+        self.__commands = OrderedDict()
         self.__callbacks = {}  # key = OBDCommand, value = list of Functions
+        self.__deadlines = {}  # key = OBDCommand, value = time of the next read
+        self.__stats = {}  # key = OBDCommand, value = WatchStats
         self.__running = False
         self.__was_running = False  # used with __enter__() and __exit__()
         self.__delay_cmds = delay_cmds
@@ -73,6 +134,11 @@ class Async(OBD):
 
         if self.__thread is None:
             logger.info("Starting async thread")
+            # everything is due right away
+            now = _clock()
+            for c in self.__commands:
+                self.__deadlines[c] = now
+                self.__stats[c].restart()
             self.__running = True
             self.__thread = threading.Thread(target=self.run)
             self.__thread.daemon = True
@@ -121,11 +187,14 @@ class Async(OBD):
         self.stop()
         super(Async, self).close()
 
-    def watch(self, c, callback=None, force=False):
+    def watch(self, c, callback=None, force=False, period=None):
         """
             Subscribes the given command for continuous updating. Once subscribed,
             query() will return that command's latest value. Optional callbacks can
             be given, which will be fired upon every new value.
+
+            The command is read every `period` seconds (delay_cmds by default).
+            Watching an already watched command again changes its period.
         """
 
         # the dict shouldn't be changed while the daemon thread is iterating
@@ -143,6 +212,11 @@ class Async(OBD):
                 self.__commands[c] = OBDResponse()  # give it an initial value
                 self.__callbacks[c] = []  # create an empty list
 
+            if period is None:
+                period = self.__delay_cmds
+            if c not in self.__stats or self.__stats[c].period != period:
+                self.__stats[c] = WatchStats(period)
+
             # if a callback was given, push it
             if hasattr(callback, "__call__") and (callback not in self.__callbacks[c]):
                 logger.info("subscribing callback for command: %s" % str(c))
@@ -169,10 +243,14 @@ class Async(OBD):
                     # if no more callbacks are left, remove the command entirely
                     if len(self.__callbacks[c]) == 0:
                         self.__commands.pop(c, None)
+                        self.__stats.pop(c, None)
+                        self.__deadlines.pop(c, None)
                 else:
                     # no callback was specified, pop everything
                     self.__callbacks.pop(c, None)
                     self.__commands.pop(c, None)
+                    self.__stats.pop(c, None)
+                    self.__deadlines.pop(c, None)
 
     def unwatch_all(self):
         """ Unsubscribes all commands and callbacks from being updated """
@@ -182,8 +260,24 @@ class Async(OBD):
             logger.warning("Can't unwatch_all() while running, please use stop()")
         else:
             logger.info("Unwatching all")
-            self.__commands = {}
+            self.__commands = OrderedDict()
             self.__callbacks = {}
+            self.__stats = {}
+            self.__deadlines = {}
+
+    def monitor(self, max_pending=1024, can_filter=None):
+        """ see OBD.monitor(), which can't share the adapter with the update loop """
+        if self.__running:
+            logger.warning("Can't monitor() while running, please use stop()")
+            return iter([])
+        return super(Async, self).monitor(max_pending, can_filter)
+
+    def query_each(self, c, force=False):
+        """ see OBD.query_each(), which can't share the adapter with the update loop """
+        if self.__running:
+            logger.warning("Can't query_each() while running, please use stop()")
+            return iter([])
+        return super(Async, self).query_each(c, force)
 
     def query(self, c, force=False):
         """
@@ -196,6 +290,40 @@ class Async(OBD):
         else:
             return OBDResponse()
 
+    def query_many(self, cmds, force=False):
+        """
+            Non-blocking query_many().
+            Only commands that have been watch()ed will return valid responses
+        """
+        return [self.query(c) for c in cmds]
+
+    def stats(self, c=None):
+        """
+            Returns the WatchStats of a watched command (None if it isn't),
+            or a dict of them for every watched command
+        """
+        if c is None:
+            return dict(self.__stats)
+        return self.__stats.get(c, None)
+
+    def __schedule(self, c, now):
+        """ records a read of the given command, and sets its next deadline """
+        stats = self.__stats[c]
+        stats.record(now)
+
+        if stats.period <= 0:
+            self.__deadlines[c] = now  # as fast as possible
+            return
+
+        deadline = self.__deadlines[c] + stats.period
+        if deadline <= now:
+            # the next deadline(s) went by as well: skip rather than burst
+            # to catch up, but keep to the original grid
+            missed = int((now - deadline) / stats.period) + 1
+            stats.missed += missed
+            deadline += missed * stats.period
+        self.__deadlines[c] = deadline
+
     def run(self):
         """ Daemon thread """
 
@@ -203,24 +331,37 @@ class Async(OBD):
         while self.__running:
 
             if len(self.__commands) > 0:
-                # loop over the requested commands, send, and collect the response
-                for c in self.__commands:
-                    if not self.is_connected():
-                        logger.info("Async thread terminated because device disconnected")
-                        self.__running = False
-                        self.__thread = None
-                        return
-
-                    # force, since commands are checked for support in watch()
-                    r = super(Async, self).query(c, force=True)
-
+                if not self.is_connected():
+                    logger.info("Async thread terminated because device disconnected")
+                    self.__running = False
+                    self.__thread = None
+                    return
+
+                # earliest deadline first: every command that is due is
+                # sent, most overdue first, packed together where the
+                # protocol allows it
+                now = _clock()
+                cmds = sorted([c for c in self.__commands if self.__deadlines[c] <= now],
+                              key=self.__deadlines.get)
+
+                if len(cmds) == 0:
+                    # sleep until the next deadline (but stay responsive to stop())
+                    next_deadline = min(self.__deadlines[c] for c in self.__commands)
+                    time.sleep(max(min(next_deadline - now, 0.25), 0))
+                    continue
+
+                # force, since commands are checked for support in watch()
+                responses = super(Async, self).query_many(cmds, force=True)
+                now = _clock()
+
+                for c, r in zip(cmds, responses):
                     # store the response
                     self.__commands[c] = r
+                    self.__schedule(c, now)
 
                     # fire the callbacks, if there are any
                     for callback in self.__callbacks[c]:
                         callback(r)
-                time.sleep(self.__delay_cmds)
 
             else:
                 time.sleep(0.25)  # idle
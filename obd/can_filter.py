@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# can_filter.py                                                        #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CANFilter(object):
+    """
+        The set of CAN IDs that a monitor() consumer cares about.
+
+        The adapter is programmed to let (at least) these IDs through:
+        the ELM327 has a single filter/mask pair (ATCF/ATCM), which may
+        let a few other IDs through as well, while STN chips take a list
+        of pass filters (STFAP). Frames from other IDs are dropped in
+        software, and counted.
+
+        An empty filter lets everything through. The set can be changed
+        while monitoring; the adapter is re-programmed on the next frame.
+    """
+
+    def __init__(self, ids=None):
+        self.__ids = set(ids or [])
+        self.version = 0  # bumped on every change, so changes can be noticed
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __contains__(self, can_id):
+        return can_id in self.__ids
+
+    def ids(self):
+        """ returns the IDs, sorted """
+        return sorted(self.__ids)
+
+    def add(self, *ids):
+        """ subscribes to more CAN IDs """
+        if not set(ids) <= self.__ids:
+            self.__ids.update(ids)
+            self.version += 1
+
+    def remove(self, *ids):
+        """ unsubscribes from CAN IDs """
+        if set(ids) & self.__ids:
+            self.__ids.difference_update(ids)
+            self.version += 1
+
+    def clear(self):
+        """ lets everything through again """
+        if self.__ids:
+            self.__ids.clear()
+            self.version += 1
+
+    def accepts(self, can_id):
+        """ returns a boolean for whether frames from the given ID are wanted """
+        return not self.__ids or can_id in self.__ids
+
+    def mask(self, id_bits):
+        """
+            Returns the (filter, mask) pair for ATCF/ATCM that lets all
+            of the IDs through: the mask keeps the bits they all share.
+
+                7E8, 7E9, 7EA  -->  filter 7E8, mask 7FC
+        """
+        ids = self.ids()
+        differ = 0
+        for i in ids[1:]:
+            differ |= ids[0] ^ i
+        mask = ((1 << id_bits) - 1) & ~differ
+        return ids[0] & mask, mask
+
+    def program(self, state, id_bits, stn=False):
+        """
+            Returns the adapter commands that take its hardware filters
+            from the given state to this set of IDs, and the new state.
+
+            The state is opaque, and should be kept for the next call.
+            None stands for the adapter's defaults (no filtering). Only
+            what changed is sent, except that STN pass filters can't be
+            removed one by one, so removing IDs re-sends the whole list.
+        """
+
+        width = 3 if id_bits == 11 else 8
+
+        def fmt(v):
+            return ("%0*X" % (width, v)).encode()
+
+        if not self.__ids:
+            if state is None:
+                return [], None
+            return [b"STFCP" if stn else b"ATCRA"], None
+
+        if stn:
+            wanted = frozenset(self.__ids)
+            old = state or frozenset()
+            if old - wanted:
+                cmds = [b"STFCP"]  # clear all the pass filters
+                add = wanted
+            else:
+                cmds = []
+                add = wanted - old
+            full = (1 << id_bits) - 1
+            cmds += [b"STFAP " + fmt(i) + b"," + fmt(full) for i in sorted(add)]
+            return cmds, wanted
+        else:
+            f, m = self.mask(id_bits)
+            old_f, old_m = state or (None, None)
+            cmds = []
+            if f != old_f:
+                cmds.append(b"ATCF " + fmt(f))
+            if m != old_m:
+                cmds.append(b"ATCM " + fmt(m))
+            return cmds, (f, m)
+
+    def __str__(self):
+        return "CANFilter(%s)" % ", ".join(["%X" % i for i in self.ids()])
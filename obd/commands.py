@@ -279,6 +279,13 @@ __mode7__ = [
     OBDCommand("GET_CURRENT_DTC", "Get DTCs from the current/last driving cycle", b"07", 0, dtc, ECU.ALL, False),
 ]
 
+__mode9__ = [
+    #                      name                             description                    cmd  bytes       decoder           ECU       fast
+    OBDCommand("PIDS_9A"                    , "Supported PIDs [01-20]"                  , b"0900", 6, pid,                   ECU.ENGINE, True),
+    OBDCommand("VIN_MESSAGE_COUNT"          , "VIN Message Count"                       , b"0901", 3, uas(0x01),             ECU.ENGINE, True),
+    OBDCommand("VIN"                        , "Vehicle Identification Number"           , b"0902", 0, vin,                   ECU.ENGINE, False),
+]
+
 __misc__ = [
     OBDCommand("ELM_VERSION", "ELM327 version string", b"ATI", 0, raw_string, ECU.UNKNOWN, False),
     OBDCommand("ELM_VOLTAGE", "Voltage detected by OBD-II adapter", b"ATRV", 0, elm_voltage, ECU.UNKNOWN, False),
@@ -303,6 +310,7 @@ class Commands():
             __mode6__,
             __mode7__,
             [],
+            __mode9__,
         ]
 
         # allow commands to be accessed by name
@@ -354,6 +362,7 @@ class Commands():
             self.GET_DTC,
             self.CLEAR_DTC,
             self.GET_CURRENT_DTC,
+            self.PIDS_9A,
             self.ELM_VERSION,
             self.ELM_VOLTAGE,
         ]
@@ -32,15 +32,21 @@
 
 import math
 import functools
+import struct
 from .utils import *
 from .codes import *
-from .OBDResponse import Status, StatusTest, Monitor, MonitorTest
-from .UnitsAndScaling import Unit, UAS_IDS
+from .OBDResponse import Status, StatusTest, Monitor
+from .UnitsAndScaling import Unit, UAS, UAS_IDS
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    from sys import intern
+except ImportError:
+    pass  # a builtin on Python 2
+
 '''
 All decoders take the form:
 
@@ -72,6 +78,29 @@ def raw_string(messages):
     return "\n".join([m.raw() for m in messages])
 
 
+"""
+Decoders for physical values return plain numbers, and are wrapped by
+quantity() with their unit. Called directly, they return pint Quantities.
+OBDCommands use the plain number instead, and leave the Quantity for
+OBDResponse.value to build, only if it's ever asked for.
+"""
+
+
+def quantity(unit):
+    """ decorator for decoders returning a number (or None) in the given unit """
+    def wrap(raw):
+        def decoder(messages):
+            v = raw(messages)
+            return None if v is None else Unit.Quantity(v, unit)
+        # a partial (see uas()) has no __name__, which Python 2 would copy regardless
+        functools.update_wrapper(decoder, raw, [a for a in functools.WRAPPER_ASSIGNMENTS if hasattr(raw, a)])
+        decoder.raw = raw
+        decoder.unit = unit
+        decoder.unit_id = intern(str(unit))  # as str(Quantity.u)
+        return decoder
+    return wrap
+
+
 """
 Some decoders are simple and are already implemented in the Units And Scaling
 tables (used mainly for Mode 06). The uas() decoder is a wrapper for any
@@ -81,138 +110,153 @@ Unit/Scaling in that table, simply to avoid redundant code.
 
 def uas(id_):
     """ get the corresponding decoder for this UAS ID """
-    return functools.partial(decode_uas, id_=id_)
+    return quantity(UAS_IDS[id_].unit)(functools.partial(decode_uas, id_=id_))
 
 
 def decode_uas(messages, id_):
     d = messages[0].data[2:]  # chop off mode and PID bytes
-    return UAS_IDS[id_](d)
+    return UAS_IDS[id_].raw(d)
 
 
 """
 General sensor decoders
-Return pint Quantities
+Return pint Quantities (see quantity())
 """
 
 
 # 0 to 100 %
+@quantity(Unit.percent)
 def percent(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = v * 100.0 / 255.0
-    return v * Unit.percent
+    return v
 
 
 # -100 to 100 %
+@quantity(Unit.percent)
 def percent_centered(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = (v - 128) * 100.0 / 128.0
-    return v * Unit.percent
+    return v
 
 
 # -40 to 215 C
+@quantity(Unit.celsius)  # non-multiplicative unit
 def temp(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v - 40
-    return Unit.Quantity(v, Unit.celsius)  # non-multiplicative unit
+    return v
 
 
 # -128 to 128 mA
+@quantity(Unit.milliampere)
 def current_centered(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d[2:4])
     v = (v / 256.0) - 128
-    return v * Unit.milliampere
+    return v
 
 
 # 0 to 1.275 volts
+@quantity(Unit.volt)
 def sensor_voltage(messages):
     d = messages[0].data[2:]
     v = d[0] / 200.0
-    return v * Unit.volt
+    return v
 
 
 # 0 to 8 volts
+@quantity(Unit.volt)
 def sensor_voltage_big(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d[2:4])
     v = (v * 8.0) / 65535
-    return v * Unit.volt
+    return v
 
 
 # 0 to 765 kPa
+@quantity(Unit.kilopascal)
 def fuel_pressure(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = v * 3
-    return v * Unit.kilopascal
+    return v
 
 
 # 0 to 255 kPa
+@quantity(Unit.kilopascal)
 def pressure(messages):
     d = messages[0].data[2:]
     v = d[0]
-    return v * Unit.kilopascal
+    return v
 
 
 # -8192 to 8192 Pa
+@quantity(Unit.pascal)
 def evap_pressure(messages):
     # decode the twos complement
     d = messages[0].data[2:]
     a = twos_comp(d[0], 8)
     b = twos_comp(d[1], 8)
     v = ((a * 256.0) + b) / 4.0
-    return v * Unit.pascal
+    return v
 
 
 # 0 to 327.675 kPa
+@quantity(Unit.kilopascal)
 def abs_evap_pressure(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v / 200.0
-    return v * Unit.kilopascal
+    return v
 
 
 # -32767 to 32768 Pa
+@quantity(Unit.pascal)
 def evap_pressure_alt(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v - 32767
-    return v * Unit.pascal
+    return v
 
 
 # -64 to 63.5 degrees
+@quantity(Unit.degree)
 def timing_advance(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = (v - 128) / 2.0
-    return v * Unit.degree
+    return v
 
 
 # -210 to 301 degrees
+@quantity(Unit.degree)
 def inject_timing(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = (v - 26880) / 128.0
-    return v * Unit.degree
+    return v
 
 
 # 0 to 2550 grams/sec
+@quantity(Unit.gps)
 def max_maf(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = v * 10
-    return v * Unit.gps
+    return v
 
 
 # 0 to 3212 Liters/hour
+@quantity(Unit.liters_per_hour)
 def fuel_rate(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v * 0.05
-    return v * Unit.liters_per_hour
+    return v
 
 
 # special bit encoding for PID 13
@@ -245,13 +289,28 @@ def o2_sensors_alt(messages):
 
 
 # 0 to 25700 %
+@quantity(Unit.percent)
 def absolute_load(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v *= 100.0 / 255.0
-    return v * Unit.percent
+    return v
+
+
+def vin(messages):
+    """ decodes the 17 character Vehicle Identification Number """
+    d = messages[0].data[2:]
+    # CAN prefixes the string with the number of data items (always 1),
+    # and the legacy protocols pad the first frame with zeros
+    d = bytes(d).lstrip(b"\x00\x01").strip()
+    try:
+        return d.decode("ascii")
+    except UnicodeDecodeError:
+        logger.warning("Failed to decode VIN")
+        return None
 
 
+@quantity(Unit.volt)
 def elm_voltage(messages):
     # doesn't register as a normal OBD response,
     # so access the raw frame data
@@ -261,7 +320,7 @@ def elm_voltage(messages):
     v = v.replace('v', '')
 
     try:
-        return float(v) * Unit.volt
+        return float(v)
     except ValueError:
         logger.warning("Failed to parse ELM voltage")
         return None
@@ -384,13 +443,16 @@ def fuel_type(messages):
     return v
 
 
-def parse_dtc(_bytes):
-    """ converts 2 bytes into a DTC code """
+# the first 2 characters of a DTC, by the first nibble of its 2 bytes
+_DTC_PREFIXES = [c + str(i) for c in "PCBU" for i in range(4)]
+
+# the DTCs decoded so far, by their 2 bytes as an integer. Filled on
+# demand: a car only ever reports a handful of distinct codes.
+_DTC_TABLE = {}
 
-    # check validity (also ignores padding that the ELM returns)
-    if (len(_bytes) != 2) or (_bytes == (0, 0)):
-        return None
 
+def _dtc_entry(v):
+    """ the (code, description) tuple for the 2 DTC bytes in v """
     # BYTES: (16,      35      )
     # HEX:    4   1    2   3
     # BIN:    01000001 00100011
@@ -398,12 +460,22 @@ def parse_dtc(_bytes):
     #         | / /
     # DTC:    C0123
 
-    dtc = ['P', 'C', 'B', 'U'][_bytes[0] >> 6]  # the last 2 bits of the first byte
-    dtc += str((_bytes[0] >> 4) & 0b0011)  # the next pair of 2 bits. Mask off the bits we read above
-    dtc += bytes_to_hex(_bytes)[1:4]
+    dtc = _DTC_PREFIXES[v >> 12] + "%03x" % (v & 0x0FFF)
 
     # pull a description if we have one
-    return (dtc, DTC.get(dtc, ""))
+    entry = _DTC_TABLE[v] = (dtc, DTC.get(dtc, ""))
+    return entry
+
+
+def parse_dtc(_bytes):
+    """ converts 2 bytes into a DTC code """
+
+    # check validity (also ignores padding that the ELM returns)
+    if (len(_bytes) != 2) or (_bytes == (0, 0)):
+        return None
+
+    v = (_bytes[0] << 8) | _bytes[1]
+    return _DTC_TABLE.get(v) or _dtc_entry(v)
 
 
 def single_dtc(messages):
@@ -414,51 +486,32 @@ def single_dtc(messages):
 
 def dtc(messages):
     """ converts a frame of 2-byte DTCs into a list of DTCs """
-    codes = []
-    d = []
-    for message in messages:
-        d += message.data[2:]  # remove the mode and DTC_count bytes
-
-    # look at data in pairs of bytes
-    # looping through ENDING indices to avoid odd (invalid) code lengths
-    for n in range(1, len(d), 2):
-
-        # parse the code
-        dtc = parse_dtc((d[n - 1], d[n]))
+    # remove the mode and DTC_count bytes
+    d = bytearray().join([message.data[2:] for message in messages])
 
-        if dtc is not None:
-            codes.append(dtc)
+    # look at data in pairs of bytes, dropping the odd (invalid) one
+    # at the end, and the 0000 padding that the ELM returns
+    codes = []
+    for v in struct.unpack(">%dH" % (len(d) // 2), d[:len(d) & ~1]):
+        if v:
+            codes.append(_DTC_TABLE.get(v) or _dtc_entry(v))
 
     return codes
 
 
-def parse_monitor_test(d, mon):
-    test = MonitorTest()
+# one test result: MID (left out), TID, UAS ID, value, min, max
+_MONITOR_TEST = struct.Struct(">xBBHHH")
+_UINT16 = struct.Struct(">H")
 
-    tid = d[1]
+if hasattr(_MONITOR_TEST, "iter_unpack"):
+    _monitor_tests = _MONITOR_TEST.iter_unpack
+    _uint16 = _UINT16.pack
+else:  # python 2, whose struct makes str, indexed by character
+    def _monitor_tests(d):
+        return [_MONITOR_TEST.unpack_from(d, i) for i in range(0, len(d), _MONITOR_TEST.size)]
 
-    if tid in TEST_IDS:
-        test.name = TEST_IDS[tid][0]  # lookup the name from the table
-        test.desc = TEST_IDS[tid][1]  # lookup the description from the table
-    else:
-        logger.debug("Encountered unknown Test ID")
-        test.name = "Unknown"
-        test.desc = "Unknown"
-
-    uas = UAS_IDS.get(d[2], None)
-
-    # if we can't decode the value, abort
-    if uas is None:
-        logger.debug("Encountered unknown Units and Scaling ID")
-        return None
-
-    # load the test results
-    test.tid = tid
-    test.value = uas(d[3:5])  # convert bytes to actual values
-    test.min = uas(d[5:7])
-    test.max = uas(d[7:])
-
-    return test
+    def _uint16(v):
+        return bytearray(_UINT16.pack(v))
 
 
 def monitor(messages):
@@ -467,7 +520,6 @@ def monitor(messages):
     # even though we never use the MID byte, it may
     # show up multiple times. Thus, keeping it make
     # for easier parsing.
-    mon = Monitor()
 
     # test that we got the right number of bytes
     extra_bytes = len(d) % 9
@@ -476,11 +528,39 @@ def monitor(messages):
         logger.debug("Encountered monitor message with non-multiple of 9 bytes. Truncating...")
         d = d[:len(d) - extra_bytes]
 
-    # look at data in blocks of 9 bytes (one test result)
-    for n in range(0, len(d), 9):
-        # extract the 9 byte block, and parse a new MonitorTest
-        test = parse_monitor_test(d[n:n + 9], mon)
-        if test is not None:
-            mon.add_test(test)
+    # unpack all of the 9 byte blocks (one test result each) in one pass,
+    # into columns of plain numbers: the Monitor only builds MonitorTests
+    # (and their pint values) when they're looked up
+    tids, units, values, mins, maxs = [], [], [], [], []
+    for tid, uas_id, value, min_, max_ in _monitor_tests(d):
+        if tid not in TEST_IDS:
+            logger.debug("Encountered unknown Test ID")
+
+        uas = UAS_IDS.get(uas_id, None)
+
+        # if we can't decode the value, skip this test
+        if uas is None:
+            logger.debug("Encountered unknown Units and Scaling ID")
+            continue
+
+        tids.append(tid)
+        if not isinstance(uas, UAS):
+            # not a physical value, ie: a boolean
+            units.append(None)
+            values.append(uas(_uint16(value)))
+            mins.append(uas(_uint16(min_)))
+            maxs.append(uas(_uint16(max_)))
+            continue
+
+        if uas.signed:
+            value, min_, max_ = [v - 0x10000 if v & 0x8000 else v for v in (value, min_, max_)]
+
+        scale, offset = uas.scale, uas.offset
+        units.append(uas.unit)
+        values.append(value * scale + offset)
+        mins.append(min_ * scale + offset)
+        maxs.append(max_ * scale + offset)
 
+    mon = Monitor()
+    mon.add_results(tids, units, values, mins, maxs)
     return mon
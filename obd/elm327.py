@@ -30,15 +30,73 @@
 #                                                                      #
 ########################################################################
 
-import re
+import collections
+import os
+import select
 import serial
+import sys
 import time
 import logging
 from .protocols import *
-from .utils import OBDStatus
+from .protocols.protocol import Frame
+from .can_filter import CANFilter
+from .session import SUPPORTED_PROTOCOLS, TRY_PROTOCOL_ORDER, TRY_BAUDS, \
+    Handshake, Send, Write, Probe, SetBaudrate, run, isok
+from .utils import OBDStatus, isHex
 
 logger = logging.getLogger(__name__)
 
+if sys.version[0] < '3':
+    # Python 2's memoryview is no context manager: slice the buffer instead
+    def _decode(buffer, end):
+        return buffer[:end].decode("utf-8", "ignore")
+
+    def _head(buffer, end):
+        return bytes(buffer[:end])
+else:
+    # the view is released right away, so the (reused) buffer can be resized again
+    def _decode(buffer, end):
+        with memoryview(buffer) as view:
+            return str(view[:end], "utf-8", "ignore")
+
+    def _head(buffer, end):
+        with memoryview(buffer) as view:
+            return bytes(view[:end])
+
+
+class MonitorStats(object):
+    """ counters for a run of ELM327.monitor() """
+
+    def __init__(self):
+        self.started = time.time()
+        self.received = 0  # frames received from the adapter
+        self.filtered = 0  # received frames dropped by the CANFilter
+        self.frames = 0  # frames handed to the consumer
+        self.dropped = 0  # frames dropped because the consumer fell behind
+        self.overruns = 0  # "BUFFER FULL" reports from the adapter
+        self.errors = 0  # lines that couldn't be parsed, or error reports
+        self.restarts = 0  # times monitoring had to be restarted
+
+    @property
+    def received_rate(self):
+        """ frames received from the adapter per second """
+        return self.received / max(time.time() - self.started, 1e-6)
+
+    @property
+    def filtered_rate(self):
+        """
+            frames per second that got past the hardware filters only to be
+            dropped in software. High compared to received_rate means the
+            hardware filters are too loose (ie: ATCF/ATCM on far apart IDs)
+        """
+        return self.filtered / max(time.time() - self.started, 1e-6)
+
+    def __str__(self):
+        return ("MonitorStats(received=%d filtered=%d frames=%d dropped=%d "
+                "overruns=%d errors=%d restarts=%d)") % \
+            (self.received, self.filtered, self.frames, self.dropped,
+             self.overruns, self.errors, self.restarts)
+
 
 class ELM327:
     """
@@ -57,54 +115,33 @@ class ELM327:
 
     ELM_PROMPT = b'>'
     ELM_LP_ACTIVE = b'OK'
+    ELM_BUFFER_FULL = b'BUFFER FULL'
+
+    # largest single read from the port. Responses are usually far
+    # smaller, but multi-frame answers (VIN, DTCs) can be several lines
+    READ_CHUNK_SIZE = 4096
+
+    # how long to wait for a prompt after an 'OK', see __read()
+    LOW_POWER_PROMPT_TIMEOUT = 0.1
 
-    _SUPPORTED_PROTOCOLS = {
-        # "0" : None,
-        # Automatic Mode. This isn't an actual protocol. If the
-        # ELM reports this, then we don't have enough
-        # information. see auto_protocol()
-        "1": SAE_J1850_PWM,
-        "2": SAE_J1850_VPW,
-        "3": ISO_9141_2,
-        "4": ISO_14230_4_5baud,
-        "5": ISO_14230_4_fast,
-        "6": ISO_15765_4_11bit_500k,
-        "7": ISO_15765_4_29bit_500k,
-        "8": ISO_15765_4_11bit_250k,
-        "9": ISO_15765_4_29bit_250k,
-        "A": SAE_J1939,
-        # "B" : None, # user defined 1
-        # "C" : None, # user defined 2
-    }
-
-    # used as a fallback, when ATSP0 doesn't cut it
-    _TRY_PROTOCOL_ORDER = [
-        "6",  # ISO_15765_4_11bit_500k
-        "8",  # ISO_15765_4_11bit_250k
-        "1",  # SAE_J1850_PWM
-        "7",  # ISO_15765_4_29bit_500k
-        "9",  # ISO_15765_4_29bit_250k
-        "2",  # SAE_J1850_VPW
-        "3",  # ISO_9141_2
-        "4",  # ISO_14230_4_5baud
-        "5",  # ISO_14230_4_fast
-        "A",  # SAE_J1939
-    ]
-
-    # 38400, 9600 are the possible boot bauds (unless reprogrammed via
-    # PP 0C).  19200, 38400, 57600, 115200, 230400, 500000 are listed on
-    # p.46 of the ELM327 datasheet.
-    #
-    # Once pyserial supports non-standard baud rates on platforms other
-    # than Linux, we'll add 500K to this list.
-    #
-    # We check the two default baud rates first, then go fastest to
-    # slowest, on the theory that anyone who's using a slow baud rate is
-    # going to be less picky about the time required to detect it.
-    _TRY_BAUDS = [38400, 9600, 230400, 115200, 57600, 19200]
+    # see session.py
+    _SUPPORTED_PROTOCOLS = SUPPORTED_PROTOCOLS
+    _TRY_PROTOCOL_ORDER = TRY_PROTOCOL_ORDER
+    _TRY_BAUDS = TRY_BAUDS
+
+    # rates that negotiate_baudrate() may switch to, fastest first. ATBRD
+    # takes a divisor of 4 MHz, so the ELM327 can only hit a few of them
+    # exactly, while the STN11xx STBR takes any rate.
+    _ELM_BRD_BAUDS = [2000000, 1000000, 500000, 250000]
+    _STN_BAUDS = [2000000, 1000000, 500000, 230400, 115200]
+
+    # how long the adapter waits, at the new rate, for the CR confirming
+    # a switch (ATBRT/STBRT), before it goes back to the old one
+    BAUD_SWITCH_TIMEOUT = 0.2
 
     def __init__(self, portname, baudrate, protocol, timeout,
-                 check_voltage=True, start_low_power=False):
+                 check_voltage=True, start_low_power=False, profile=None,
+                 max_baudrate=None, compact=False):
         """Initializes port by resetting device and gettings supported PIDs. """
 
         logger.info("Initializing ELM327: PORT=%s BAUD=%s PROTOCOL=%s" %
@@ -118,6 +155,17 @@ class ELM327:
         self.__port = None
         self.__protocol = UnknownProtocol([])
         self.__low_power = False
+        self.__buffer = bytearray()  # reused by __read() for every response
+        self.__from_profile = False
+        self.__max_baudrate = max_baudrate
+        self.__chip = None  # ID string, once identify()ed
+        self.__initial_baudrate = None  # rate the adapter was found at
+        self.__negotiated_baudrate = None  # rate switched to, if any
+        self.__compact = False  # whether the adapter dropped the spaces (ATS0)
+        self.__monitoring = False  # set while a monitor() generator is running
+        self.__monitor_stats = MonitorStats()
+        self.__hw_filter = None  # state of the adapter's CAN filters, see CANFilter.program()
+        self.__handshake = Handshake(portname, protocol, check_voltage, compact)
         self.timeout = timeout
 
         # ------------- open port -------------
@@ -139,96 +187,95 @@ class ELM327:
             self.__write(b" ")
             time.sleep(1)
 
+        # ------------- skip discovery if we've been here before --------------
+        if profile is not None:
+            found = self.__run(self.__handshake.fast_connect(profile, baudrate))
+            self.__status = self.__handshake.status
+            self.__negotiated_baudrate = self.__handshake.negotiated_baudrate
+            if found:
+                self.__initial_baudrate = profile.baudrate if baudrate is None else baudrate
+                self.__chip = profile.chip
+                self.__from_profile = True
+                logger.info("Connected Successfully from profile: PORT=%s BAUD=%s PROTOCOL=%s" %
+                            (
+                                portname,
+                                self.__port.baudrate,
+                                self.__protocol.ELM_ID,
+                            ))
+                if max_baudrate is not None:
+                    self.negotiate_baudrate(max_baudrate, profile.negotiated_baudrate)
+                return
+            if self.__port is None:
+                return  # lost the port, and already said so
+
         # ------------------------ find the ELM's baud ------------------------
 
         if not self.set_baudrate(baudrate):
             self.__error("Failed to set baudrate")
             return
+        self.__initial_baudrate = self.__port.baudrate
 
-        # ---------------------------- ATZ (reset) ----------------------------
+        # ------------ reset, set up, and connect to the car -----------------
         try:
-            self.__send(b"ATZ", delay=1)  # wait 1 second for ELM to initialize
-            # return data can be junk, so don't bother checking
+            ok = self.__run(self.__handshake.reset())
         except serial.SerialException as e:
             self.__error(e)
             return
-
-        # -------------------------- ATE0 (echo OFF) --------------------------
-        r = self.__send(b"ATE0")
-        if not self.__isok(r, expectEcho=True):
-            self.__error("ATE0 did not return 'OK'")
+        self.__status = self.__handshake.status
+        if not ok:
+            self.__error(self.__handshake.error)
             return
 
-        # ------------------------- ATH1 (headers ON) -------------------------
-        r = self.__send(b"ATH1")
-        if not self.__isok(r):
-            self.__error("ATH1 did not return 'OK', or echoing is still ON")
-            return
-
-        # ------------------------ ATL0 (linefeeds OFF) -----------------------
-        r = self.__send(b"ATL0")
-        if not self.__isok(r):
-            self.__error("ATL0 did not return 'OK'")
-            return
-
-        # by now, we've successfuly communicated with the ELM, but not the car
-        self.__status = OBDStatus.ELM_CONNECTED
-
-        # -------------------------- AT RV (read volt) ------------------------
-        if check_voltage:
-            r = self.__send(b"AT RV")
-            if not r or len(r) != 1 or r[0] == '':
-                self.__error("No answer from 'AT RV'")
-                return
-            try:
-                if float(r[0].lower().replace('v', '')) < 6:
-                    logger.error("OBD2 socket disconnected")
-                    return
-            except ValueError as e:
-                self.__error("Incorrect response from 'AT RV'")
-                return
-            # by now, we've successfuly connected to the OBD socket
-            self.__status = OBDStatus.OBD_CONNECTED
-
-        # try to communicate with the car, and load the correct protocol parser
-        if self.set_protocol(protocol):
-            self.__status = OBDStatus.CAR_CONNECTED
+        if self.__status == OBDStatus.CAR_CONNECTED:
             logger.info("Connected Successfully: PORT=%s BAUD=%s PROTOCOL=%s" %
                         (
                             portname,
                             self.__port.baudrate,
                             self.__protocol.ELM_ID,
                         ))
-        else:
-            if self.__status == OBDStatus.OBD_CONNECTED:
-                logger.error("Adapter connected, but the ignition is off")
-            else:
-                logger.error("Connected to the adapter, "
-                             "but failed to connect to the vehicle")
 
-    def set_protocol(self, protocol_):
-        if protocol_ is not None:
-            # an explicit protocol was specified
-            if protocol_ not in self._SUPPORTED_PROTOCOLS:
-                logger.error(
-                    "{:} is not a valid protocol. ".format(protocol_) +
-                    "Please use \"1\" through \"A\"")
-                return False
-            return self.manual_protocol(protocol_)
-        else:
-            # auto detect the protocol
-            return self.auto_protocol()
+        # ----------------- raise the serial speed (opt-in) -------------------
+        if max_baudrate is not None and self.__status != OBDStatus.NOT_CONNECTED:
+            self.negotiate_baudrate(max_baudrate,
+                                    None if profile is None else profile.negotiated_baudrate)
 
-    def manual_protocol(self, protocol_):
-        r = self.__send(b"ATTP" + protocol_.encode())
-        r0100 = self.__send(b"0100")
+    def __run(self, steps):
+        """
+            Runs one of the Handshake's generators over the port (see
+            session.py), and picks up the protocol it ends with.
+            Returns the generator's result.
+        """
+        result = run(steps, self.__answer)
+        self.__protocol = self.__handshake.protocol
+        self.__compact = self.__handshake.compact
+        return result
+
+    def __answer(self, request):
+        """ answers a Handshake request """
+        if isinstance(request, Send):
+            return self.__send(request.cmd, delay=request.delay)
+        if isinstance(request, Write):
+            self.__write(request.cmd)
+            if request.delay is not None:
+                time.sleep(request.delay)
+            return None
+        if isinstance(request, Probe):
+            # we're only talking with the ELM, so things should go quickly
+            timeout = self.__port.timeout
+            self.__port.timeout = self.timeout
+            found = self.__probe_baudrate(request.baud)
+            self.__port.timeout = timeout  # reinstate our original timeout
+            return found
+        if isinstance(request, SetBaudrate):
+            self.__port.baudrate = request.baud
+            return None
+        raise ValueError("Unknown request: %r" % request)
 
-        if not self.__has_message(r0100, "UNABLE TO CONNECT"):
-            # success, found the protocol
-            self.__protocol = self._SUPPORTED_PROTOCOLS[protocol_](r0100)
-            return True
+    def set_protocol(self, protocol_):
+        return self.__run(self.__handshake.set_protocol(protocol_))
 
-        return False
+    def manual_protocol(self, protocol_):
+        return self.__run(self.__handshake.manual_protocol(protocol_))
 
     def auto_protocol(self):
         """
@@ -239,115 +286,188 @@ class ELM327:
             Upon success, the appropriate protocol parser is loaded,
             and this function returns True
         """
-
-        # -------------- try the ELM's auto protocol mode --------------
-        r = self.__send(b"ATSP0")
-
-        # -------------- 0100 (first command, SEARCH protocols) --------------
-        r0100 = self.__send(b"0100")
-        if self.__has_message(r0100, "UNABLE TO CONNECT"):
-            logger.error("Failed to query protocol 0100: unable to connect")
-            return False
-
-        # ------------------- ATDPN (list protocol number) -------------------
-        r = self.__send(b"ATDPN")
-        if len(r) != 1:
-            logger.error("Failed to retrieve current protocol")
-            return False
-
-        p = r[0]  # grab the first (and only) line returned
-        # suppress any "automatic" prefix
-        p = p[1:] if (len(p) > 1 and p.startswith("A")) else p
-
-        # check if the protocol is something we know
-        if p in self._SUPPORTED_PROTOCOLS:
-            # jackpot, instantiate the corresponding protocol handler
-            self.__protocol = self._SUPPORTED_PROTOCOLS[p](r0100)
-            return True
-        else:
-            # an unknown protocol
-            # this is likely because not all adapter/car combinations work
-            # in "auto" mode. Some respond to ATDPN responded with "0"
-            logger.debug("ELM responded with unknown protocol. Trying them one-by-one")
-
-            for p in self._TRY_PROTOCOL_ORDER:
-                r = self.__send(b"ATTP" + p.encode())
-                r0100 = self.__send(b"0100")
-                if not self.__has_message(r0100, "UNABLE TO CONNECT"):
-                    # success, found the protocol
-                    self.__protocol = self._SUPPORTED_PROTOCOLS[p](r0100)
-                    return True
-
-        # if we've come this far, then we have failed...
-        logger.error("Failed to determine protocol")
-        return False
+        return self.__run(self.__handshake.auto_protocol())
 
     def set_baudrate(self, baud):
-        if baud is None:
-            # when connecting to pseudo terminal, don't bother with auto baud
-            if self.port_name().startswith("/dev/pts"):
-                logger.debug("Detected pseudo terminal, skipping baudrate setup")
-                return True
-            else:
-                return self.auto_baudrate()
-        else:
-            self.__port.baudrate = baud
-            return True
+        return self.__run(self.__handshake.set_baudrate(baud, self.__negotiable_bauds()))
 
     def auto_baudrate(self):
         """
         Detect the baud rate at which a connected ELM32x interface is operating.
         Returns boolean for success.
         """
+        return self.__run(self.__handshake.auto_baudrate(self.__negotiable_bauds()))
+
+    def __negotiable_bauds(self):
+        """ the rates negotiate_baudrate() may have left the adapter at """
+        if self.__max_baudrate is None:
+            return []
+        bauds = set(self._ELM_BRD_BAUDS + self._STN_BAUDS) - set(self._TRY_BAUDS)
+        return sorted([b for b in bauds if b <= self.__max_baudrate], reverse=True)
+
+    def __probe_baudrate(self, baud):
+        """ returns a boolean for whether the ELM answers at the given baud """
+        self.__port.baudrate = baud
+        self.__port.flushInput()
+        self.__port.flushOutput()
+
+        # Send a nonsense command to get a prompt back from the scanner
+        # (an empty command runs the risk of repeating a dangerous command)
+        # The first character might get eaten if the interface was busy,
+        # so write a second one (again so that the lone CR doesn't repeat
+        # the previous command)
+
+        # All commands should be terminated with carriage return according
+        # to ELM327 and STN11XX specifications
+        self.__port.write(b"\x7F\x7F\r")
+        self.__port.flush()
+        response = self.__port.read(1024)
+        logger.debug("Response from baud %d: %s" % (baud, repr(response)))
+
+        # watch for the prompt character
+        return response.endswith(b">")
+
+    def identify(self):
+        """
+            Returns the adapter's ID string, ie: "STN1110 v4.0.1" or
+            "ELM327 v1.5", or None if it didn't answer.
+        """
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            logger.info("cannot identify() when unconnected")
+            return None
+
+        # STN chips also answer ATI, as the ELM327 version they emulate
+        for cmd in [b"STI", b"ATI"]:
+            r = self.__send(cmd)
+            if len(r) == 1 and r[0] not in ["", "?"]:
+                self.__chip = r[0]
+                break
+
+        logger.info("Adapter identified as: %s" % self.__chip)
+        return self.__chip
 
-        # before we change the timout, save the "normal" value
+    def negotiate_baudrate(self, max_baudrate, first=None):
+        """
+            Raises the serial speed, up to max_baudrate, if the adapter
+            supports it: ATBRD on the ELM327 (v1.4 and up), STBR on STN chips.
+            The given rate (ie: one that worked last time) is tried first,
+            then the others, fastest first.
+
+            Each switch follows the adapter's handshake, and is validated
+            with an ID request at the new rate. If anything goes wrong, the
+            adapter goes back to the old rate on its own, and so do we.
+
+            Returns the baud rate in use afterwards.
+        """
+
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            logger.info("cannot negotiate_baudrate() when unconnected")
+            return None
+
+        if self.port_name().startswith("/dev/rfcomm"):
+            # the adapter's UART talks to its Bluetooth radio, not to us.
+            # Switching it would cut us off
+            logger.info("Not negotiating the baud rate over Bluetooth")
+            return self.__port.baudrate
+
+        # before we change the timeout, save the "normal" value
         timeout = self.__port.timeout
-        self.__port.timeout = self.timeout  # we're only talking with the ELM, so things should go quickly
-
-        for baud in self._TRY_BAUDS:
-            self.__port.baudrate = baud
-            self.__port.flushInput()
-            self.__port.flushOutput()
-
-            # Send a nonsense command to get a prompt back from the scanner
-            # (an empty command runs the risk of repeating a dangerous command)
-            # The first character might get eaten if the interface was busy,
-            # so write a second one (again so that the lone CR doesn't repeat
-            # the previous command)
-
-            # All commands should be terminated with carriage return according
-            # to ELM327 and STN11XX specifications
-            self.__port.write(b"\x7F\x7F\r")
-            self.__port.flush()
-            response = self.__port.read(1024)
-            logger.debug("Response from baud %d: %s" % (baud, repr(response)))
+        self.__port.timeout = self.timeout
 
-            # watch for the prompt character
-            if response.endswith(b">"):
-                logger.debug("Choosing baud %d" % baud)
-                self.__port.timeout = timeout  # reinstate our original timeout
-                return True
+        chip = self.identify()
+        if chip is None:
+            self.__port.timeout = timeout
+            return self.__port.baudrate
+
+        old = self.__port.baudrate
+        if chip.startswith("STN"):
+            bauds = self._STN_BAUDS
+            self.__send(b"STBRT %d" % int(self.BAUD_SWITCH_TIMEOUT * 1000))
+        else:
+            bauds = self._ELM_BRD_BAUDS
+            self.__send(b"ATBRT %02X" % int(self.BAUD_SWITCH_TIMEOUT * 200))  # 5 ms units
+
+        bauds = [b for b in bauds if old < b <= max_baudrate]
+        if first in bauds:
+            bauds.remove(first)
+            bauds.insert(0, first)
+
+        for baud in bauds:
+            if chip.startswith("STN"):
+                cmd = b"STBR %d" % baud
+            else:
+                cmd = b"ATBRD %02X" % (4000000 // baud)
+
+            if self.__switch_baudrate(cmd, baud, chip):
+                logger.info("Switched from %d to %d baud" % (old, baud))
+                self.__negotiated_baudrate = baud
+                break
+            if self.__port is None:
+                return None  # lost the adapter, and already said so
+        else:
+            logger.info("Staying at %d baud" % old)
 
-        logger.debug("Failed to choose baud")
         self.__port.timeout = timeout  # reinstate our original timeout
-        return False
+        return self.__port.baudrate
+
+    def __switch_baudrate(self, cmd, baud, chip):
+        """
+            Runs a baud rate switching handshake. Returns a boolean for
+            whether we're talking at the new rate. On failure, the old rate
+            is restored.
+        """
+
+        old = self.__port.baudrate
+        self.__write(cmd)
 
-    def __isok(self, lines, expectEcho=False):
-        if not lines:
+        # the adapter agrees at the old rate, and switches without a prompt
+        r = self.__read_until([self.ELM_LP_ACTIVE, self.ELM_PROMPT], self.timeout)
+        if self.ELM_LP_ACTIVE not in r:
+            logger.debug("%s was refused: %s" % (cmd, repr(r)))
             return False
-        if expectEcho:
-            # don't test for the echo itself
-            # allow the adapter to already have echo disabled
-            return self.__has_message(lines, 'OK')
-        else:
-            return len(lines) == 1 and lines[0] == 'OK'
 
-    def __has_message(self, lines, text):
-        for line in lines:
-            if text in line:
+        # then introduces itself at the new rate, and waits for our CR
+        self.__port.baudrate = baud
+        rest = r[r.find(self.ELM_LP_ACTIVE) + len(self.ELM_LP_ACTIVE):]
+        r = self.__read_until([chip.encode()], self.BAUD_SWITCH_TIMEOUT, rest)
+        if chip.encode() in r:
+            self.__port.write(b"\r")
+            self.__port.flush()
+            r = self.__read_until([self.ELM_PROMPT], self.timeout)
+            if self.ELM_LP_ACTIVE in r and \
+               self.__send(b"STI" if chip.startswith("STN") else b"ATI") == [chip]:
                 return True
+
+        # the adapter goes back by itself once it stops hearing from us
+        logger.info("Failed to switch to %d baud, going back to %d" % (baud, old))
+        self.__port.baudrate = old
+        time.sleep(self.BAUD_SWITCH_TIMEOUT)
+        if self.__probe_baudrate(old):
+            return False
+        if self.__probe_baudrate(baud):
+            # it switched after all, and our validation was too strict
+            return True
+        self.__error("Lost the adapter while switching baud rates")
         return False
 
+    def __read_until(self, tokens, timeout, data=b""):
+        """
+            reads until one of the tokens arrives, or the timeout expires.
+            Bytes already received can be passed in as the starting data.
+        """
+        data = bytearray(data)
+        deadline = time.time() + timeout
+        while not any([t in data for t in tokens]):
+            try:
+                chunk = self.__read_chunk(deadline)
+            except Exception:
+                break
+            if not chunk:
+                break
+            data.extend(chunk)
+        logger.debug("read: " + repr(data)[10:-1])
+        return data
+
     def __error(self, msg):
         """ handles fatal failures, print logger.info info and closes serial """
         self.close()
@@ -371,6 +491,40 @@ class ELM327:
     def protocol_id(self):
         return self.__protocol.ELM_ID
 
+    def ecu_map(self):
+        """ returns a copy of the protocol's {tx_id: ECU} map """
+        return dict(self.__protocol.ecu_map)
+
+    def pid_bitmap(self):
+        """ returns each ECU's answer to 0100 (the PIDs it supports), as {tx_id: hex} """
+        return dict(self.__protocol.pid_bitmap)
+
+    def baudrate(self):
+        if self.__port is not None:
+            return self.__port.baudrate
+        else:
+            return None
+
+    def initial_baudrate(self):
+        """ returns the baud rate the adapter was found at, before any negotiation """
+        return self.__initial_baudrate
+
+    def negotiated_baudrate(self):
+        """ returns the baud rate switched to by negotiate_baudrate(), or None """
+        return self.__negotiated_baudrate
+
+    def chip(self):
+        """ returns the adapter's ID string, if it has been identify()ed """
+        return self.__chip
+
+    def compact(self):
+        """ returns a boolean for whether responses come without spaces (ATS0) """
+        return self.__compact
+
+    def from_profile(self):
+        """ returns a boolean for whether discovery was skipped using a profile """
+        return self.__from_profile
+
     def low_power(self):
         """
             Enter Low Power mode
@@ -458,21 +612,266 @@ class ELM327:
             logger.info("cannot send_and_parse() when unconnected")
             return None
 
+        if self.__monitoring:
+            logger.warning("cannot send_and_parse() while monitoring, close the monitor() first")
+            return None
+
         # Check if we are in low power
         if self.__low_power == True:
             self.normal_power()
 
-        lines = self.__send(cmd)
+        # the protocol sorts the lines out as bytes, faster than as strings
+        lines = self.__send(cmd, raw=True)
         messages = self.__protocol(lines)
         return messages
 
-    def __send(self, cmd, delay=None):
+    def send_and_stream(self, cmd):
+        """
+            send_and_parse(), as a generator: on CAN protocols, the response
+            is reassembled while it arrives (see ISOTPReassembler), and each
+            Message is yielded as soon as it is complete, without waiting
+            for slower ECUs, or for the prompt.
+
+            Lines that aren't OBD data ("NO DATA", etc) are yielded once
+            the prompt arrives, as are all messages on other protocols.
+            Closing the generator early drops the rest of the response.
+        """
+
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            logger.info("cannot send_and_stream() when unconnected")
+            return
+
+        if self.__monitoring:
+            logger.warning("cannot send_and_stream() while monitoring, close the monitor() first")
+            return
+
+        reassembler = getattr(self.__protocol, "reassembler", None)
+        if reassembler is None:
+            for message in self.send_and_parse(cmd) or []:
+                yield message
+            return
+        reassembler = reassembler()
+
+        # Check if we are in low power
+        if self.__low_power:
+            self.normal_power()
+
+        self.__write(cmd)
+
+        deadline = None
+        if self.__port is not None and self.__port.timeout is not None:
+            deadline = time.time() + self.__port.timeout
+
+        partial = bytearray()
+        other_lines = []
+        prompt = False
+        finished = False
+        try:
+            while self.__port is not None and not prompt:
+                try:
+                    data = self.__read_chunk(deadline)
+                except Exception:
+                    self.__status = OBDStatus.NOT_CONNECTED
+                    self.__port.close()
+                    self.__port = None
+                    logger.critical("Device disconnected while reading")
+                    return
+
+                if not data:
+                    logger.warning("Failed to read port")
+                    break
+
+                partial.extend(data)
+                lines = partial.split(b"\r")
+                partial = lines.pop()  # the incomplete last line
+
+                prompt = self.ELM_PROMPT in partial
+                if prompt:
+                    # the prompt may follow the last line without a CR
+                    lines.append(partial.split(self.ELM_PROMPT)[0])
+
+                for line in lines:
+                    line = line.replace(b"\x00", b"").strip()
+                    if not line:
+                        continue
+                    line = line.decode("utf-8", "ignore")
+                    line_no_spaces = line.replace(" ", "")
+                    if isHex(line_no_spaces):
+                        message = reassembler.feed_line(line_no_spaces)
+                        if message is not None:
+                            yield message
+                    else:
+                        other_lines.append(line)
+
+            # whatever didn't complete by the prompt never will
+            finished = True
+            reassembler.reset()
+            for message in self.__protocol(other_lines):
+                yield message
+        finally:
+            if not finished and self.__port is not None:
+                # closed early: don't leave the rest for the next command
+                self.__read_until([self.ELM_PROMPT], self.__port.timeout or self.timeout)
+
+    def monitor(self, max_pending=1024, can_filter=None):
+        """
+            Generator for passive listening: puts the adapter in monitor-all
+            mode (ATMA, or STMA on STN chips), and yields a (timestamp, Frame)
+            tuple for every line received from the bus. Frames are parsed
+            by the protocol's parse_frame(), and also carry broadcast frames
+            that aren't ISO-TP, for which frame.type is meaningless.
+
+            The port is drained before every frame is handed out, so that
+            the adapter's own (small) buffer doesn't fill up while the
+            consumer is busy. Up to max_pending frames are held; beyond
+            that the oldest are dropped. If the adapter reports
+            "BUFFER FULL" anyway, monitoring is restarted.
+
+            On CAN protocols, a CANFilter limits the frames to the IDs it
+            holds, using the adapter's hardware filters (see CANFilter).
+            Changes made to it while monitoring are programmed into the
+            adapter before the next frame is handed out. The hardware
+            filters are reset once monitoring stops.
+
+            Counters are available from monitor_stats(). Closing the
+            generator (or breaking out of a for loop over it) stops the
+            monitoring, and the adapter is ready for commands again.
+        """
+
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            logger.info("cannot monitor() when unconnected")
+            return
+
+        chip = self.__chip or self.identify()
+        stn = chip is not None and chip.startswith("STN")
+        cmd = b"STMA" if stn else b"ATMA"
+
+        id_bits = getattr(self.__protocol, "id_bits", None)
+        if can_filter is not None and id_bits is None:
+            logger.warning("CAN filters don't apply to %s, monitoring everything" %
+                           self.__protocol.ELM_NAME)
+            can_filter = None
+
+        stats = self.__monitor_stats = MonitorStats()
+        pending = collections.deque()
+        partial = bytearray()
+
+        filter_version = None
+        if can_filter is not None:
+            filter_version = can_filter.version
+            self.__program_can_filter(can_filter, id_bits, stn)
+
+        logger.info("Starting monitor mode (%s)" % cmd.decode())
+        self.__write(cmd)
+        self.__monitoring = True
+
+        try:
+            while self.__port is not None:
+                if can_filter is not None and can_filter.version != filter_version:
+                    # the subscriptions changed: stop, re-program, and restart
+                    filter_version = can_filter.version
+                    self.__write(b"")
+                    self.__read_until([self.ELM_PROMPT], 1.0)
+                    del partial[:]
+                    self.__program_can_filter(can_filter, id_bits, stn)
+                    self.__write(cmd)
+
+                # block only when there's nothing to hand out
+                deadline = time.time() if pending else time.time() + self.__port.timeout
+                try:
+                    data = self.__read_chunk(deadline)
+                    while data:
+                        t = time.time()
+                        partial.extend(data)
+                        lines = partial.split(b"\r")
+                        partial = lines.pop()  # the incomplete last line
+
+                        for line in lines:
+                            self.__monitor_line(line, t, pending, stats,
+                                                max_pending, can_filter)
+
+                        if self.ELM_PROMPT in partial:
+                            # the adapter stopped monitoring (after a
+                            # BUFFER FULL, usually), start it again
+                            logger.info("Monitoring stopped by the adapter, restarting")
+                            del partial[:]
+                            stats.restarts += 1
+                            self.__write(cmd)
+
+                        data = self.__read_chunk(time.time())
+                except Exception:
+                    self.__status = OBDStatus.NOT_CONNECTED
+                    self.__port.close()
+                    self.__port = None
+                    logger.critical("Device disconnected while monitoring")
+                    break
+
+                if pending:
+                    stats.frames += 1
+                    yield pending.popleft()
+        finally:
+            self.__monitoring = False
+            if self.__port is not None:
+                # any character stops the monitoring
+                logger.info("Stopping monitor mode: %s" % stats)
+                self.__write(b"")
+                self.__read_until([self.ELM_PROMPT], 1.0)
+
+                # regular queries need the adapter's own filtering back
+                if self.__hw_filter is not None:
+                    self.__program_can_filter(CANFilter(), id_bits, stn)
+
+    def __program_can_filter(self, can_filter, id_bits, stn):
+        """ brings the adapter's hardware CAN filters in line with a CANFilter """
+        cmds, self.__hw_filter = can_filter.program(self.__hw_filter, id_bits, stn)
+        for c in cmds:
+            if not isok(self.__send(c)):
+                # frames are still filtered in software
+                logger.warning("%s did not return 'OK'" % c.decode())
+        logger.info("CAN filters programmed for: %s" % can_filter)
+
+    def __monitor_line(self, line, t, pending, stats, max_pending, can_filter):
+        """ sorts a line of monitor output into frames, errors and overruns """
+        line = line.replace(b" ", b"").replace(b"\x00", b"")
+        if not line:
+            return
+
+        if line == self.ELM_BUFFER_FULL.replace(b" ", b""):
+            logger.warning("Adapter buffer overrun while monitoring")
+            stats.overruns += 1
+            return
+
+        line = line.decode("utf-8", "ignore")
+        frame = Frame(line)
+        if isHex(line):
+            self.__protocol.parse_frame(frame)
+        if not frame.data:
+            # ie: "<DATA ERROR", "<RX ERROR", "CAN ERROR", or a runt frame
+            logger.debug("Unusable line while monitoring: %s" % line)
+            stats.errors += 1
+            return
+
+        stats.received += 1
+        if can_filter is not None and not can_filter.accepts(frame.can_id):
+            stats.filtered += 1
+            return
+
+        if len(pending) >= max_pending:
+            pending.popleft()
+            stats.dropped += 1
+        pending.append((t, frame))
+
+    def monitor_stats(self):
+        """ returns the MonitorStats of the current (or last) monitor() run """
+        return self.__monitor_stats
+
+    def __send(self, cmd, delay=None, raw=False):
         """
             unprotected send() function
 
             will __write() the given string, no questions asked.
-            returns result of __read() (a list of line strings)
-            after an optional delay.
+            returns result of __read() (a list of line strings, or
+            bytes when raw is set) after an optional delay.
         """
         self.__write(cmd)
 
@@ -482,13 +881,13 @@ class ELM327:
             time.sleep(delay)
             delayed += delay
 
-        r = self.__read()
-        while delayed < 1.0 and len(r) <= 0:
-            d = 0.1
-            logger.debug("no response; wait: %f seconds" % d)
-            time.sleep(d)
-            delayed += d
-            r = self.__read()
+        r = self.__read(raw)
+        if not r and delayed < 1.0:
+            # rather than polling, block on the port for whatever is left
+            # of the one second grace period, and read as soon as data lands
+            logger.debug("no response; wait: %f seconds" % (1.0 - delayed))
+            if self.__wait_readable(1.0 - delayed):
+                r = self.__read(raw)
         return r
 
     def __write(self, cmd):
@@ -512,23 +911,74 @@ class ELM327:
         else:
             logger.info("cannot perform __write() when unconnected")
 
-    def __read(self):
+    def __wait_readable(self, timeout):
+        """
+            blocks until the port has data to read, or the timeout
+            (in seconds, None for forever) expires. Returns a boolean.
+
+            Ports without a file descriptor (loop://, socket://, etc)
+            can't be select()ed, and always report as readable, leaving
+            it to their own blocking read() to honor the port timeout.
+        """
+        fd = self.__fileno()
+        if fd is None:
+            return True
+        if timeout is not None:
+            timeout = max(timeout, 0.0)
+        r, _, _ = select.select([fd], [], [], timeout)
+        return bool(r)
+
+    def __fileno(self):
+        """ returns the port's file descriptor, or None if it has none """
+        try:
+            return self.__port.fileno()
+        except (AttributeError, NotImplementedError, ValueError,
+                serial.SerialException):
+            return None
+
+    def __read_chunk(self, deadline):
+        """
+            returns everything the port has to offer, waiting until the
+            deadline (a time.time() value, or None) for the first byte.
+            Returns an empty bytes object on timeout.
+        """
+        fd = self.__fileno()
+        if fd is None:
+            return self.__port.read(self.__port.in_waiting or 1)
+
+        timeout = None if deadline is None else deadline - time.time()
+        if not self.__wait_readable(timeout):
+            return b""
+
+        data = os.read(fd, self.READ_CHUNK_SIZE)
+        if not data:
+            # readable, yet nothing to read: the other end hung up
+            raise serial.SerialException("device reports readiness to read but returned no data")
+        return data
+
+    def __read(self, raw=False):
         """
             "low-level" read function
 
             accumulates characters until the prompt character is seen
-            returns a list of [/r/n] delimited strings
+            returns a list of [/r/n] delimited strings (bytes when raw is set)
         """
         if not self.__port:
             logger.info("cannot perform __read() when unconnected")
             return []
 
-        buffer = bytearray()
+        buffer = self.__buffer
+        del buffer[:]  # keep the allocation from the previous response
+
+        deadline = None
+        if self.__port.timeout is not None:
+            deadline = time.time() + self.__port.timeout
 
+        low_power = False
         while True:
             # retrieve as much data as possible
             try:
-                data = self.__port.read(self.__port.in_waiting or 1)
+                data = self.__read_chunk(deadline)
             except Exception:
                 self.__status = OBDStatus.NOT_CONNECTED
                 self.__port.close()
@@ -538,30 +988,76 @@ class ELM327:
 
             # if nothing was received
             if not data:
-                logger.warning("Failed to read port")
+                if not low_power:
+                    logger.warning("Failed to read port")
                 break
 
+            # only scan the bytes that just arrived (plus the last old one,
+            # since a two byte 'OK' may have been split across reads)
+            start = max(len(buffer) - 1, 0)
             buffer.extend(data)
 
-            # end on chevron (ELM prompt character) or an 'OK' which
-            # indicates we are entering low power state
-            if self.ELM_PROMPT in buffer or self.ELM_LP_ACTIVE in buffer:
+            # end on chevron (ELM prompt character)
+            if buffer.find(self.ELM_PROMPT, start) != -1:
                 break
 
+            # an 'OK' may indicate that we are entering low power state,
+            # in which case no prompt will follow. Usually though, it is
+            # just an AT command's answer, so give its prompt a moment to
+            # arrive rather than leaving it behind to pollute the next read
+            if not low_power and buffer.find(self.ELM_LP_ACTIVE, start) != -1:
+                if self.__fileno() is None:
+                    break  # can't wait on the port with a shorter timeout
+                low_power = True
+                deadline = time.time() + self.LOW_POWER_PROMPT_TIMEOUT
+
         # log, and remove the "bytearray(   ...   )" part
         logger.debug("read: " + repr(buffer)[10:-1])
 
+        if raw:
+            return self.split_raw_lines(buffer)
+        return self.split_lines(buffer)
+
+    @classmethod
+    def split_lines(cls, buffer):
+        """
+            turns a raw response buffer into a list of line strings,
+            dropping null characters, the prompt, empty lines and
+            trailing spaces
+        """
+
         # clean out any null characters
-        buffer = re.sub(b"\x00", b"", buffer)
+        if b"\x00" in buffer:
+            buffer = buffer.translate(None, b"\x00")
 
-        # remove the prompt character
-        if buffer.endswith(self.ELM_PROMPT):
-            buffer = buffer[:-1]
+        # remove the prompt character, without copying the buffer
+        end = len(buffer)
+        if buffer.endswith(cls.ELM_PROMPT):
+            end -= 1
 
-        # convert bytes into a standard string
-        string = buffer.decode("utf-8", "ignore")
+        # convert bytes into a standard string, without copying them first
+        string = _decode(buffer, end)
 
         # splits into lines while removing empty lines and trailing spaces
-        lines = [s.strip() for s in re.split("[\r\n]", string) if bool(s)]
+        return [s.strip() for s in string.replace("\n", "\r").split("\r") if s]
 
-        return lines
+    @classmethod
+    def split_raw_lines(cls, buffer):
+        """
+            split_lines(), leaving the lines as bytes, for the protocol
+            to sort out (see protocols.protocol.split_obd_lines())
+        """
+
+        # clean out any null characters
+        if b"\x00" in buffer:
+            buffer = buffer.translate(None, b"\x00")
+
+        # remove the prompt character
+        end = len(buffer)
+        if buffer.endswith(cls.ELM_PROMPT):
+            end -= 1
+
+        data = _head(buffer, end)
+
+        # splits into lines while removing empty lines and trailing spaces
+        return [s.strip() for s in data.replace(b"\n", b"\r").split(b"\r") if s]
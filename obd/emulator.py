@@ -0,0 +1,749 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# emulator.py                                                          #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import json
+import logging
+import os
+import random
+import select
+import struct
+import sys
+import threading
+import time
+import tty
+from binascii import hexlify, unhexlify
+from collections import deque
+
+from .elm327 import ELM327
+
+logger = logging.getLogger(__name__)
+
+if sys.version[0] < '3':
+    string_types = (str, unicode)
+else:
+    string_types = (str,)
+
+
+def _data(v):
+    """ profile values are bytes, hex strings, or functions returning bytes """
+    if isinstance(v, string_types):
+        return unhexlify(v.replace(" ", ""))
+    return v
+
+
+def _keys(d):
+    """ hex string keys (as they come out of JSON) to ints """
+    return dict([(int(k, 16) if isinstance(k, string_types) else k, v) for k, v in (d or {}).items()])
+
+
+def dtc_bytes(code):
+    """ "P0143" --> b"\\x01\\x43" """
+    return struct.pack(">H", ("PCBU".index(code[0].upper()) << 14) | int(code[1:], 16))
+
+
+def supported_bitmap(pids, base):
+    """
+        the 4 bytes answering PID base (00, 20, 40...): a bit for each
+        of the PIDs base+1 to base+0x20, where the last one flags that
+        the next range is worth asking for
+    """
+    v = 0
+    for pid in pids:
+        if base < pid <= base + 0x20:
+            v |= 1 << (base + 0x20 - pid)
+        elif pid > base + 0x20:
+            v |= 1
+    return struct.pack(">I", v)
+
+
+class EmulatedECU(object):
+    """
+        One ECU of an emulated vehicle, and the data it answers with.
+        Data is given as bytes (a bytearray on Python 2, where str is
+        taken for hex) or hex strings, or as a function returning bytes,
+        for values that change between requests.
+
+        pids:         {PID: data} for mode 01 (without the 41 and PID bytes)
+        freeze_frame: {PID: data} for mode 02, frame 0
+        dtcs:         ["P0143", ...] for mode 03
+        pending_dtcs: ["P0300", ...] for mode 07
+        monitors:     {MID: [test, ...]} for mode 06, each test being the
+                      TID, unit and scaling ID, value, minimum and maximum
+        info:         {info type: data} for mode 09 (without the 49, info
+                      type and data item count bytes)
+    """
+
+    def __init__(self, name="engine", address=None, pids=None, freeze_frame=None,
+                 dtcs=None, pending_dtcs=None, monitors=None, info=None):
+        self.name = name
+        self.address = address  # set by the VehicleProfile, when not given
+        self.pids = dict([(k, _data(v)) for k, v in _keys(pids).items()])
+        self.freeze_frame = dict([(k, _data(v)) for k, v in _keys(freeze_frame).items()])
+        self.dtcs = list(dtcs or [])
+        self.pending_dtcs = list(pending_dtcs or [])
+        self.monitors = dict([(k, [_data(t) for t in v]) for k, v in _keys(monitors).items()])
+        self.info = dict([(k, _data(v)) for k, v in _keys(info).items()])
+
+    @staticmethod
+    def __get(table, pid):
+        v = table[pid]
+        return bytearray(v() if callable(v) else v)
+
+    @staticmethod
+    def __bitmap(table, pid):
+        """ the supported PIDs answer, or None when the range is out of reach """
+        pids = [p for p in table if p % 0x20]
+        if pid and not any(p > pid for p in pids):
+            return None
+        return supported_bitmap(pids, pid)
+
+    def answer(self, mode, args):
+        """
+            returns the payload answering a request (mode byte included,
+            as though sent on CAN), or None when this ECU keeps quiet
+        """
+        if mode in (0x01, 0x02):
+            table = self.pids if mode == 0x01 else self.freeze_frame
+            # mode 02 PIDs are followed by a frame number, ie: 020C000D00
+            step = 1 if mode == 0x01 else 2
+            payload = bytearray([0x40 + mode])
+            for i in range(0, len(args), step):
+                pid = args[i]
+                frame = args[i + 1:i + step]
+                if mode == 0x02 and (frame or b"\x00") != b"\x00":
+                    continue  # only the one freeze frame is kept
+                if pid % 0x20 == 0:
+                    data = self.__bitmap(table, pid)
+                elif pid in table:
+                    data = self.__get(table, pid)
+                else:
+                    data = None
+                if data is not None:
+                    payload += bytearray([pid]) + (b"\x00" if mode == 0x02 else b"") + data
+            return payload if len(payload) > 1 else None
+
+        elif mode in (0x03, 0x07):
+            codes = self.dtcs if mode == 0x03 else self.pending_dtcs
+            return bytearray([0x40 + mode, len(codes)]) + b"".join([dtc_bytes(c) for c in codes])
+
+        elif mode == 0x04:
+            del self.dtcs[:]
+            del self.pending_dtcs[:]
+            self.freeze_frame.clear()
+            return b"\x44"
+
+        elif mode == 0x06 and len(args) == 1:
+            mid = args[0]
+            if mid % 0x20 == 0:
+                data = self.__bitmap(self.monitors, mid)
+                return None if data is None else b"\x46" + bytearray([mid]) + data
+            elif mid in self.monitors:
+                # every test repeats the MID
+                return b"\x46" + bytearray().join([bytearray([mid]) + t for t in self.monitors[mid]])
+            return None
+
+        elif mode == 0x09 and len(args) == 1:
+            info = args[0]
+            if info % 0x20 == 0:
+                data = self.__bitmap(self.info, info)
+            elif info in self.info:
+                data = self.__get(self.info, info)
+                if info % 2 == 0:
+                    data = b"\x01" + data  # number of data items
+            else:
+                data = None
+            return None if data is None else b"\x49" + bytearray([info]) + data
+
+        return None
+
+    def to_dict(self):
+        def hex_data(v):
+            return "(function)" if callable(v) else hexlify(bytearray(v)).decode().upper()
+
+        def hex_table(d):
+            return dict([("%02X" % k, hex_data(v)) for k, v in sorted(d.items())])
+
+        return {
+            "name": self.name,
+            "address": self.address,
+            "pids": hex_table(self.pids),
+            "freeze_frame": hex_table(self.freeze_frame),
+            "dtcs": self.dtcs,
+            "pending_dtcs": self.pending_dtcs,
+            "monitors": dict([("%02X" % k, [hex_data(t) for t in v])
+                              for k, v in sorted(self.monitors.items())]),
+            "info": hex_table(self.info),
+        }
+
+
+class VehicleProfile(object):
+    """
+        What an emulated vehicle answers with: its protocol (an ELM
+        protocol ID, "1" through "9"), battery voltage, and ECUs. The
+        first ECU is the engine. The VIN, when given, is answered by it.
+
+        Profiles can be kept as JSON, see load(), where PIDs are hex
+        string keys and data hex strings.
+    """
+
+    def __init__(self, protocol="6", ecus=None, voltage=12.6, vin=None, name=""):
+        if protocol not in ELM327._SUPPORTED_PROTOCOLS or protocol == "A":
+            raise ValueError("can't emulate protocol %r" % protocol)
+        self.name = name
+        self.protocol = protocol
+        self.voltage = voltage
+        self.vin = vin
+        self.ecus = [e if isinstance(e, EmulatedECU) else EmulatedECU(**e)
+                     for e in (ecus or [EmulatedECU()])]
+
+        for i, ecu in enumerate(self.ecus):
+            if ecu.address is None:
+                ecu.address = 0x10 + 8 * i  # 0x10 is the engine, by convention
+        if vin is not None and 0x02 not in self.ecus[0].info:
+            self.ecus[0].info[0x02] = vin.encode()
+            self.ecus[0].info.setdefault(0x01, b"\x05")  # VIN message count
+
+    @property
+    def can(self):
+        return self.protocol in "6789"
+
+    @property
+    def id_bits(self):
+        return {"6": 11, "7": 29, "8": 11, "9": 29}.get(self.protocol)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "protocol": self.protocol,
+            "voltage": self.voltage,
+            "vin": self.vin,
+            "ecus": [e.to_dict() for e in self.ecus],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(protocol=d.get("protocol", "6"),
+                   ecus=d.get("ecus"),
+                   voltage=d.get("voltage", 12.6),
+                   vin=d.get("vin"),
+                   name=d.get("name", ""))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def default(cls, protocol="6"):
+        """ an engine and a transmission, with a few DTCs and monitor results """
+        return cls.from_dict(dict(DEFAULT_PROFILE, protocol=protocol))
+
+
+DEFAULT_PROFILE = {
+    "name": "default",
+    "protocol": "6",
+    "voltage": 12.6,
+    "vin": "1D4GP00R55B123456",
+    "ecus": [
+        {
+            "name": "engine",
+            "pids": {
+                "01": "00076500",  # monitor status, MIL off
+                "03": "0200",  # fuel system status
+                "04": "4C",  # engine load
+                "05": "7B",  # coolant temperature
+                "06": "80",  # short term fuel trim
+                "07": "82",  # long term fuel trim
+                "0B": "63",  # intake manifold pressure
+                "0C": "1AF8",  # RPM
+                "0D": "32",  # speed
+                "0E": "90",  # timing advance
+                "0F": "46",  # intake air temperature
+                "10": "0190",  # MAF
+                "11": "4C",  # throttle position
+                "13": "03",  # O2 sensors present
+                "1C": "01",  # OBD compliance
+                "1F": "008C",  # run time
+                "21": "0000",  # distance with MIL on
+                "2F": "80",  # fuel level
+                "31": "1F40",  # distance since codes cleared
+                "33": "65",  # barometric pressure
+                "42": "3710",  # control module voltage
+                "46": "46",  # ambient air temperature
+                "51": "01",  # fuel type
+                "5E": "01F4",  # fuel rate
+            },
+            "freeze_frame": {
+                "02": "0143",  # the DTC that stored the frame
+                "05": "7B",
+                "0C": "1AF8",
+                "0D": "32",
+            },
+            "dtcs": ["P0143", "P0196"],
+            "pending_dtcs": ["P0300"],
+            "monitors": {
+                "01": ["010A0BB00B930C4A", "020A0B930B930C4A"],
+                "02": ["010A0B930B930C4A"],
+            },
+        },
+        {
+            "name": "transmission",
+            "pids": {
+                "01": "00040000",
+                "0C": "1AF0",
+                "0D": "32",
+                "1C": "01",
+            },
+            "dtcs": ["P0700"],
+        },
+    ],
+}
+
+
+# the adapter's error lines, and what they stand for
+FAULTS = {
+    "no_data": "NO DATA",  # nothing answered
+    "can_error": "CAN ERROR",  # bus trouble (BUS ERROR on the older protocols)
+    "buffer_full": "BUFFER FULL",  # the adapter's buffer overflowed mid-response
+    "stopped": "STOPPED",  # the request was interrupted
+    "rx_error": "<RX ERROR",  # a garbled line among the answers
+    "missing_frame": None,  # a frame of a multi-frame answer is lost
+    "drop": None,  # the adapter hangs: no answer, not even the prompt
+}
+
+
+class ELM327Emulator(threading.Thread):
+    """
+        An ELM327 on the master side of a pseudo terminal, answering for a
+        VehicleProfile. Connect to it by its port_name, as to any adapter:
+
+            emulator = ELM327Emulator(VehicleProfile.default())
+            connection = obd.OBD(emulator.port_name)
+
+        It speaks the AT commands python-OBD uses, and answers modes
+        01, 02, 03, 04, 06, 07 and 09, including multi-PID requests and
+        the frame counts of fast mode. For load tests:
+
+            latency:          seconds before each ECU's answer, or a
+                              function of the request returning them
+            response_timeout: seconds the adapter keeps listening after the
+                              last answer, unless told how many to expect
+            baudrate:         throttles the output to the serial line's pace
+            faults:           {fault: probability}, see FAULTS and inject()
+            seed:             for the faults to strike repeatably
+    """
+
+    ELM_VERSION = "ELM327 v1.5"
+
+    def __init__(self, profile=None, latency=0.0, response_timeout=0.0,
+                 baudrate=None, faults=None, seed=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.profile = profile or VehicleProfile.default()
+        self.latency = latency
+        self.response_timeout = response_timeout
+        self.baudrate = baudrate
+        self.faults = dict(faults or {})
+        for fault in self.faults:
+            if fault not in FAULTS:
+                raise ValueError("unknown fault %r" % fault)
+        self.ignition = True  # when off, the vehicle doesn't answer
+        self.requests = 0  # OBD requests answered so far
+
+        self.__random = random.Random(seed)
+        self.__injected = deque()
+        self.__closed = False
+        self.__reset()
+
+        self.master, self.__slave = os.openpty()
+        tty.setraw(self.__slave)  # no echo or line discipline of the terminal's own
+        self.port_name = os.ttyname(self.__slave)
+        self.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.__closed = True
+        self.join()
+        os.close(self.__slave)
+        os.close(self.master)
+
+    def inject(self, fault, count=1):
+        """ the next count OBD requests meet the given fault """
+        if fault not in FAULTS:
+            raise ValueError("unknown fault %r" % fault)
+        self.__injected.extend([fault] * count)
+
+    # ------------------------------ serial side ------------------------------
+
+    def __reset(self):
+        """ the settings after ATZ """
+        self.__echo = True
+        self.__headers = False
+        self.__linefeeds = False
+        self.__spaces = True
+        self.__protocol = "0"  # automatic
+        self.__found = False  # whether the automatic search has run
+        self.__header = None  # ATSH, None for the functional (broadcast) address
+        self.__low_power = False
+        self.__waking = False  # drops the line that woke the chip
+        self.__last = b""
+
+    def run(self):
+        pending = b""
+        while not self.__closed:
+            if not select.select([self.master], [], [], 0.05)[0]:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                continue  # nothing has the port open
+
+            if self.__low_power:
+                # any character wakes the chip, which drops the rest of the line
+                self.__low_power = False
+                self.__waking = True
+                pending = b""
+                self.__write(b"\r\r" + self.ELM_VERSION.encode() + b"\r\r>")
+
+            pending += data
+            while b"\r" in pending:
+                cmd, pending = pending.split(b"\r", 1)
+                if self.__waking:
+                    self.__waking = False
+                    continue
+                self.__handle(cmd)
+
+    def __write(self, data):
+        if not self.baudrate:
+            os.write(self.master, data)
+            return
+        # 10 bits a byte: start, 8 data bits, stop
+        for i in range(0, len(data), 16):
+            chunk = data[i:i + 16]
+            os.write(self.master, chunk)
+            time.sleep(len(chunk) * 10.0 / self.baudrate)
+
+    def __eol(self):
+        return b"\r\n" if self.__linefeeds else b"\r"
+
+    def __reply(self, lines, prompt=True):
+        eol = self.__eol()
+        out = b"".join([line + eol for line in lines])
+        self.__write(out + eol + b">" if prompt else out)
+
+    def __handle(self, cmd):
+        cmd = cmd.strip()
+        if self.__echo:
+            self.__write(cmd + self.__eol())
+
+        # a bare CR repeats the previous command
+        cmd = cmd.replace(b" ", b"").upper() or self.__last
+        self.__last = cmd
+
+        if cmd.startswith(b"AT"):
+            lines = self.__at(cmd[2:].decode("ascii", "replace"))
+        else:
+            lines = self.__obd(cmd)
+
+        # None for no prompt: in low power, or when the adapter hung
+        if lines is not None:
+            self.__reply(lines)
+
+    # ------------------------------ AT commands ------------------------------
+
+    def __at(self, c):
+        """ returns the lines answering an AT command (without the AT) """
+        if c in ("Z", "WS"):
+            self.__reset()
+            return [b"", self.ELM_VERSION.encode()]
+        if c == "D":
+            echo = self.__echo
+            self.__reset()
+            self.__echo = echo
+            return [b"OK"]
+        if c == "I":
+            return [self.ELM_VERSION.encode()]
+        if c == "@1":
+            return [b"OBDII to RS232 Interpreter"]
+        if c == "RV":
+            return [("%.1fV" % self.profile.voltage).encode()]
+        if c == "DPN":
+            found = self.profile.protocol if self.__found else "0"
+            return [(("A" + found) if self.__protocol == "0" else self.__protocol).encode()]
+        if c == "DP":
+            p = self.profile.protocol if self.__protocol == "0" else self.__protocol
+            name = ELM327._SUPPORTED_PROTOCOLS[p].ELM_NAME if p in ELM327._SUPPORTED_PROTOCOLS else "AUTO"
+            return [(("AUTO, " + name) if self.__protocol == "0" else name).encode()]
+        if c == "LP":
+            self.__reply([b"OK"], prompt=False)
+            self.__low_power = True
+            return None
+
+        flag = c[-1:] in ("0", "1")
+        if flag and c[:-1] in ("M", "R", "V"):
+            return [b"OK"]  # memory, responses, variable DLC: no bearing here
+        if flag and c[:-1] in ("E", "H", "L", "S"):
+            on = c[-1] == "1"
+            if c[0] == "E":
+                self.__echo = on
+            elif c[0] == "H":
+                self.__headers = on
+            elif c[0] == "L":
+                self.__linefeeds = on
+            else:
+                self.__spaces = on
+            return [b"OK"]
+
+        if c[:2] in ("SP", "TP") and len(c) in (3, 4):
+            p = c[-1]  # ATSPA6: automatic, trying 6 first
+            if p != "0" and p not in ELM327._SUPPORTED_PROTOCOLS:
+                return [b"?"]
+            self.__protocol = p if (len(c) == 3 and p != "0") else "0"
+            self.__found = False
+            return [b"OK"]
+
+        if c.startswith("SH") and len(c) in (5, 8):
+            try:
+                self.__header = int(c[2:], 16), len(c) - 2
+            except ValueError:
+                return [b"?"]
+            return [b"OK"]
+
+        # accepted, with no bearing on what's emulated
+        for prefix in ("CAF", "AT", "ST", "CRA", "CF", "CM", "CP", "AL", "NL", "PC"):
+            if c.startswith(prefix):
+                return [b"OK"]
+
+        return [b"?"]
+
+    # ------------------------------ OBD requests -----------------------------
+
+    def __addressed(self):
+        """ the ECUs that the current header (ATSH) reaches """
+        ecus = self.profile.ecus
+        if self.__header is None:
+            return ecus
+        h, digits = self.__header
+        if self.profile.id_bits == 11:
+            if digits == 3 and 0x7E0 <= h <= 0x7E7:
+                return ecus[h - 0x7E0:h - 0x7E0 + 1]
+            return ecus
+        target = (h >> 8) & 0xFF
+        if self.profile.id_bits == 29 and (h >> 16) != 0xDA:
+            return ecus  # 0xDB is the functional address
+        return [e for e in ecus if e.address == target] or ecus
+
+    def __obd(self, cmd):
+        """ returns the lines answering an OBD request, or None for no answer at all """
+        try:
+            count = None
+            if len(cmd) % 2:
+                count = int(cmd[-1:], 16)  # fast mode: the number of answers expected
+                cmd = cmd[:-1]
+            request = bytearray(unhexlify(cmd))
+        except (ValueError, TypeError):
+            return [b"?"]
+        if not request:
+            return [b"?"]
+
+        lines = []
+        if self.__protocol == "0" and not self.__found:
+            lines.append(b"SEARCHING...")
+
+        p = self.profile
+        if not self.ignition or (self.__protocol != "0" and self.__protocol != p.protocol):
+            return lines + [b"UNABLE TO CONNECT"]
+        self.__found = True
+
+        self.requests += 1
+        fault = self.__fault()
+        if fault == "drop":
+            return None
+
+        answers = []
+        for ecu in self.__addressed():
+            payload = ecu.answer(request[0], request[1:])
+            if payload is not None:
+                answers.append((ecu, payload))
+            if count is not None and len(answers) >= count:
+                break
+
+        for ecu, payload in answers:
+            self.__wait(request)
+            frames = self.__format(ecu, payload)
+            if fault == "missing_frame" and len(frames) > 1:
+                del frames[1]
+                fault = None
+            lines += frames
+
+        if count is None and self.response_timeout:
+            time.sleep(self.response_timeout)
+
+        if not answers or fault == "no_data":
+            return [line for line in lines if line == b"SEARCHING..."] + [b"NO DATA"]
+        if fault == "can_error":
+            return [b"CAN ERROR" if p.can else b"BUS ERROR"]
+        if fault == "buffer_full":
+            return lines[:max(len(lines) // 2, 1)] + [b"BUFFER FULL"]
+        if fault == "stopped":
+            return [b"STOPPED"]
+        if fault == "rx_error":
+            lines.insert(self.__random.randint(0, len(lines)), b"<RX ERROR")
+        return lines
+
+    def __fault(self):
+        if self.__injected:
+            return self.__injected.popleft()
+        for fault in sorted(self.faults):
+            if self.__random.random() < self.faults[fault]:
+                return fault
+        return None
+
+    def __wait(self, request):
+        latency = self.latency(request) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    # ------------------------------- framing --------------------------------
+
+    def __format(self, ecu, payload):
+        """ returns the lines carrying one ECU's answer, as the adapter prints them """
+        sep = b" " if self.__spaces else b""
+
+        def hex_bytes(b):
+            return sep.join([("%02X" % x).encode() for x in b])
+
+        p = self.profile
+        if p.can:
+            frames = self.__isotp(payload)
+            if not self.__headers:
+                if len(frames) == 1:
+                    return [hex_bytes(payload)]
+                # multi-frame answers are numbered, after their length
+                lines = [("%03X" % len(payload)).encode()]
+                lines += [("%X:" % (i & 0xF)).encode() + sep + hex_bytes(f[1:] if i else f[2:])
+                          for i, f in enumerate(frames)]
+                return lines
+            if p.id_bits == 11:
+                # the ECU's own response ID, as addressed by 7E0 + its place
+                header = ("%03X" % (0x7E8 + p.ecus.index(ecu))).encode()
+            else:
+                header = hex_bytes(bytearray([0x18, 0xDA, 0xF1, ecu.address]))
+            return [header + sep + hex_bytes(f) for f in frames]
+
+        frames = self.__legacy(payload)
+        if not self.__headers:
+            return [hex_bytes(f) for f in frames]
+        lines = []
+        for f in frames:
+            if p.protocol == "1":
+                header = bytearray([0x41, 0x6B, ecu.address])
+            elif p.protocol in "23":
+                header = bytearray([0x48, 0x6B, ecu.address])
+            else:
+                header = bytearray([0x80 | len(f), 0xF1, ecu.address])
+            frame = header + f
+            lines.append(hex_bytes(frame + bytearray([sum(frame) & 0xFF])))
+        return lines
+
+    @staticmethod
+    def __isotp(payload):
+        """ splits a payload into ISO 15765-2 single, first and consecutive frames """
+        if len(payload) <= 7:
+            return [bytearray([len(payload)]) + payload]
+        frames = [bytearray([0x10 | (len(payload) >> 8), len(payload) & 0xFF]) + payload[:6]]
+        for seq, i in enumerate(range(6, len(payload), 7), 1):
+            frames.append(bytearray([0x20 | (seq & 0x0F)]) + payload[i:i + 7])
+        return frames
+
+    @staticmethod
+    def __legacy(payload):
+        """ splits a payload into the frames of the older protocols (data bytes only) """
+        mode = payload[0]
+        if mode in (0x43, 0x47):
+            # no DTC count, 3 DTCs to a frame
+            codes = payload[2:] or b"\x00" * 6
+            codes += b"\x00" * (-len(codes) % 6)
+            return [bytearray([mode]) + codes[i:i + 6] for i in range(0, len(codes), 6)]
+        if mode == 0x49 and payload[1] % 2 == 0 and payload[1] % 0x20:
+            # numbered frames of 4 bytes, without the data item count
+            data = payload[3:]
+            data = b"\x00" * (-len(data) % 4) + data
+            return [payload[:2] + bytearray([n]) + data[i:i + 4]
+                    for n, i in enumerate(range(0, len(data), 4), 1)]
+        if len(payload) > 7:
+            return []  # no room (ie: multi-PID requests)
+        return [payload]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Emulates an ELM327 on a pseudo terminal")
+    parser.add_argument("--profile", help="vehicle profile (JSON), the built-in one by default")
+    parser.add_argument("--protocol", help="overrides the profile's protocol (1-9)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each ECU's answer")
+    parser.add_argument("--response-timeout", type=float, default=0.0,
+                        help="seconds of listening for more answers, when not told how many")
+    parser.add_argument("--baudrate", type=int, help="throttles the output to this serial rate")
+    parser.add_argument("--fault", action="append", default=[], metavar="NAME=P",
+                        help="fault probability, one of: " + ", ".join(sorted(FAULTS)))
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    d = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile) as f:
+            d = json.load(f)
+    if args.protocol:
+        d = dict(d, protocol=args.protocol)
+    faults = dict([(f.split("=")[0], float(f.split("=")[1])) for f in args.fault])
+
+    emulator = ELM327Emulator(VehicleProfile.from_dict(d), latency=args.latency,
+                              response_timeout=args.response_timeout,
+                              baudrate=args.baudrate, faults=faults, seed=args.seed)
+    print(emulator.port_name)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.close()
+
+
+if __name__ == "__main__":
+    main()
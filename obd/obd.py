@@ -32,12 +32,16 @@
 
 
 import logging
+from collections import OrderedDict
 
 from .OBDResponse import OBDResponse
 from .__version__ import __version__
 from .commands import commands
 from .elm327 import ELM327
+from .profile import ConnectionProfile
 from .protocols import ECU_HEADER
+from .protocols.protocol import Message
+from .session import QueryState, load_commands, run, test_cmd
 from .utils import scan_serial, OBDStatus
 
 logger = logging.getLogger(__name__)
@@ -49,24 +53,34 @@ class OBD(object):
         with it's assorted commands/sensors.
     """
 
+    # SAE J1979 allows up to 6 PIDs in a single mode 01 request. Mode 02
+    # PIDs travel with a frame number, so only 3 of those fit.
+    MAX_PACKED_PIDS = {1: 6, 2: 3}
+
+    # multi-PID requests are only defined for the CAN protocols
+    PACKING_PROTOCOLS = ["6", "7", "8", "9"]
+
     def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True,
-                 timeout=0.1, check_voltage=True, start_low_power=False):
+                 timeout=0.1, check_voltage=True, start_low_power=False,
+                 profile=None, max_baudrate=None, compact=False):
         self.interface = None
         self.supported_commands = set(commands.base_commands())
         self.fast = fast  # global switch for disabling optimizations
         self.timeout = timeout
-        self.__last_command = b""  # used for running the previous command with a CR
-        self.__last_header = ECU_HEADER.ENGINE  # for comparing with the previously used header
-        self.__frame_counts = {}  # keeps track of the number of return frames for each command
+        self.__state = QueryState()  # last command, header and frame counts
+        self.__packing = True  # cleared if the car refuses multi-PID requests
 
         logger.info("======================= python-OBD (v%s) =======================" % __version__)
-        self.__connect(portstr, baudrate, protocol,
-                       check_voltage, start_low_power)  # initialize by connecting and loading sensors
-        self.__load_commands()  # try to load the car's supported commands
+        self.__connect(portstr, baudrate, protocol, check_voltage, start_low_power,
+                       profile, max_baudrate, compact)  # initialize by connecting and loading sensors
+        if self.interface is not None and self.interface.from_profile():
+            self.__load_profile(profile)  # the profile checked out, trust its commands
+        else:
+            self.__load_commands()  # try to load the car's supported commands
         logger.info("===================================================================")
 
     def __connect(self, portstr, baudrate, protocol, check_voltage,
-                  start_low_power):
+                  start_low_power, profile, max_baudrate, compact):
         """
             Attempts to instantiate an ELM327 connection object.
         """
@@ -84,7 +98,8 @@ class OBD(object):
                 logger.info("Attempting to use port: " + str(port))
                 self.interface = ELM327(port, baudrate, protocol,
                                         self.timeout, check_voltage,
-                                        start_low_power)
+                                        start_low_power, profile, max_baudrate,
+                                        compact)
 
                 if self.interface.status() >= OBDStatus.ELM_CONNECTED:
                     break  # success! stop searching for serial
@@ -92,7 +107,8 @@ class OBD(object):
             logger.info("Explicit port defined")
             self.interface = ELM327(portstr, baudrate, protocol,
                                     self.timeout, check_voltage,
-                                    start_low_power)
+                                    start_low_power, profile, max_baudrate,
+                                    compact)
 
         # if the connection failed, close it
         if self.interface.status() == OBDStatus.NOT_CONNECTED:
@@ -109,49 +125,59 @@ class OBD(object):
             logger.warning("Cannot load commands: No connection to car")
             return
 
-        logger.info("querying for supported commands")
-        pid_getters = commands.pid_getters()
-        for get in pid_getters:
-            # PID listing commands should sequentially become supported
-            # Mode 1 PID 0 is assumed to always be supported
-            if not self.test_cmd(get, warn=False):
-                continue
+        # when querying, only use the blocking OBD.query()
+        # prevents problems when query is redefined in a subclass (like Async)
+        run(load_commands(self.supported_commands, self.test_cmd), lambda get: OBD.query(self, get))
 
-            # when querying, only use the blocking OBD.query()
-            # prevents problems when query is redefined in a subclass (like Async)
-            response = OBD.query(self, get)
+    def __load_profile(self, profile):
+        """
+            Restores the supported commands and frame counts
+            remembered by a ConnectionProfile.
+        """
 
-            if response.is_null():
-                logger.info("No valid data for PID listing command: %s" % get)
-                continue
+        for name in profile.supported_commands:
+            if commands.has_name(name):
+                self.supported_commands.add(commands[name])
 
-            # loop through PIDs bit-array
-            for i, bit in enumerate(response.value):
-                if bit:
+        for name, count in profile.frame_counts.items():
+            if commands.has_name(name):
+                self.__state.frame_counts[commands[name]] = count
 
-                    mode = get.mode
-                    pid = get.pid + i + 1
+        self.__state.packed_frame_counts.update(profile.packed_frame_counts)
 
-                    if commands.has_pid(mode, pid):
-                        self.supported_commands.add(commands[mode][pid])
+        logger.info("loaded %d supported commands from profile" % len(self.supported_commands))
 
-                    # set support for mode 2 commands
-                    if mode == 1 and commands.has_pid(2, pid):
-                        self.supported_commands.add(commands[2][pid])
+    def profile(self, vin=None):
+        """
+            Returns a ConnectionProfile of this connection, for use in
+            OBD(profile=...) the next time around. Returns None unless
+            connected to the car.
+        """
 
-        logger.info("finished querying with %d commands supported" % len(self.supported_commands))
+        if not self.is_connected():
+            return None
+
+        def named(cmds):
+            # custom commands can't be looked up by name later on
+            return [c for c in cmds if commands.has_name(c.name) and commands[c.name] == c]
+
+        return ConnectionProfile(
+            baudrate=self.interface.initial_baudrate(),
+            protocol=self.interface.protocol_id(),
+            ecu_map=self.interface.ecu_map(),
+            pid_bitmap=self.interface.pid_bitmap(),
+            supported_commands=[c.name for c in named(self.supported_commands)],
+            frame_counts=dict([(c.name, self.__state.frame_counts[c]) for c in named(self.__state.frame_counts)]),
+            packed_frame_counts=dict(self.__state.packed_frame_counts),
+            vin=vin,
+            chip=self.interface.chip(),
+            negotiated_baudrate=self.interface.negotiated_baudrate(),
+        )
 
     def __set_header(self, header):
-        if header == self.__last_header:
-            return
-        r = self.interface.send_and_parse(b'AT SH ' + header + b' ')
-        if not r:
-            logger.info("Set Header ('AT SH %s') did not return data", header)
-            return OBDResponse()
-        if "\n".join([m.raw() for m in r]) != "OK":
-            logger.info("Set Header ('AT SH %s') did not return 'OK'", header)
-            return OBDResponse()
-        self.__last_header = header
+        cmd = self.__state.header_command(header)
+        if cmd is not None:
+            self.__state.header_sent(header, self.interface.send_and_parse(cmd))
 
     def close(self):
         """
@@ -246,19 +272,7 @@ class OBD(object):
             Returns a boolean for whether a command will
             be sent without using force=True.
         """
-        # test if the command is supported
-        if not self.supports(cmd):
-            if warn:
-                logger.warning("'%s' is not supported" % str(cmd))
-            return False
-
-        # mode 06 is only implemented for the CAN protocols
-        if cmd.mode == 6 and self.interface.protocol_id() not in ["6", "7", "8", "9"]:
-            if warn:
-                logger.warning("Mode 06 commands are only supported over CAN protocols")
-            return False
-
-        return True
+        return test_cmd(cmd, self.supported_commands, self.protocol_id(), warn)
 
     def query(self, cmd, force=False):
         """
@@ -277,19 +291,9 @@ class OBD(object):
         self.__set_header(cmd.header)
 
         logger.info("Sending command: %s" % str(cmd))
-        cmd_string = self.__build_command_string(cmd)
+        cmd_string = self.__state.command_string(cmd, self.fast)
         messages = self.interface.send_and_parse(cmd_string)
-
-        # if we're sending a new command, note it
-        # first check that the current command WASN'T sent as an empty CR
-        # (CR is added by the ELM327 class)
-        if cmd_string:
-            self.__last_command = cmd_string
-
-        # if we don't already know how many frames this command returns,
-        # log it, so we can specify it next time
-        if cmd not in self.__frame_counts:
-            self.__frame_counts[cmd] = sum([len(m.frames) for m in messages])
+        self.__state.command_sent(cmd, cmd_string, messages)
 
         if not messages:
             logger.info("No valid OBD Messages returned")
@@ -297,19 +301,199 @@ class OBD(object):
 
         return cmd(messages)  # compute a response object
 
-    def __build_command_string(self, cmd):
-        """ assembles the appropriate command string """
-        cmd_string = cmd.command
+    def query_each(self, cmd, force=False):
+        """
+            query(), as a generator: yields an OBDResponse for each ECU's
+            answer as soon as it is complete, rather than one response once
+            every ECU has answered (see ELM327.send_and_stream()).
+        """
 
-        # if we know the number of frames that this command returns,
-        # only wait for exactly that number. This avoids some harsh
-        # timeouts from the ELM, thus speeding up queries.
-        if self.fast and cmd.fast and (cmd in self.__frame_counts):
-            cmd_string += str(self.__frame_counts[cmd]).encode()
+        if self.status() == OBDStatus.NOT_CONNECTED:
+            logger.warning("Query failed, no connection available")
+            return
 
-        # if we sent this last time, just send a CR
-        # (CR is added by the ELM327 class)
-        if self.fast and (cmd_string == self.__last_command):
-            cmd_string = b""
+        # if the user forces, skip all checks
+        if not force and not self.test_cmd(cmd):
+            return
+
+        self.__set_header(cmd.header)
+
+        logger.info("Sending command: %s" % str(cmd))
+        cmd_string = self.__state.command_string(cmd, self.fast)
+        try:
+            for message in self.interface.send_and_stream(cmd_string):
+                r = cmd([message])
+                if r.messages:
+                    yield r
+        finally:
+            if cmd_string:
+                self.__state.last_command = cmd_string
+
+    def query_many(self, cmds, force=False):
+        """
+            Sends a list of OBDCommands, and returns a list of OBDResponses
+            in the same order.
+
+            On CAN protocols, mode 01/02 commands sharing a header are
+            packed into multi-PID requests, costing one round trip per
+            group rather than one per command. Everything else (and all
+            commands on legacy protocols) is sent with query().
+        """
+
+        if not self.__can_pack():
+            return [OBD.query(self, c, force) for c in cmds]
+
+        responses = [None] * len(cmds)
+
+        # group[(header, mode)] = {pid: [index, index, ...]}, pids in request order
+        groups = {}
+        for i, c in enumerate(cmds):
+            if not force and not self.test_cmd(c):
+                responses[i] = OBDResponse()
+            elif self.__packable(c):
+                pids = groups.get((c.header, c.mode))
+                if pids is None:
+                    pids = groups[(c.header, c.mode)] = OrderedDict()
+                pids.setdefault(c.pid, []).append(i)
+            else:
+                responses[i] = OBD.query(self, c, force=True)
+
+        for (header, mode), pids in sorted(groups.items()):
+            # split each group into chunks that fit into a single request
+            chunk_size = self.MAX_PACKED_PIDS[mode]
+            pid_list = list(pids.keys())
+            for n in range(0, len(pid_list), chunk_size):
+                chunk = [cmds[pids[pid][0]] for pid in pid_list[n:n + chunk_size]]
+                for c, r in zip(chunk, self.__query_packed(chunk)):
+                    for i in pids[c.pid]:
+                        responses[i] = r
+
+        return responses
+
+    def monitor(self, max_pending=1024, can_filter=None):
+        """
+            Listens to the bus rather than polling it: returns a generator
+            of (timestamp, Frame) tuples, for every frame the adapter sees
+            (or only those from the IDs of a CANFilter). See ELM327.monitor().
+            No queries can be made until the generator is closed (or the
+            loop over it is left).
+        """
+
+        if self.status() == OBDStatus.NOT_CONNECTED:
+            logger.warning("Monitor failed, no connection available")
+            return iter([])
+
+        # the adapter's last command will be the monitor command, which
+        # mustn't be repeated by a bare CR
+        self.__state.last_command = b""
+        return self.interface.monitor(max_pending, can_filter)
+
+    def monitor_stats(self):
+        """ returns the counters (MonitorStats) of the current or last monitor() """
+        if self.interface is None:
+            return None
+        return self.interface.monitor_stats()
+
+    def __can_pack(self):
+        """ returns a boolean for whether multi-PID requests may be sent """
+        return self.fast and \
+            self.__packing and \
+            self.status() == OBDStatus.CAR_CONNECTED and \
+            self.interface.protocol_id() in self.PACKING_PROTOCOLS
+
+    def __packable(self, cmd):
+        """ returns a boolean for whether a command can share a request """
+        # PIDs 00, 20, 40... (supported PID ranges) may not be mixed
+        # with data PIDs, and commands of unknown length can't be split
+        return cmd.mode in self.MAX_PACKED_PIDS and \
+            cmd.pid is not None and \
+            cmd.pid % 0x20 != 0 and \
+            cmd.bytes > 2
+
+    def __query_packed(self, cmds):
+        """
+            Sends a single multi-PID request for the given commands, which
+            must share a mode and a header. Returns a list of OBDResponses.
+        """
+
+        if len(cmds) == 1:
+            return [OBD.query(self, cmds[0], force=True)]
+
+        mode = cmds[0].mode
+        self.__set_header(cmds[0].header)
+
+        # mode 02 PIDs are followed by a frame number, ie: 020C000D00
+        frame = b"00" if mode == 2 else b""
+        cmd_string = cmds[0].command[:2] + b"".join([c.command[2:] + frame for c in cmds])
+        key = (cmds[0].header, cmd_string)
+
+        # same optimizations as QueryState.command_string()
+        count = self.__state.packed_frame_counts.get(key, 0)
+        if self.fast and all([c.fast for c in cmds]) and 0 < count < 16:
+            cmd_string += ("%X" % count).encode()
+        if self.fast and (cmd_string == self.__state.last_command):
+            send_string = b""
+        else:
+            send_string = cmd_string
+
+        logger.info("Sending packed command: %s" % ", ".join([str(c) for c in cmds]))
+        messages = self.interface.send_and_parse(send_string)
+        self.__state.last_command = cmd_string
+
+        split = self.__split_packed(cmds, messages or [])
+
+        if not any(split.values()):
+            # nothing usable came back. Some ECUs only answer single PID
+            # requests, so try them one by one, and if that works, stop
+            # packing for the rest of this connection.
+            logger.info("No valid OBD Messages returned for packed command")
+            responses = [OBD.query(self, c, force=True) for c in cmds]
+            if any([not r.is_null() for r in responses]):
+                logger.warning("Car does not answer multi-PID requests, disabling them")
+                self.__packing = False
+            return responses
+
+        if key not in self.__state.packed_frame_counts:
+            self.__state.packed_frame_counts[key] = sum([len(m.frames) for m in messages])
+
+        return [c(split[c]) if split[c] else OBDResponse() for c in cmds]
+
+    def __split_packed(self, cmds, messages):
+        """
+            Cuts each ECU's answer to a multi-PID request into one Message
+            per PID, shaped as though that PID had been requested alone.
+            Returns a dict of {OBDCommand: [Message, ...]}
+
+            41 0C 1A F8 0D 32 --> 41 0C 1A F8
+                                  41 0D 32
+        """
 
-        return cmd_string
+        mode = cmds[0].mode
+        by_pid = {c.pid: c for c in cmds}
+        split = {c: [] for c in cmds}
+
+        for message in messages:
+            data = message.data
+            if not message.parsed() or data[0] != 0x40 + mode:
+                continue  # ELM output, or a negative response
+
+            i = 1
+            while i < len(data):
+                c = by_pid.get(data[i])
+                if c is None:
+                    logger.debug("Unexpected PID in packed response, dropping the remainder")
+                    break
+
+                start = i + (2 if mode == 2 else 1)  # skip the frame number
+                end = start + c.bytes - 2
+                if end > len(data):
+                    logger.debug("Packed response was shorter than expected")
+                    break
+
+                m = Message(message.frames)
+                m.ecu = message.ecu
+                m.data = bytearray([data[0], data[i]]) + data[start:end]
+                split[c].append(m)
+                i = end
+
+        return split
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# profile.py                                                           #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionProfile(object):
+    """
+        Everything learned while connecting an adapter to a vehicle,
+        kept so that the next connection can skip the discovery steps.
+
+        Commands are stored by name, so only commands from the
+        python-OBD tables survive a round trip.
+    """
+
+    def __init__(self, baudrate=None, protocol=None, ecu_map=None,
+                 supported_commands=None, frame_counts=None,
+                 packed_frame_counts=None, vin=None, chip=None,
+                 negotiated_baudrate=None, pid_bitmap=None):
+        self.baudrate = baudrate  # int, or None when it shouldn't be touched
+        self.protocol = protocol  # ELM protocol ID, ie: "6"
+        self.ecu_map = ecu_map or {}  # {tx_id: ECU}
+        self.supported_commands = supported_commands or []  # [command name]
+        self.frame_counts = frame_counts or {}  # {command name: frames}
+        self.packed_frame_counts = packed_frame_counts or {}  # {(header, command string): frames}
+        self.vin = vin
+        self.chip = chip  # adapter ID string, ie: "STN1110 v4.0.1"
+        self.negotiated_baudrate = negotiated_baudrate  # int, see ELM327.negotiate_baudrate()
+        self.pid_bitmap = pid_bitmap or {}  # {tx_id: 0100 answer, ie: "BE3FA813"}
+
+    def to_dict(self):
+        return {
+            "baudrate": self.baudrate,
+            "protocol": self.protocol,
+            # JSON keys are strings
+            "ecu_map": dict([(str(k), v) for k, v in self.ecu_map.items()]),
+            "supported_commands": sorted(self.supported_commands),
+            "frame_counts": self.frame_counts,
+            "packed_frame_counts": [[h.decode(), c.decode(), n] for (h, c), n in
+                                    sorted(self.packed_frame_counts.items())],
+            "vin": self.vin,
+            "chip": self.chip,
+            "negotiated_baudrate": self.negotiated_baudrate,
+            "pid_bitmap": dict([(str(k), v) for k, v in self.pid_bitmap.items()]),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(baudrate=d.get("baudrate"),
+                   protocol=d.get("protocol"),
+                   ecu_map=dict([(int(k), v) for k, v in d.get("ecu_map", {}).items()]),
+                   supported_commands=d.get("supported_commands"),
+                   frame_counts=d.get("frame_counts"),
+                   packed_frame_counts=dict([((h.encode(), c.encode()), n) for h, c, n in
+                                             d.get("packed_frame_counts", [])]),
+                   vin=d.get("vin"),
+                   chip=d.get("chip"),
+                   negotiated_baudrate=d.get("negotiated_baudrate"),
+                   pid_bitmap=dict([(int(k), v) for k, v in d.get("pid_bitmap", {}).items()]))
+
+    def __eq__(self, other):
+        if isinstance(other, ConnectionProfile):
+            return self.to_dict() == other.to_dict()
+        else:
+            return False
+
+    def __str__(self):
+        return "ConnectionProfile(VIN=%s BAUD=%s PROTOCOL=%s #CMDS=%d)" % \
+            (self.vin, self.baudrate, self.protocol, len(self.supported_commands))
+
+
+class ProfileStore(object):
+    """
+        Keeps ConnectionProfiles as JSON files in a directory.
+
+        There is one file per adapter (by MAC address, or any other name),
+        holding a profile for each vehicle (by VIN) it was connected to,
+        along with the VIN of the last one.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, adapter):
+        name = "".join([c for c in adapter.upper() if c.isalnum()])
+        return os.path.join(self.directory, "profile_%s.json" % name)
+
+    def __read(self, adapter):
+        try:
+            with open(self.path(adapter), "r") as fd:
+                return json.load(fd)
+        except (IOError, OSError):
+            return {}
+        except ValueError as e:
+            logger.warning("Ignoring corrupt connection profile %s: %s" % (self.path(adapter), e))
+            return {}
+
+    def load(self, adapter, vin=None):
+        """
+            Returns the ConnectionProfile for the given adapter and vehicle,
+            or None if there isn't one. By default, the vehicle that was
+            last connected to the adapter is used.
+        """
+        d = self.__read(adapter)
+        vehicles = d.get("vehicles", {})
+        if vin is None:
+            vin = d.get("last")
+        if vin not in vehicles:
+            return None
+        return ConnectionProfile.from_dict(vehicles[vin])
+
+    def save(self, adapter, profile):
+        """ stores a ConnectionProfile, under the profile's own VIN """
+        d = self.__read(adapter)
+        vin = profile.vin or ""
+        d.setdefault("vehicles", {})[vin] = profile.to_dict()
+        d["last"] = vin
+
+        # write to the side, then swap, so a power cut can't leave half a file
+        path = self.path(adapter)
+        tmp = path + ".tmp"
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(tmp, "w") as fd:
+                json.dump(d, fd, indent=1)
+            os.rename(tmp, path)
+        except (IOError, OSError) as e:
+            logger.warning("Failed to save connection profile %s: %s" % (path, e))
+            return False
+        return True
@@ -31,12 +31,25 @@
 ########################################################################
 
 import logging
-from binascii import hexlify
+import sys
+from binascii import hexlify, unhexlify
 
 from obd.utils import isHex, BitArray
 
 logger = logging.getLogger(__name__)
 
+if sys.version[0] < '3':
+    # Python 2's unhexlify() makes a str, which (like a memoryview on it)
+    # indexes to characters: frames get bytearrays, and slices of them
+    def frame_buffer(raw):
+        return bytearray(unhexlify(raw))
+
+    def frame_view(buf):
+        return buf
+else:
+    frame_buffer = unhexlify
+    frame_view = memoryview
+
 """
 
 Basic data models for all protocols to use
@@ -62,15 +75,25 @@ class ECU:
 
 
 class Frame(object):
-    """ represents a single parsed line of OBD output """
+    """
+        represents a single parsed line of OBD output
+
+        Protocols decode each line into a single bytes buffer, and the
+        frame's data is a memoryview into it, so no copies are made until
+        the frames are assembled into a Message.
+    """
+
+    __slots__ = ("raw", "data", "priority", "addr_mode", "rx_id", "tx_id",
+                 "can_id", "type", "seq_index", "data_len")
 
     def __init__(self, raw):
         self.raw = raw
-        self.data = bytearray()
+        self.data = b""
         self.priority = None
         self.addr_mode = None
         self.rx_id = None
         self.tx_id = None
+        self.can_id = None  # full CAN identifier (CAN protocols only)
         self.type = None
         self.seq_index = 0  # only used when type = CF
         self.data_len = None
@@ -79,6 +102,8 @@ class Frame(object):
 class Message(object):
     """ represents a fully parsed OBD message of one or more Frames (lines) """
 
+    __slots__ = ("frames", "ecu", "data")
+
     def __init__(self, frames):
         self.frames = frames
         self.ecu = ECU.UNKNOWN
@@ -112,6 +137,61 @@ class Message(object):
             return False
 
 
+def split_obd_lines(lines):
+    """
+        Sorts response lines (str, or bytes straight from the adapter) into
+        OBD lines, without their spaces, and the other lines.
+
+        Non-hex (non-OBD) lines shouldn't go through the big parsers,
+        since they are typically messages such as: "NO DATA", "CAN ERROR",
+        "UNABLE TO CONNECT", etc. They're passed on un-scrubbed. Both lists
+        hold strings.
+    """
+    obd_lines = []
+    non_obd_lines = []
+
+    for line in lines:
+        if isinstance(line, (bytes, bytearray)):
+            # hex digits are ASCII: the bytes only need decoding once they're known good
+            line_no_spaces = line.translate(None, b" ")
+            if isHex(line_no_spaces):
+                obd_lines.append(line_no_spaces.decode("ascii"))
+            else:
+                non_obd_lines.append(line.decode("utf-8", "ignore"))
+        else:
+            # compact output (ATS0) needs no scrubbing
+            line_no_spaces = line.replace(' ', '') if ' ' in line else line
+
+            if isHex(line_no_spaces):
+                obd_lines.append(line_no_spaces)
+            else:
+                non_obd_lines.append(line)  # pass the original, un-scrubbed line
+
+    return obd_lines, non_obd_lines
+
+
+def group_frames(frames):
+    """
+        Groups frames by transmitting ECU, in ECU order:
+        [(tx_id, [Frame, Frame]), ...]
+    """
+    if not frames:
+        return []
+
+    # usually, there's just the one ECU talking
+    tx_id = frames[0].tx_id
+    for frame in frames:
+        if frame.tx_id != tx_id:
+            break
+    else:
+        return [(tx_id, frames)]
+
+    frames_by_ECU = {}
+    for frame in frames:
+        frames_by_ECU.setdefault(frame.tx_id, []).append(frame)
+    return [(ecu, frames_by_ECU[ecu]) for ecu in sorted(frames_by_ECU.keys())]
+
+
 """
 
 Protocol objects are factories for Frame and Message objects. They are
@@ -154,6 +234,11 @@ class Protocol(object):
         # subsequent runs will now be tagged correctly
         self.populate_ecu_map(messages)
 
+        # the PIDs each ECU supports, as hex: tells apart cars that share
+        # an ECU layout, as most CAN cars do
+        self.pid_bitmap = dict([(m.tx_id, m.hex()[4:].decode().upper())
+                                for m in messages if m.data[:2] == b"\x41\x00"])
+
         # log out the ecu map
         for tx_id, ecu in self.ecu_map.items():
             names = [k for k, v in ECU.__dict__.items() if v == ecu]
@@ -164,25 +249,12 @@ class Protocol(object):
         """
             Main function
 
-            accepts a list of raw strings from the car, split by lines
+            accepts a list of raw strings (or bytes) from the car, split by lines
         """
 
         # ---------------------------- preprocess ----------------------------
 
-        # Non-hex (non-OBD) lines shouldn't go through the big parsers,
-        # since they are typically messages such as: "NO DATA", "CAN ERROR",
-        # "UNABLE TO CONNECT", etc, so sort them into these two lists:
-        obd_lines = []
-        non_obd_lines = []
-
-        for line in lines:
-
-            line_no_spaces = line.replace(' ', '')
-
-            if isHex(line_no_spaces):
-                obd_lines.append(line_no_spaces)
-            else:
-                non_obd_lines.append(line)  # pass the original, un-scrubbed line
+        obd_lines, non_obd_lines = split_obd_lines(lines)
 
         # ---------------------- handle valid OBD lines ----------------------
 
@@ -197,22 +269,13 @@ class Protocol(object):
             if self.parse_frame(frame):
                 frames.append(frame)
 
-        # group frames by transmitting ECU
-        # frames_by_ECU[tx_id] = [Frame, Frame]
-        frames_by_ECU = {}
-        for frame in frames:
-            if frame.tx_id not in frames_by_ECU:
-                frames_by_ECU[frame.tx_id] = [frame]
-            else:
-                frames_by_ECU[frame.tx_id].append(frame)
-
         # parse frames into whole messages
         messages = []
-        for ecu in sorted(frames_by_ECU.keys()):
+        for ecu, ecu_frames in group_frames(frames):
 
             # new message object with a copy of the raw data
             # and frames addressed for this ecu
-            message = Message(frames_by_ECU[ecu])
+            message = Message(ecu_frames)
 
             # subclass function to assemble frames into Messages
             if self.parse_message(message):
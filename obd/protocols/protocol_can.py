@@ -31,13 +31,17 @@
 ########################################################################
 
 import logging
-from binascii import unhexlify
+import struct
 
 from obd.utils import contiguous
-from .protocol import Protocol
+from .protocol import Protocol, Frame, Message, ECU, frame_buffer, frame_view
 
 logger = logging.getLogger(__name__)
 
+# CAN identifiers, read straight from the start of a frame's buffer
+_ID_11 = struct.Struct(">H")
+_ID_29 = struct.Struct(">I")
+
 
 class CANProtocol(Protocol):
     TX_ID_ENGINE = 0
@@ -57,73 +61,83 @@ class CANProtocol(Protocol):
 
         raw = frame.raw
 
-        # pad 11-bit CAN headers out to 32 bits for consistency,
-        # since ELM already does this for 29-bit CAN headers
+        # 11-bit CAN headers are 3 hex digits, so pad them out to 2 bytes.
+        # The header is read in place, rather than padding it out to the
+        # 4 bytes of a 29-bit header, which would cost another copy:
 
-        #        7 E8 06 41 00 BE 7F B8 13
+        #  7 E8 06 41 00 BE 7F B8 13
         # to:
-        # 00 00 07 E8 06 41 00 BE 7F B8 13
+        # 07 E8 06 41 00 BE 7F B8 13
 
         if self.id_bits == 11:
-            raw = "00000" + raw
+            raw = "0" + raw
+            header_len = 2
+        else:
+            header_len = 4
 
         # Handle odd size frames and drop
         if len(raw) & 1:
             logger.debug("Dropping frame for being odd")
             return False
 
-        raw_bytes = bytearray(unhexlify(raw))
+        # the one and only copy of this line's bytes
+        buf = frame_buffer(raw)
+        size = len(buf) - header_len
 
         # check for valid size
 
-        if len(raw_bytes) < 6:
+        if size < 2:
             # make sure that we have at least a PCI byte, and one following byte
             # for FF frames with 12-bit length codes, or 1 byte of data
             #
-            # 00 00 07 E8 10 20 ...
+            # 07 E8 10 20 ...
 
             logger.debug("Dropped frame for being too short")
             return False
 
-        if len(raw_bytes) > 12:
+        if size > 8:
             logger.debug("Dropped frame for being too long")
             return False
 
         # read header information
-        if self.id_bits == 11:
+        if header_len == 2:
             # Ex.
-            #       [   ]
-            # 00 00 07 E8 06 41 00 BE 7F B8 13
+            # [   ]
+            # 07 E8 06 41 00 BE 7F B8 13
 
-            frame.priority = raw_bytes[2] & 0x0F  # always 7
-            frame.addr_mode = raw_bytes[3] & 0xF0  # 0xD0 = functional, 0xE0 = physical
+            # the identifier, as it was on the bus (ie: 0x7E8)
+            frame.can_id = _ID_11.unpack_from(buf)[0]
+            frame.priority = buf[0] & 0x0F  # always 7
+            frame.addr_mode = buf[1] & 0xF0  # 0xD0 = functional, 0xE0 = physical
 
             if frame.addr_mode == 0xD0:
                 # untested("11-bit functional request from tester")
-                frame.rx_id = raw_bytes[3] & 0x0F  # usually (always?) 0x0F for broadcast
+                frame.rx_id = buf[1] & 0x0F  # usually (always?) 0x0F for broadcast
                 frame.tx_id = 0xF1  # made-up to mimic all other protocols
-            elif raw_bytes[3] & 0x08:
+            elif buf[1] & 0x08:
                 frame.rx_id = 0xF1  # made-up to mimic all other protocols
-                frame.tx_id = raw_bytes[3] & 0x07
+                frame.tx_id = buf[1] & 0x07
             else:
                 # untested("11-bit message header from tester (functional or physical)")
                 frame.tx_id = 0xF1  # made-up to mimic all other protocols
-                frame.rx_id = raw_bytes[3] & 0x07
+                frame.rx_id = buf[1] & 0x07
 
         else:  # self.id_bits == 29:
-            frame.priority = raw_bytes[0]  # usually (always?) 0x18
-            frame.addr_mode = raw_bytes[1]  # DB = functional, DA = physical
-            frame.rx_id = raw_bytes[2]  # 0x33 = broadcast (functional)
-            frame.tx_id = raw_bytes[3]  # 0xF1 = tester ID
-
-        # extract the frame data
-        #             [      Frame       ]
-        # 00 00 07 E8 06 41 00 BE 7F B8 13
-        frame.data = raw_bytes[4:]
+            # the identifier, as it was on the bus (ie: 0x18DAF110)
+            frame.can_id = _ID_29.unpack_from(buf)[0]
+            frame.priority = buf[0]  # usually (always?) 0x18
+            frame.addr_mode = buf[1]  # DB = functional, DA = physical
+            frame.rx_id = buf[2]  # 0x33 = broadcast (functional)
+            frame.tx_id = buf[3]  # 0xF1 = tester ID
+
+        # extract the frame data, as a view on the line's buffer
+        #       [      Frame       ]
+        # 07 E8 06 41 00 BE 7F B8 13
+        frame.data = frame_view(buf)[header_len:]
 
         # read PCI byte (always first byte in the data section)
-        #             v
-        # 00 00 07 E8 06 41 00 BE 7F B8 13
+        #       v
+        # 07 E8 06 41 00 BE 7F B8 13
         frame.type = frame.data[0] & 0xF0
         if frame.type not in [self.FRAME_TYPE_SF,
                               self.FRAME_TYPE_FF,
@@ -133,8 +147,8 @@ class CANProtocol(Protocol):
 
         if frame.type == self.FRAME_TYPE_SF:
             # single frames have 4 bit length codes
-            #              v
-            # 00 00 07 E8 06 41 00 BE 7F B8 13
+            #        v
+            # 07 E8 06 41 00 BE 7F B8 13
             frame.data_len = frame.data[0] & 0x0F
 
             # drop frames with no data
@@ -143,8 +157,8 @@ class CANProtocol(Protocol):
 
         elif frame.type == self.FRAME_TYPE_FF:
             # First frames have 12 bit length codes
-            #              v vv
-            # 00 00 07 E8 10 20 49 04 00 01 02 03
+            #        v vv
+            # 07 E8 10 20 49 04 00 01 02 03
             frame.data_len = (frame.data[0] & 0x0F) << 8
             frame.data_len += frame.data[1]
 
@@ -154,8 +168,8 @@ class CANProtocol(Protocol):
 
         elif frame.type == self.FRAME_TYPE_CF:
             # Consecutive frames have 4 bit sequence indices
-            #              v
-            # 00 00 07 E8 21 04 05 06 07 08 09 0A
+            #        v
+            # 07 E8 21 04 05 06 07 08 09 0A
             frame.seq_index = frame.data[0] & 0x0F
 
         return True
@@ -175,7 +189,7 @@ class CANProtocol(Protocol):
             #             [      Frame       ]
             #                [     Data      ]
             # 00 00 07 E8 06 41 00 BE 7F B8 13 xx xx xx xx, anything else is ignored
-            message.data = frame.data[1:1 + frame.data_len]
+            message.data = bytearray(frame.data[1:1 + frame.data_len])
 
         else:
             # sort FF and CF into their own lists
@@ -244,31 +258,132 @@ class CANProtocol(Protocol):
             # [     specified message length (from first-frame)      ]
             # 49 04 01 35 36 30 32 38 39 34 39 41 43 00 00 00 00 00 00 31
 
-            # on the first frame, skip PCI byte AND length code
-            message.data = ff[0].data[2:]
-
-            # now that they're in order, load/accumulate the data from each CF frame
-            for f in cf:
-                message.data += f.data[1:]  # chop off the PCI byte
+            # on the first frame, skip PCI byte AND length code, then
+            # now that they're in order, accumulate the data from each CF frame
+            # (chopping off the PCI byte), in a single copy
+            message.data = bytearray().join([ff[0].data[2:]] + [f.data[1:] for f in cf])
 
             # chop to the correct size (as specified in the first frame)
-            message.data = message.data[:ff[0].data_len]
-
-        # trim DTC requests based on DTC count
-        # this ISN'T in the decoder because the legacy protocols
-        # don't provide a DTC_count bytes, and instead, insert a 0x00
-        # for consistency
-
-        if message.data[0] == 0x43:
-            #    []
-            # 43 03 11 11 22 22 33 33
-            #       [DTC] [DTC] [DTC]
-
-            num_dtc_bytes = message.data[1] * 2  # each DTC is 2 bytes
-            message.data = message.data[:(num_dtc_bytes + 2)]  # add 2 to account for mode/DTC_count bytes
+            del message.data[ff[0].data_len:]
 
+        trim_dtc(message)
         return True
 
+    def reassembler(self):
+        """ returns an ISOTPReassembler, to parse frames as they arrive """
+        return ISOTPReassembler(self)
+
+
+def trim_dtc(message):
+    """ trims DTC responses based on their DTC count """
+
+    # this ISN'T in the decoder because the legacy protocols
+    # don't provide a DTC_count bytes, and instead, insert a 0x00
+    # for consistency
+
+    if message.data[0] == 0x43:
+        #    []
+        # 43 03 11 11 22 22 33 33
+        #       [DTC] [DTC] [DTC]
+
+        num_dtc_bytes = message.data[1] * 2  # each DTC is 2 bytes
+        del message.data[(num_dtc_bytes + 2):]  # add 2 to account for mode/DTC_count bytes
+
+
+class ISOTPReassembler(object):
+    """
+        Incremental ISO-TP reassembly, for frames fed one at a time, as
+        they come off the wire, rather than all at once after the prompt.
+
+        Each ECU (tx_id) has at most one message in progress. A message
+        is complete the moment its last consecutive frame arrives, so the
+        answer of a fast ECU can be used while slower ones are still
+        talking. Consecutive frames must arrive in order (as ISO-TP has
+        them sent): a gap in the sequence numbers abandons the message,
+        and a repeated frame is ignored.
+    """
+
+    def __init__(self, protocol):
+        self.protocol = protocol
+        self.dropped = 0  # messages abandoned, or frames that belonged to none
+        self.__transfers = {}  # tx_id : [frames, data, data_len, next sequence number]
+
+    def feed_line(self, line):
+        """
+            parses a line of hex (without spaces) into a frame, and feeds
+            it. Returns the Message it completes, or None
+        """
+        frame = Frame(line)
+        if not self.protocol.parse_frame(frame):
+            return None
+        return self.feed(frame)
+
+    def feed(self, frame):
+        """ feeds a parsed frame, returns the Message it completes, or None """
+        p = self.protocol
+        tx_id = frame.tx_id
+
+        if frame.type == p.FRAME_TYPE_SF:
+            self.__abandon(tx_id, "single frame")
+            message = Message([frame])
+            message.data = bytearray(frame.data[1:1 + frame.data_len])
+            return self.__complete(message)
+
+        if frame.type == p.FRAME_TYPE_FF:
+            self.__abandon(tx_id, "first frame")
+            self.__transfers[tx_id] = [[frame], bytearray(frame.data[2:]), frame.data_len, 1]
+            return None
+
+        transfer = self.__transfers.get(tx_id)
+        if transfer is None:
+            logger.debug("Dropping consecutive frame without a first frame")
+            self.dropped += 1
+            return None
+
+        frames, data, data_len, seq = transfer
+        if frame.seq_index != seq & 0x0F:
+            if frame.seq_index == (seq - 1) & 0x0F:
+                logger.debug("Dropping repeated consecutive frame")
+            else:
+                logger.debug("Recieved multiline response with missing frames")
+                del self.__transfers[tx_id]
+                self.dropped += 1
+            return None
+
+        # the full sequence number, past the wrap-around of the low 4 bits
+        frame.seq_index = seq
+        transfer[3] = seq + 1
+        frames.append(frame)
+        data += frame.data[1:]
+
+        if len(data) < data_len:
+            return None
+
+        del self.__transfers[tx_id]
+        del data[data_len:]
+        message = Message(frames)
+        message.data = data
+        return self.__complete(message)
+
+    def pending(self):
+        """ the tx_ids of the ECUs with a message in progress """
+        return list(self.__transfers.keys())
+
+    def reset(self):
+        """ abandons the messages in progress, ie: once the prompt arrives """
+        for tx_id in list(self.__transfers.keys()):
+            self.__abandon(tx_id, "end of response")
+
+    def __abandon(self, tx_id, reason):
+        if self.__transfers.pop(tx_id, None) is not None:
+            logger.debug("Incomplete message from ECU %d, before the %s" % (tx_id, reason))
+            self.dropped += 1
+
+    def __complete(self, message):
+        trim_dtc(message)
+        message.ecu = self.protocol.ecu_map.get(message.tx_id, ECU.UNKNOWN)
+        return message
+
 
 ##############################################
 #                                            #
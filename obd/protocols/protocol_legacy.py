@@ -31,10 +31,9 @@
 ########################################################################
 
 import logging
-from binascii import unhexlify
 
 from obd.utils import contiguous
-from .protocol import Protocol
+from .protocol import Protocol, frame_buffer, frame_view
 
 logger = logging.getLogger(__name__)
 
@@ -54,7 +53,8 @@ class LegacyProtocol(Protocol):
             logger.debug("Dropping frame for being odd")
             return False
 
-        raw_bytes = bytearray(unhexlify(raw))
+        # the one and only copy of this line's bytes
+        raw_bytes = frame_buffer(raw)
 
         if len(raw_bytes) < 6:
             logger.debug("Dropped frame for being too short")
@@ -69,8 +69,9 @@ class LegacyProtocol(Protocol):
         # 48 6B 10 41 00 BE 7F B8 13 ck
         # ck = checksum byte
 
-        # exclude header and trailing checksum (handled by ELM adapter)
-        frame.data = raw_bytes[3:-1]
+        # exclude header and trailing checksum (handled by ELM adapter),
+        # as a view on the line's buffer
+        frame.data = frame_view(raw_bytes)[3:-1]
 
         # read header information
         frame.priority = raw_bytes[0]
@@ -113,9 +114,8 @@ class LegacyProtocol(Protocol):
             # 48 6B 10 43 03 04 00 00 00 00 ck
             #             [     Data      ]
 
-            message.data = bytearray([0x43, 0x00])  # forge the mode byte and CAN's DTC_count byte
-            for f in frames:
-                message.data += f.data[1:]
+            # forge the mode byte and CAN's DTC_count byte
+            message.data = bytearray().join([b"\x43\x00"] + [f.data[1:] for f in frames])
 
         else:
             if len(frames) == 1:
@@ -125,7 +125,7 @@ class LegacyProtocol(Protocol):
                 #          [  Frame/Data   ]
                 # 48 6B 10 41 00 BE 7F B8 13 ck
 
-                message.data = frames[0].data
+                message.data = bytearray(frames[0].data)
 
             else:  # len(frames) > 1:
                 # generic multiline requests carry an order byte
@@ -153,13 +153,10 @@ class LegacyProtocol(Protocol):
 
                 # now that they're in order, accumulate the data from each frame
 
-                # preserve the first frame's mode and PID bytes (for consistency with CAN)
-                frames[0].data.pop(2)  # remove the sequence byte
-                message.data = frames[0].data
-
-                # add the data from the remaining frames
-                for f in frames[1:]:
-                    message.data += f.data[3:]  # loose the mode/pid/seq bytes
+                # preserve the first frame's mode and PID bytes (for consistency with CAN),
+                # then add the data from the remaining frames, loosing their mode/pid/seq bytes
+                message.data = bytearray().join([frames[0].data[:2], frames[0].data[3:]] +
+                                                [f.data[3:] for f in frames[1:]])
 
         return True
 
@@ -0,0 +1,607 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# session.py                                                           #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+
+"""
+    The parts of a connection that don't do any I/O, shared by the blocking
+    classes (elm327.ELM327, obd.OBD) and their asyncio flavour (obd.aio).
+
+    The adapter's initialization is written as generators, which yield
+    requests and get their answers back through send():
+
+        Send(cmd, delay)   -->  the response lines
+        Write(cmd, delay)  -->  None: the command is written, nothing is read
+        Probe(baud)        -->  whether the adapter answers at that baud
+        SetBaudrate(baud)  -->  None
+
+    A step may also yield another step (a generator), to run it and get
+    its result back. A step ends with its result by raising Return(value),
+    since generators can't return a value on Python 2. Steps drives the
+    lot, and each transport answers the requests its own way (see run()).
+"""
+
+import logging
+import types
+
+from .commands import commands
+from .protocols import UnknownProtocol, ECU_HEADER, \
+    SAE_J1850_PWM, SAE_J1850_VPW, ISO_9141_2, ISO_14230_4_5baud, ISO_14230_4_fast, \
+    ISO_15765_4_11bit_500k, ISO_15765_4_29bit_500k, ISO_15765_4_11bit_250k, \
+    ISO_15765_4_29bit_250k, SAE_J1939
+from .utils import OBDStatus
+
+logger = logging.getLogger(__name__)
+
+
+SUPPORTED_PROTOCOLS = {
+    # "0" : None,
+    # Automatic Mode. This isn't an actual protocol. If the
+    # ELM reports this, then we don't have enough
+    # information. see Handshake.auto_protocol()
+    "1": SAE_J1850_PWM,
+    "2": SAE_J1850_VPW,
+    "3": ISO_9141_2,
+    "4": ISO_14230_4_5baud,
+    "5": ISO_14230_4_fast,
+    "6": ISO_15765_4_11bit_500k,
+    "7": ISO_15765_4_29bit_500k,
+    "8": ISO_15765_4_11bit_250k,
+    "9": ISO_15765_4_29bit_250k,
+    "A": SAE_J1939,
+    # "B" : None, # user defined 1
+    # "C" : None, # user defined 2
+}
+
+# used as a fallback, when ATSP0 doesn't cut it
+TRY_PROTOCOL_ORDER = [
+    "6",  # ISO_15765_4_11bit_500k
+    "8",  # ISO_15765_4_11bit_250k
+    "1",  # SAE_J1850_PWM
+    "7",  # ISO_15765_4_29bit_500k
+    "9",  # ISO_15765_4_29bit_250k
+    "2",  # SAE_J1850_VPW
+    "3",  # ISO_9141_2
+    "4",  # ISO_14230_4_5baud
+    "5",  # ISO_14230_4_fast
+    "A",  # SAE_J1939
+]
+
+# 38400, 9600 are the possible boot bauds (unless reprogrammed via
+# PP 0C).  19200, 38400, 57600, 115200, 230400, 500000 are listed on
+# p.46 of the ELM327 datasheet.
+#
+# Once pyserial supports non-standard baud rates on platforms other
+# than Linux, we'll add 500K to this list.
+#
+# We check the two default baud rates first, then go fastest to
+# slowest, on the theory that anyone who's using a slow baud rate is
+# going to be less picky about the time required to detect it.
+TRY_BAUDS = [38400, 9600, 230400, 115200, 57600, 19200]
+
+# mode 06 is only implemented for the CAN protocols
+CAN_PROTOCOLS = ["6", "7", "8", "9"]
+
+
+class Send(object):
+    """ request: send a command, and read the response lines """
+
+    def __init__(self, cmd, delay=None):
+        self.cmd = cmd
+        self.delay = delay  # seconds to wait before reading
+
+
+class Write(object):
+    """ request: write a command, and wait, without reading anything """
+
+    def __init__(self, cmd, delay=None):
+        self.cmd = cmd
+        self.delay = delay
+
+
+class Probe(object):
+    """ request: switch to a baud rate, and tell whether the adapter answers with a prompt """
+
+    def __init__(self, baud):
+        self.baud = baud
+
+
+class SetBaudrate(object):
+    """ request: switch to a baud rate """
+
+    def __init__(self, baud):
+        self.baud = baud
+
+
+class Return(Exception):
+    """ ends a step with a result """
+
+    def __init__(self, value=None):
+        Exception.__init__(self)
+        self.value = value
+
+
+class Steps(object):
+    """
+        Drives a step, and the steps it yields in turn. send() takes the
+        answer to the previous request (None to start), and returns the
+        next one. When the outermost step is over, it raises Return with
+        its result.
+    """
+
+    def __init__(self, steps):
+        self.__stack = [steps]
+
+    def send(self, answer):
+        while True:
+            try:
+                request = self.__stack[-1].send(answer)
+            except Return as r:
+                answer = r.value
+            except StopIteration:
+                answer = None
+            else:
+                if not isinstance(request, types.GeneratorType):
+                    return request
+                # a sub-step: run it, its result goes back to this one
+                self.__stack.append(request)
+                answer = None
+                continue
+            self.__stack.pop()
+            if not self.__stack:
+                raise Return(answer)
+
+
+def run(steps, answer):
+    """
+        Runs a generator of requests, answering each with answer(request).
+        Returns the generator's result.
+    """
+    steps = Steps(steps)
+    try:
+        request = steps.send(None)
+        while True:
+            request = steps.send(answer(request))
+    except Return as r:
+        return r.value
+
+
+def isok(lines, expectEcho=False):
+    if not lines:
+        return False
+    if expectEcho:
+        # don't test for the echo itself
+        # allow the adapter to already have echo disabled
+        return has_message(lines, 'OK')
+    else:
+        return len(lines) == 1 and lines[0] == 'OK'
+
+
+def has_message(lines, text):
+    for line in lines:
+        if text in line:
+            return True
+    return False
+
+
+class Handshake(object):
+    """
+        Brings an ELM327 up: finds its baud rate, sets it up, and connects
+        to the car. The state it ends in (status, protocol, compact...) is
+        left in its attributes, for the transport to pick up. When a step
+        fails for good, error holds the reason, and the transport should
+        close the port.
+    """
+
+    def __init__(self, port_name, protocol=None, check_voltage=True, compact=False):
+        self.port_name = port_name
+        self.status = OBDStatus.NOT_CONNECTED
+        self.protocol = UnknownProtocol([])
+        self.compact = False  # whether the adapter dropped the spaces (ATS0)
+        self.from_profile = False
+        self.negotiated_baudrate = None  # rate a profile found the adapter at, if not the initial one
+        self.error = None
+        self.__protocol_id = protocol
+        self.__check_voltage = check_voltage
+        self.__want_compact = compact
+
+    def __fail(self, msg):
+        self.error = msg
+        return False
+
+    def set_baudrate(self, baud, negotiable=()):
+        """
+            Sets the given baud rate, or finds the adapter's. negotiable
+            lists the faster rates it may have been left at.
+            Returns a boolean for success.
+        """
+        if baud is not None:
+            yield SetBaudrate(baud)
+            raise Return(True)
+
+        # when connecting to pseudo terminal, don't bother with auto baud
+        if self.port_name.startswith("/dev/pts"):
+            logger.debug("Detected pseudo terminal, skipping baudrate setup")
+            raise Return(True)
+
+        raise Return((yield self.auto_baudrate(negotiable)))
+
+    def auto_baudrate(self, negotiable=()):
+        """
+            Detect the baud rate at which a connected ELM32x interface is operating.
+            Returns boolean for success.
+        """
+
+        for baud in TRY_BAUDS:
+            if (yield Probe(baud)):
+                logger.debug("Choosing baud %d" % baud)
+                raise Return(True)
+
+        # a session that didn't close() may have left the adapter at a
+        # negotiated rate. If so, reset it, which also resets its baud.
+        for baud in negotiable:
+            if (yield Probe(baud)):
+                logger.debug("Adapter was left at %d baud, resetting it" % baud)
+                yield Write(b"ATZ", delay=1)
+                for baud in TRY_BAUDS:
+                    if (yield Probe(baud)):
+                        logger.debug("Choosing baud %d" % baud)
+                        raise Return(True)
+                break
+
+        logger.debug("Failed to choose baud")
+        raise Return(False)
+
+    def reset(self):
+        """
+            Resets the adapter, sets it up, and connects to the car.
+            Returns False when the port should be closed (see error).
+        """
+
+        # ---------------------------- ATZ (reset) ----------------------------
+        yield Send(b"ATZ", delay=1)  # wait 1 second for ELM to initialize
+        # return data can be junk, so don't bother checking
+
+        # -------------------------- ATE0 (echo OFF) --------------------------
+        r = yield Send(b"ATE0")
+        if not isok(r, expectEcho=True):
+            raise Return(self.__fail("ATE0 did not return 'OK'"))
+
+        # ------------------------- ATH1 (headers ON) -------------------------
+        r = yield Send(b"ATH1")
+        if not isok(r):
+            raise Return(self.__fail("ATH1 did not return 'OK', or echoing is still ON"))
+
+        # ------------------------ ATL0 (linefeeds OFF) -----------------------
+        r = yield Send(b"ATL0")
+        if not isok(r):
+            raise Return(self.__fail("ATL0 did not return 'OK'"))
+
+        # --------------- ATCAF1, ATS0 (compact output, opt-in) ---------------
+        if self.__want_compact:
+            yield self.set_compact()
+
+        # by now, we've successfuly communicated with the ELM, but not the car
+        self.status = OBDStatus.ELM_CONNECTED
+
+        # -------------------------- AT RV (read volt) ------------------------
+        if self.__check_voltage:
+            r = yield Send(b"AT RV")
+            if not r or len(r) != 1 or r[0] == '':
+                raise Return(self.__fail("No answer from 'AT RV'"))
+            try:
+                if float(r[0].lower().replace('v', '')) < 6:
+                    logger.error("OBD2 socket disconnected")
+                    raise Return(True)
+            except ValueError:
+                raise Return(self.__fail("Incorrect response from 'AT RV'"))
+            # by now, we've successfuly connected to the OBD socket
+            self.status = OBDStatus.OBD_CONNECTED
+
+        # try to communicate with the car, and load the correct protocol parser
+        if (yield self.set_protocol(self.__protocol_id)):
+            self.status = OBDStatus.CAR_CONNECTED
+        elif self.status == OBDStatus.OBD_CONNECTED:
+            logger.error("Adapter connected, but the ignition is off")
+        else:
+            logger.error("Connected to the adapter, "
+                         "but failed to connect to the vehicle")
+        raise Return(True)
+
+    def fast_connect(self, profile, baudrate=None):
+        """
+            Tries to connect with the baud rate and protocol remembered in
+            a ConnectionProfile, skipping the reset and all the searching.
+
+            The cached protocol's 0100 response is the probe: it must come
+            from the same ECUs, listing the same PIDs, as last time. Otherwise
+            we're most likely plugged into another car, and discovery is due.
+
+            Returns a boolean for success. On failure, the status and
+            protocol are reset, ready for the regular initialization.
+        """
+
+        logger.info("Trying connection profile: BAUD=%s PROTOCOL=%s" %
+                    (profile.baudrate, profile.protocol))
+
+        if baudrate is not None:
+            yield SetBaudrate(baudrate)
+        elif profile.baudrate is not None and not self.port_name.startswith("/dev/pts"):
+            found = yield Probe(profile.baudrate)
+            if not found and profile.negotiated_baudrate is not None:
+                # no reset since last time, so still at the negotiated rate
+                found = yield Probe(profile.negotiated_baudrate)
+                if found:
+                    self.negotiated_baudrate = profile.negotiated_baudrate
+            if not found:
+                logger.info("Connection profile rejected: no answer at %d baud" % profile.baudrate)
+                raise Return(False)
+
+        # no reset, just put the ELM in the state we expect (see reset())
+        for cmd in [b"ATE0", b"ATH1", b"ATL0"]:
+            if not isok((yield Send(cmd)), expectEcho=True):
+                logger.info("Connection profile rejected: %s did not return 'OK'" % cmd)
+                raise Return(False)
+
+        if self.__want_compact:
+            yield self.set_compact()
+
+        self.status = OBDStatus.ELM_CONNECTED
+
+        if self.__check_voltage:
+            r = yield Send(b"AT RV")
+            try:
+                if float(r[0].lower().replace('v', '')) < 6:
+                    raise ValueError()
+            except (ValueError, IndexError):
+                logger.info("Connection profile rejected: no voltage on the OBD socket")
+                self.status = OBDStatus.NOT_CONNECTED
+                raise Return(False)
+            self.status = OBDStatus.OBD_CONNECTED
+
+        if profile.protocol in SUPPORTED_PROTOCOLS and \
+           (yield self.manual_protocol(profile.protocol)) and \
+           self.protocol.ecu_map == profile.ecu_map and \
+           self.protocol.pid_bitmap == profile.pid_bitmap:
+            self.status = OBDStatus.CAR_CONNECTED
+            self.from_profile = True
+            raise Return(True)
+
+        logger.info("Connection profile rejected: the vehicle did not answer as expected")
+        self.status = OBDStatus.NOT_CONNECTED
+        self.protocol = UnknownProtocol([])
+        raise Return(False)
+
+    def set_compact(self):
+        """
+            Drops the spaces between bytes (ATS0), and makes sure that CAN
+            automatic formatting is on (ATCAF1), so that padding bytes aren't
+            printed. This takes about a third off every response line:
+
+                7E8 04 41 0C 1A F8  -->  7E804410C1AF8
+
+            Headers stay on (ATH1): the parsers need the transmitter IDs.
+            Adapters older than v1.3 don't know ATS0, and keep the spaces,
+            which the parsers handle just as well.
+        """
+        yield Send(b"ATCAF1")
+        self.compact = isok((yield Send(b"ATS0")))
+        if not self.compact:
+            logger.info("Adapter refused ATS0, responses will keep their spaces")
+
+    def set_protocol(self, protocol_):
+        if protocol_ is not None:
+            # an explicit protocol was specified
+            if protocol_ not in SUPPORTED_PROTOCOLS:
+                logger.error(
+                    "{:} is not a valid protocol. ".format(protocol_) +
+                    "Please use \"1\" through \"A\"")
+                raise Return(False)
+            raise Return((yield self.manual_protocol(protocol_)))
+        else:
+            # auto detect the protocol
+            raise Return((yield self.auto_protocol()))
+
+    def manual_protocol(self, protocol_):
+        yield Send(b"ATTP" + protocol_.encode())
+        r0100 = yield Send(b"0100")
+
+        if not has_message(r0100, "UNABLE TO CONNECT"):
+            # success, found the protocol
+            self.protocol = SUPPORTED_PROTOCOLS[protocol_](r0100)
+            raise Return(True)
+
+        raise Return(False)
+
+    def auto_protocol(self):
+        """
+            Attempts communication with the car.
+
+            If no protocol is specified, then protocols at tried with `ATTP`
+
+            Upon success, the appropriate protocol parser is loaded,
+            and this function returns True
+        """
+
+        # -------------- try the ELM's auto protocol mode --------------
+        yield Send(b"ATSP0")
+
+        # -------------- 0100 (first command, SEARCH protocols) --------------
+        r0100 = yield Send(b"0100")
+        if has_message(r0100, "UNABLE TO CONNECT"):
+            logger.error("Failed to query protocol 0100: unable to connect")
+            raise Return(False)
+
+        # ------------------- ATDPN (list protocol number) -------------------
+        r = yield Send(b"ATDPN")
+        if len(r) != 1:
+            logger.error("Failed to retrieve current protocol")
+            raise Return(False)
+
+        p = r[0]  # grab the first (and only) line returned
+        # suppress any "automatic" prefix
+        p = p[1:] if (len(p) > 1 and p.startswith("A")) else p
+
+        # check if the protocol is something we know
+        if p in SUPPORTED_PROTOCOLS:
+            # jackpot, instantiate the corresponding protocol handler
+            self.protocol = SUPPORTED_PROTOCOLS[p](r0100)
+            raise Return(True)
+
+        # an unknown protocol
+        # this is likely because not all adapter/car combinations work
+        # in "auto" mode. Some respond to ATDPN responded with "0"
+        logger.debug("ELM responded with unknown protocol. Trying them one-by-one")
+        for p in TRY_PROTOCOL_ORDER:
+            if (yield self.manual_protocol(p)):
+                raise Return(True)
+
+        # if we've come this far, then we have failed...
+        logger.error("Failed to determine protocol")
+        raise Return(False)
+
+
+def test_cmd(cmd, supported_commands, protocol_id, warn=True):
+    """
+        Returns a boolean for whether a command will
+        be sent without using force=True.
+    """
+    # test if the command is supported
+    if cmd not in supported_commands:
+        if warn:
+            logger.warning("'%s' is not supported" % str(cmd))
+        return False
+
+    # mode 06 is only implemented for the CAN protocols
+    if cmd.mode == 6 and protocol_id not in CAN_PROTOCOLS:
+        if warn:
+            logger.warning("Mode 06 commands are only supported over CAN protocols")
+        return False
+
+    return True
+
+
+def load_commands(supported_commands, test):
+    """
+        Queries for available PIDs: yields the PID listing commands, gets
+        their OBDResponses back, and adds the commands they list to the
+        supported_commands set. test is the connection's test_cmd().
+    """
+
+    logger.info("querying for supported commands")
+    for get in commands.pid_getters():
+        # PID listing commands should sequentially become supported
+        # Mode 1 PID 0 is assumed to always be supported
+        if not test(get, warn=False):
+            continue
+
+        response = yield get
+
+        if response.is_null():
+            logger.info("No valid data for PID listing command: %s" % get)
+            continue
+
+        # loop through PIDs bit-array
+        for i, bit in enumerate(response.value):
+            if bit:
+
+                mode = get.mode
+                pid = get.pid + i + 1
+
+                if commands.has_pid(mode, pid):
+                    supported_commands.add(commands[mode][pid])
+
+                # set support for mode 2 commands
+                if mode == 1 and commands.has_pid(2, pid):
+                    supported_commands.add(commands[2][pid])
+
+    logger.info("finished querying with %d commands supported" % len(supported_commands))
+
+
+class QueryState(object):
+    """
+        What a connection remembers from one query to the next, to send
+        the following ones faster: the last command and header sent, and
+        the number of frames each command was answered with.
+    """
+
+    def __init__(self):
+        self.last_command = b""  # used for running the previous command with a CR
+        self.last_header = ECU_HEADER.ENGINE  # for comparing with the previously used header
+        self.frame_counts = {}  # keeps track of the number of return frames for each command
+        self.packed_frame_counts = {}  # same, for multi-PID requests, keyed by (header, command string)
+
+    def header_command(self, header):
+        """ returns the command switching to the given header, or None if it's in use already """
+        if header == self.last_header:
+            return None
+        return b'AT SH ' + header + b' '
+
+    def header_sent(self, header, messages):
+        """ takes note of the answer to header_command() """
+        if not messages:
+            logger.info("Set Header ('AT SH %s') did not return data", header)
+            return
+        if "\n".join([m.raw() for m in messages]) != "OK":
+            logger.info("Set Header ('AT SH %s') did not return 'OK'", header)
+            return
+        self.last_header = header
+
+    def command_string(self, cmd, fast=True):
+        """ assembles the appropriate command string """
+        cmd_string = cmd.command
+
+        # if we know the number of frames that this command returns,
+        # only wait for exactly that number (a single hex digit). This
+        # avoids some harsh timeouts from the ELM, thus speeding up queries.
+        count = self.frame_counts.get(cmd, 0)
+        if fast and cmd.fast and 0 < count < 16:
+            cmd_string += ("%X" % count).encode()
+
+        # if we sent this last time, just send a CR
+        # (CR is added by the ELM327 class)
+        if fast and (cmd_string == self.last_command):
+            cmd_string = b""
+
+        return cmd_string
+
+    def command_sent(self, cmd, cmd_string, messages):
+        """ takes note of a command_string() sent, and of its answer """
+
+        # if we're sending a new command, note it
+        # first check that the current command WASN'T sent as an empty CR
+        if cmd_string:
+            self.last_command = cmd_string
+
+        # if we don't already know how many frames this command returns,
+        # log it, so we can specify it next time
+        if cmd not in self.frame_counts:
+            self.frame_counts[cmd] = sum([len(m.frames) for m in messages or []])
@@ -30,11 +30,14 @@
 #                                                                      #
 ########################################################################
 
+import binascii
 import errno
 import glob
 import logging
 import string
 import sys
+from multiprocessing.pool import ThreadPool
+from itertools import chain
 
 import serial
 
@@ -50,65 +53,104 @@ class OBDStatus:
     CAR_CONNECTED = "Car Connected"
 
 
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count
+else:  # python < 3.10
+    def _popcount(v):
+        return bin(v).count("1")
+
+if hasattr(int, "from_bytes"):
+    def _from_bytes(bs):
+        return int.from_bytes(bs, "big")
+
+    def _to_bytes(v, n):
+        return v.to_bytes(n, "big")
+else:  # python 2
+    def _from_bytes(bs):
+        return int(binascii.hexlify(bytearray(bs)) or b"0", 16)
+
+    def _to_bytes(v, n):
+        if not n:
+            return bytearray()
+        return bytearray(binascii.unhexlify("%0*x" % (2 * n, v)))
+
+# the bits of every byte value, MSB first
+_BYTE_BITS = tuple(tuple((b >> i) & 1 == 1 for i in range(7, -1, -1)) for b in range(256))
+
+
 class BitArray:
     """
-    Class for representing bitarrays (inefficiently)
+    Class for representing bitarrays
 
-    There's a nice C-optimized lib for this: https://github.com/ilanschnell/bitarray
-    but python-OBD doesn't use it enough to be worth adding the dependency.
-    But, if this class starts getting used too much, we should switch to that lib.
+    Bit 0 is the MSB of the first byte. The bits are kept in a single
+    integer: reading a bit or a field is a shift and a mask, counting the
+    set bits is a native popcount, and slices or iteration are built from
+    a table of the bits of each byte value.
     """
 
+    __slots__ = ("_int", "_len")
+
     def __init__(self, _bytearray):
-        self.bits = ""
-        for b in _bytearray:
-            v = bin(b)[2:]
-            self.bits += ("0" * (8 - len(v))) + v  # pad it with zeros
+        self._int = _from_bytes(_bytearray)
+        self._len = len(_bytearray) * 8
 
     def __getitem__(self, key):
         if isinstance(key, int):
-            if key >= 0 and key < len(self.bits):
-                return self.bits[key] == "1"
+            if key >= 0 and key < self._len:
+                return (self._int >> (self._len - 1 - key)) & 1 == 1
             else:
                 return False
         elif isinstance(key, slice):
-            bits = self.bits[key]
-            if bits:
-                return [b == "1" for b in bits]
-            else:
+            start, stop, step = key.indices(self._len)
+            if step != 1:
+                return self[:][key]
+            n = stop - start
+            if n <= 0:
                 return []
+            if n <= 8:  # a field of a byte or less, ie: a bank of sensors
+                v = (self._int >> (self._len - stop)) & ((1 << n) - 1)
+                return list(_BYTE_BITS[v][8 - n:])
+            bits = []
+            for b in self.__bytes():
+                bits += _BYTE_BITS[b]
+            return bits[start:stop]
+
+    def __bytes(self):
+        return _to_bytes(self._int, self._len >> 3)
 
     def num_set(self):
-        return self.bits.count("1")
+        return _popcount(self._int)
 
     def num_cleared(self):
-        return self.bits.count("0")
+        return self._len - _popcount(self._int)
 
     def value(self, start, stop):
-        bits = self.bits[start:stop]
-        if bits:
-            return int(bits, 2)
-        else:
+        if start is None or stop is None or not 0 <= start <= stop <= self._len:
+            start, stop, _ = slice(start, stop).indices(self._len)
+        if stop <= start:
             return 0
+        return (self._int >> (self._len - stop)) & ((1 << (stop - start)) - 1)
+
+    @property
+    def bits(self):
+        """ the bits as a string of '0's and '1's """
+        return str(self)
 
     def __len__(self):
-        return len(self.bits)
+        return self._len
 
     def __str__(self):
-        return self.bits
+        if not self._len:
+            return ""
+        return format(self._int, "0%db" % self._len)
 
     def __iter__(self):
-        return [b == "1" for b in self.bits].__iter__()
+        return chain.from_iterable([_BYTE_BITS[b] for b in self.__bytes()])
 
 
 def bytes_to_int(bs):
     """ converts a big-endian byte array into a single integer """
-    v = 0
-    p = 0
-    for b in reversed(bs):
-        v += b * (2 ** p)
-        p += 8
-    return v
+    return _from_bytes(bs)
 
 
 def bytes_to_hex(bs):
@@ -126,8 +168,15 @@ def twos_comp(val, num_bits):
     return val
 
 
+_HEX_DIGITS = string.hexdigits.encode()
+
+
 def isHex(_hex):
-    return all([c in string.hexdigits for c in _hex])
+    """ whether a string (or bytes) holds nothing but hex digits """
+    if isinstance(_hex, (bytes, bytearray)):
+        return not _hex.translate(None, _HEX_DIGITS)
+    # stripping stops at the first non-hex character, from either end
+    return not _hex.strip(string.hexdigits)
 
 
 def contiguous(l, start, end):
@@ -147,6 +196,9 @@ def contiguous(l, start, end):
     return True
 
 
+SCAN_WORKERS = 16  # ports probed concurrently by scan_serial()
+
+
 def try_port(portStr):
     """returns boolean for port availability"""
     try:
@@ -185,8 +237,17 @@ def scan_serial():
 
     # possible_ports += glob.glob('/dev/pts/[0-9]*') # for obdsim
 
-    for port in possible_ports:
-        if try_port(port):
-            available.append(port)
+    if not possible_ports:
+        return available
+
+    # opening a port can block for seconds (rfcomm ports connect to their
+    # dongle on open), so probe them all at once, keeping their order
+    pool = ThreadPool(min(len(possible_ports), SCAN_WORKERS))
+    try:
+        for port, ok in zip(possible_ports, pool.map(try_port, possible_ports)):
+            if ok:
+                available.append(port)
+    finally:
+        pool.close()
 
     return available
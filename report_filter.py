@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        report_filter.py
+# Purpose:     Report by exception: deadbands and heartbeat on the values sent
+#
+# Created:     18/10/2026
+# Copyright:   (c) Laurent Carre - Sterwen Technology / Solid Run 2019
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+'''
+The deadbands come in the Read rules, for instance:
+
+    {"deadbands": {"RPM": 100, "COOLANT_TEMP": "2%"},
+     "deadband": 0,
+     "heartbeat": 300}
+
+A value is sent when it moved away from the last one sent by more than its
+deadband: an absolute amount in the unit the command reports, or a percentage
+of the last value sent. "deadband" applies to the commands not listed. Values
+that are not numbers are sent when they change.
+Whatever the deadband, a value is sent again after "heartbeat" seconds of
+silence (default 300, 0 for never), so that a flat value can be told from
+a lost one.
+'''
+
+DEFAULT_HEARTBEAT=300.
+
+
+class Deadband():
+
+    def __init__(self,spec):
+        # a number, or a string ending with %; None (null) is no deadband
+        if spec == None :
+            spec=0
+        try:
+            if isinstance(spec,str) and spec.strip().endswith('%'):
+                self._relative=True
+                self._band=float(spec.strip()[:-1])/100.
+            else:
+                self._relative=False
+                self._band=float(spec)
+        except (TypeError,ValueError):
+            raise ValueError("Invalid deadband: "+str(spec))
+        if self._band < 0:
+            raise ValueError("Invalid deadband: "+str(spec))
+
+    def moved(self,value,last):
+        band=self._band
+        if self._relative:
+            band *= abs(last)
+        return abs(value-last) > band
+
+
+class ReportFilter():
+    '''
+    Decides which values go into the next OBD_Result
+    '''
+
+    def __init__(self,deadbands=None,default=0,heartbeat=DEFAULT_HEARTBEAT):
+        self._deadbands={}
+        for cmd,spec in (deadbands or {}).items():
+            self._deadbands[cmd]=Deadband(spec)
+        self._default=Deadband(default)
+        try:
+            self._heartbeat=float(heartbeat)
+        except (TypeError,ValueError):
+            raise ValueError("Invalid heartbeat: "+str(heartbeat))
+        self._sent={}   # {command name: (value, time sent)}
+
+    @staticmethod
+    def fromRules(rules):
+        # None when the rules don't ask for report by exception
+        if rules == None or (rules.get('deadbands') == None and rules.get('deadband') == None) :
+            return None
+        heartbeat=rules.get('heartbeat')
+        if heartbeat == None :
+            heartbeat=DEFAULT_HEARTBEAT
+        return ReportFilter(rules.get('deadbands'),rules.get('deadband'),heartbeat)
+
+    def report(self,cmd_value,now):
+        '''
+        tells if the value (a CMD_Value) is to be sent, and if so, takes it as sent
+        '''
+        name=cmd_value._cmd
+        value=cmd_value._magnitude
+        sent=self._sent.get(name)
+        if sent != None :
+            last,t=sent
+            if self._heartbeat <= 0. or now-t < self._heartbeat :
+                if cmd_value._genericType == 0 :
+                    if not self._deadbands.get(name,self._default).moved(value,last) :
+                        return False
+                elif value == last :
+                    return False
+        self._sent[name]=(value,now)
+        return True
+
+    def reset(self):
+        # everything is sent on the next cycle, as after a reconnection or an engine restart
+        self._sent={}
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        sampling_rules.py
+# Purpose:     Event-triggered sampling rates for the OBD supervisor
+#
+# Created:     18/10/2026
+# Copyright:   (c) Laurent Carre - Sterwen Technology / Solid Run 2019
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+'''
+Triggers come in the "triggers" list of the Read rules, for instance:
+
+    {"on_period": 10,
+     "triggers": [
+        {"when": "RPM > 4000", "period": 1, "commands": ["RPM", "ENGINE_LOAD"]},
+        {"when": ["rate(COOLANT_TEMP) > 0.5", "SPEED > 20"], "period": 2,
+         "commands": ["COOLANT_TEMP"], "hold": 30, "decay": 2}
+     ]}
+
+"when" is a condition, or a list of conditions that must all hold:
+    <command> <op> <number>          the last value read
+    rate(<command>) <op> <number>    its change per second between two reads
+with op one of < <= > >= == !=, values being in the unit the command reports.
+
+While its condition holds, a trigger reads its commands (all of them when
+"commands" is left out) every "period" seconds. Once it stops holding, the
+fast rate stays for "hold" seconds (default 0), then the period is multiplied
+by "decay" (default 2) on each cycle, back to on_period.
+
+The rules are compiled once, when the read starts: each condition becomes
+a function of the values read, evaluated after every cycle.
+'''
+import operator
+import re
+import logging
+
+loc_log=logging.getLogger("VehicleService")
+
+_OPERATORS={
+    '<':operator.lt,
+    '<=':operator.le,
+    '>':operator.gt,
+    '>=':operator.ge,
+    '==':operator.eq,
+    '!=':operator.ne,
+    }
+
+_CONDITION=re.compile(r'^\s*(?:(rate)\(\s*(\w+)\s*\)|(\w+))\s*(<=|>=|==|!=|<|>)\s*([-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)\s*$')
+
+
+def compileCondition(text):
+    '''
+    returns a function of ({command name: value}, now) telling if text holds
+    raises ValueError if text is not a condition
+    '''
+    m=_CONDITION.match(text)
+    if m is None:
+        raise ValueError("Invalid trigger condition: "+text)
+    rate,rate_cmd,cmd,op,threshold=m.groups()
+    compare=_OPERATORS[op]
+    threshold=float(threshold)
+
+    if rate is None:
+        def condition(values,now):
+            v=values.get(cmd)
+            return v is not None and compare(v[0],threshold)
+        condition.command=cmd
+        return condition
+
+    # the rate is taken between the last two distinct reads
+    last=[None,None]        # value, time
+    current=[0.]
+    def rate_condition(values,now):
+        v=values.get(rate_cmd)
+        if v is None:
+            return False
+        value,t=v
+        if last[1] is not None and t > last[1]:
+            current[0]=(value-last[0])/(t-last[1])
+        if last[1] is None or t > last[1]:
+            last[0],last[1]=value,t
+        return compare(current[0],threshold)
+    rate_condition.command=rate_cmd
+    return rate_condition
+
+
+class Trigger():
+
+    def __init__(self,rule,base_period):
+        when=rule.get('when')
+        if when is None:
+            raise ValueError("Trigger without condition")
+        if isinstance(when,str):
+            when=[when]
+        self._conditions=[compileCondition(c) for c in when]
+        self.commands=rule.get('commands')     # None for all
+        try:
+            self._period=float(rule.get('period',1.))
+            self._hold=float(rule.get('hold',0.))
+            self._decay=float(rule.get('decay',2.))
+        except (TypeError,ValueError):
+            raise ValueError("Invalid trigger parameters: "+str(rule))
+        if self._period <= 0. or self._decay <= 1.:
+            raise ValueError("Trigger period must be positive and decay above 1: "+str(rule))
+        self._base=base_period
+        self._name=" and ".join(when)
+        self._last_true=None
+        self.period=None        # the actual period, None when inactive
+
+    def evaluate(self,values,now):
+        # every condition is evaluated, to keep the rates up to date
+        holds=all([c(values,now) for c in self._conditions])
+        if holds:
+            if self.period is None:
+                loc_log.info("Sampling trigger on: "+self._name)
+            self._last_true=now
+            self.period=self._period
+        elif self.period is not None and now-self._last_true >= self._hold:
+            self.period *= self._decay
+            if self.period >= self._base:
+                loc_log.info("Sampling trigger off: "+self._name)
+                self.period=None
+        return self.period
+
+
+class SamplingRules():
+    '''
+    The triggers of a Read, with the period and the minimum interval of each
+    command they call for
+    '''
+
+    def __init__(self,triggers,base_period,min_intervals=None):
+        self._base=base_period
+        self._min_intervals=dict(min_intervals or {})
+        self._triggers=[Trigger(t,base_period) for t in triggers or []]
+
+    def __len__(self):
+        return len(self._triggers)
+
+    @property
+    def min_intervals(self):
+        # when no trigger is active
+        return self._min_intervals
+
+    def evaluate(self,cmd_values,now):
+        '''
+        cmd_values: what VehicleService.get_values() returns
+        returns the period of the next cycle, the minimum intervals of the
+        commands and the interval of those not listed, as expected by
+        VehicleService.setCyclePlan()
+        '''
+        values={}
+        for c in cmd_values:
+            if c._genericType == 0:
+                values[c._cmd]=(c._magnitude,getattr(c,'_time',now))
+        active=[t for t in self._triggers if t.evaluate(values,now) is not None]
+        if len(active) == 0:
+            return self._base,self._min_intervals,0.
+
+        period=min([t.period for t in active])
+        fast={}
+        all_fast=False
+        for t in active:
+            if t.commands is None:
+                all_fast=True
+                continue
+            for cmd in t.commands:
+                fast[cmd]=min(t.period,fast.get(cmd,t.period))
+        # half a cycle is left for the jitter of the reads
+        if all_fast:
+            # everything is sped up, up to the specific rates
+            default=0.
+        else:
+            # the other commands keep to the base period: as the cycles
+            # run faster, they are read on some of them only
+            default=self._base-period/2.
+        intervals={}
+        for cmd,i in self._min_intervals.items():
+            intervals[cmd]=max(i,default)
+        for cmd,p in fast.items():
+            intervals[cmd]=max(p-period/2.,0.)
+        return period,intervals,default
@@ -13,6 +13,7 @@ import json
 import obd
 
 from vehicle_service import *
+from telemetry_log import TelemetryReader
 
 
 class VehicleSimulator():
@@ -27,16 +28,24 @@ class VehicleSimulator():
 
     def connect(self,MAC):
 
-        try:
-            self.fd=open(self._file,"r")
-        except IOError as err:
-            self._logger.error(str(err))
-            raise
+        if TelemetryReader.isLog(self._file):
+            # a telemetry log, replayed cycle by cycle
+            self._records=TelemetryReader(self._file).records()
+        else:
+            self._records=None
+            try:
+                self.fd=open(self._file,"r")
+            except IOError as err:
+                self._logger.error(str(err))
+                raise
         self._connected=True
         self.engine_on=True
 
     def read_data(self):
         self._logger.debug("OBD Simulator - read data")
+        if self._records is not None:
+            self.read_record()
+            return
         try:
             buf=self.fd.readline()
         except IOError as err:
@@ -57,6 +66,20 @@ class VehicleSimulator():
             if len(cmd_val) != 3 : continue
             self.values[cmd_val[0]] = SIM_Values(cmd_val)
 
+    def read_record(self):
+        try:
+            t,engine_on,values=next(self._records)
+        except (StopIteration,IOError,ValueError) as err:
+            if not isinstance(err,StopIteration):
+                self._logger.error(str(err))
+            self._connected=False
+            self._engine_on=False
+            return
+        self.values={}
+        for name,(value,unit) in values.items():
+            if not isinstance(value,float): continue
+            self.values[name] = SIM_Values((name,value,unit))
+
     def status(self):
         return (self._connected,self._engine_on)
 
@@ -93,6 +116,10 @@ class VehicleSimulator():
         if self._reqcmd == None : return 0
         return len(self._reqcmd)
 
+    def setCyclePlan(self,budget=None,min_intervals=None,default_interval=0.):
+        # the recorded cycles are replayed as they come
+        return
+
 class SIM_Values():
 
     def __init__(self,cmd_val):
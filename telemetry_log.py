@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        telemetry_log.py
+# Purpose:     Append-only columnar log of the values read, and its reader
+#
+# Created:     18/10/2026
+# Copyright:   (c) Laurent Carre - Sterwen Technology / Solid Run 2019
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+'''
+The values are kept in memory, one column of (timestamp, value) per command,
+and written out a block at a time: when enough cycles are held, or after
+block_interval seconds. The file is fsync'ed every fsync_interval seconds
+only, so that the flash sees a few large writes rather than one per cycle.
+A new file is started once the current one reaches max_bytes or gets older
+than max_age, and only the last keep files are kept.
+
+File layout, little endian:
+
+    file    := MAGIC block*
+    block   := "TB" raw_length:u32 compressed_length:u32 crc32:u32 zlib(payload)
+    payload := strings cycles columns
+    strings := count:u32 (length:u16 utf8)*     names and units first seen in
+                                                the block, numbered on from
+                                                those of the earlier blocks
+    cycles  := count:u32 time:f64[count] engine_on:u8[count]
+    columns := count:u16 column*
+    column  := name:u32 unit:u32 kind:u8 count:u32 time:f64[count] value*
+               value is f64 for the numbers (kind 0), a string number:u32
+               otherwise (kind 1); unit is NO_STRING when there is none
+
+A value goes in its column once per read (the time of its response), not
+on every cycle it is held for. A block cut short by a crash is dropped by
+the reader, with all the blocks before it intact.
+'''
+import array
+import os
+import struct
+import sys
+import time
+import zlib
+import logging
+
+loc_log=logging.getLogger("VehicleService")
+
+MAGIC=b"OBDTLOG\x01"
+BLOCK_TAG=b"TB"
+NO_STRING=0xFFFFFFFF
+KIND_NUMBER=0
+KIND_STRING=1
+
+_BLOCK_HEADER=struct.Struct("<2sIII")
+_COLUMN_HEADER=struct.Struct("<IIBI")
+
+
+def _pack_array(typecode,values):
+    a=array.array(typecode,values)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a.tobytes()
+
+
+def _unpack_array(typecode,buf,offset,count):
+    a=array.array(typecode)
+    end=offset+count*a.itemsize
+    a.frombytes(buf[offset:end])
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a,end
+
+
+class _Column():
+
+    def __init__(self,kind):
+        self.kind=kind
+        self.times=[]
+        self.values=[]
+
+
+class TelemetryLog():
+    '''
+    Writes the values of the acquisition cycles to rotating files in directory
+    '''
+
+    def __init__(self,directory,prefix="obd_result",block_rows=512,block_interval=60.,
+                 fsync_interval=300.,max_bytes=4*1024*1024,max_age=86400.,keep=30):
+        self._directory=directory
+        self._prefix=prefix
+        self._block_rows=block_rows
+        self._block_interval=block_interval
+        self._fsync_interval=fsync_interval
+        self._max_bytes=max_bytes
+        self._max_age=max_age
+        self._keep=keep
+        self._fd=None
+        self._path=None
+        self._last={}           # {name: time of the last value logged}
+        self._clear()
+
+    def _clear(self):
+        self._cycles=[]         # (time, engine_on)
+        self._columns={}        # {(name, unit): _Column}
+        self._block_start=None
+
+    @property
+    def path(self):
+        # the file being written
+        return self._path
+
+    def append(self,cmd_values,engine_on,now=None):
+        '''
+        logs a cycle: cmd_values are the CMD_Value held by the VehicleService
+        '''
+        if now is None:
+            now=time.time()
+        if self._block_start is None:
+            # a block goes whole into one file
+            if self._fd is None or self._rotate_due(now):
+                self._open(now)
+            self._block_start=now
+        self._cycles.append((now,engine_on))
+        for c in cmd_values:
+            t=getattr(c,'_time',now)
+            name=c._cmd
+            # a value held from an earlier cycle is already in
+            if name in self._last and t <= self._last[name]:
+                continue
+            self._last[name]=t
+            if c._genericType == 0:
+                key=(name,c._unit)
+                kind=KIND_NUMBER
+                value=float(c._magnitude)
+            else:
+                key=(name,None)
+                kind=KIND_STRING
+                value=str(c._magnitude)
+            column=self._columns.get(key)
+            if column is None:
+                column=_Column(kind)
+                self._columns[key]=column
+            column.times.append(t)
+            column.values.append(value)
+        if len(self._cycles) >= self._block_rows or now-self._block_start >= self._block_interval:
+            self.flush(now)
+
+    def flush(self,now=None):
+        '''
+        writes the cycles held as a block
+        '''
+        if len(self._cycles) == 0:
+            return
+        if now is None:
+            now=time.time()
+        payload=self._payload()
+        data=zlib.compress(payload)
+        self._fd.write(_BLOCK_HEADER.pack(BLOCK_TAG,len(payload),len(data),zlib.crc32(payload) & 0xFFFFFFFF))
+        self._fd.write(data)
+        self._fd.flush()
+        self._size += _BLOCK_HEADER.size+len(data)
+        if now-self._synced >= self._fsync_interval:
+            self.sync(now)
+        self._clear()
+
+    def sync(self,now=None):
+        if self._fd is None:
+            return
+        self._fd.flush()
+        os.fsync(self._fd.fileno())
+        self._synced=time.time() if now is None else now
+
+    def close(self):
+        self.flush()
+        if self._fd is not None:
+            self.sync()
+            self._fd.close()
+            self._fd=None
+
+    def _payload(self):
+        out=[]
+        # the strings first seen in this block
+        new=[]
+        def string_id(s):
+            if s is None:
+                return NO_STRING
+            n=self._strings.get(s)
+            if n is None:
+                n=len(self._strings)
+                self._strings[s]=n
+                new.append(s)
+            return n
+
+        columns=[]
+        for (name,unit),column in self._columns.items():
+            head=_COLUMN_HEADER.pack(string_id(name),string_id(unit),column.kind,len(column.times))
+            if column.kind == KIND_NUMBER:
+                values=_pack_array('d',column.values)
+            else:
+                values=_pack_array('I',[string_id(v) for v in column.values])
+            columns.append(head+_pack_array('d',column.times)+values)
+
+        out.append(struct.pack("<I",len(new)))
+        for s in new:
+            b=s.encode('utf-8')
+            out.append(struct.pack("<H",len(b)))
+            out.append(b)
+        out.append(struct.pack("<I",len(self._cycles)))
+        out.append(_pack_array('d',[t for t,_ in self._cycles]))
+        out.append(bytes([1 if e else 0 for _,e in self._cycles]))
+        out.append(struct.pack("<H",len(columns)))
+        out.extend(columns)
+        return b"".join(out)
+
+    def _rotate_due(self,now):
+        return self._size >= self._max_bytes or now-self._opened >= self._max_age
+
+    def _open(self,now):
+        if self._fd is not None:
+            self.sync(now)
+            self._fd.close()
+        os.makedirs(self._directory,exist_ok=True)
+        # the names sort in time order, milliseconds included: a file may be
+        # rotated within the second it was opened in
+        t=now
+        while True:
+            name="%s-%s-%03d.tlog" % (self._prefix,time.strftime("%Y%m%d-%H%M%S",time.localtime(t)),int(t*1000)%1000)
+            path=os.path.join(self._directory,name)
+            if not os.path.exists(path):
+                break
+            t += 0.001
+        self._fd=open(path,"wb")
+        self._fd.write(MAGIC)
+        self._path=path
+        self._size=len(MAGIC)
+        self._opened=now
+        self._synced=now
+        self._strings={}        # {string: number}, per file
+        # a file stands alone: held values are logged again in the next one
+        self._last={}
+        self._prune()
+
+    def _prune(self):
+        files=TelemetryReader.files(self._directory,self._prefix)
+        for path in files[:max(len(files)-self._keep,0)]:
+            try:
+                os.remove(path)
+            except OSError as err:
+                loc_log.error("Telemetry log cannot remove "+path+":"+str(err))
+
+
+class Column():
+    ''' a command's values, as read back '''
+
+    def __init__(self,name,unit,kind):
+        self.name=name
+        self.unit=unit
+        self.kind=kind
+        self.times=array.array('d')
+        self.values=array.array('d') if kind == KIND_NUMBER else []
+
+
+class TelemetryReader():
+    '''
+    Reads back a file written by TelemetryLog
+    '''
+
+    def __init__(self,path):
+        self._path=path
+
+    @staticmethod
+    def files(directory,prefix="obd_result"):
+        # the logs of a directory, oldest first
+        try:
+            names=os.listdir(directory)
+        except OSError:
+            return []
+        names=[n for n in names if n.startswith(prefix+"-") and n.endswith(".tlog")]
+        return [os.path.join(directory,n) for n in sorted(names)]
+
+    @staticmethod
+    def isLog(path):
+        try:
+            with open(path,"rb") as fd:
+                return fd.read(len(MAGIC)) == MAGIC
+        except IOError:
+            return False
+
+    def blocks(self):
+        '''
+        yields ([(time, engine_on)], {(name, unit): Column}) for each block
+        '''
+        strings=[]
+        with open(self._path,"rb") as fd:
+            if fd.read(len(MAGIC)) != MAGIC:
+                raise ValueError(self._path+" is not a telemetry log")
+            while True:
+                head=fd.read(_BLOCK_HEADER.size)
+                if len(head) == 0:
+                    return
+                if len(head) < _BLOCK_HEADER.size:
+                    loc_log.error("Telemetry log "+self._path+" ends with a partial block")
+                    return
+                tag,raw_length,length,crc=_BLOCK_HEADER.unpack(head)
+                data=fd.read(length)
+                try:
+                    if tag != BLOCK_TAG or len(data) < length:
+                        raise ValueError("partial block")
+                    payload=zlib.decompress(data)
+                    if len(payload) != raw_length or zlib.crc32(payload) & 0xFFFFFFFF != crc:
+                        raise ValueError("corrupted block")
+                except (ValueError,zlib.error) as err:
+                    loc_log.error("Telemetry log "+self._path+" stops on a bad block: "+str(err))
+                    return
+                yield self._decode(payload,strings)
+
+    def _decode(self,buf,strings):
+        offset=0
+        count,=struct.unpack_from("<I",buf,offset)
+        offset += 4
+        for i in range(count):
+            length,=struct.unpack_from("<H",buf,offset)
+            offset += 2
+            strings.append(buf[offset:offset+length].decode('utf-8'))
+            offset += length
+        count,=struct.unpack_from("<I",buf,offset)
+        offset += 4
+        times,offset=_unpack_array('d',buf,offset,count)
+        cycles=list(zip(times,[b != 0 for b in buf[offset:offset+count]]))
+        offset += count
+        columns={}
+        ncol,=struct.unpack_from("<H",buf,offset)
+        offset += 2
+        for i in range(ncol):
+            name,unit,kind,count=_COLUMN_HEADER.unpack_from(buf,offset)
+            offset += _COLUMN_HEADER.size
+            column=Column(strings[name],None if unit == NO_STRING else strings[unit],kind)
+            column.times,offset=_unpack_array('d',buf,offset,count)
+            if kind == KIND_NUMBER:
+                column.values,offset=_unpack_array('d',buf,offset,count)
+            else:
+                ids,offset=_unpack_array('I',buf,offset,count)
+                column.values=[strings[n] for n in ids]
+            columns[(column.name,column.unit)]=column
+        return cycles,columns
+
+    def columns(self,names=None):
+        '''
+        returns {name: Column} over the whole file, for the given command names or all
+        '''
+        out={}
+        for cycles,columns in self.blocks():
+            for (name,unit),column in columns.items():
+                if names is not None and name not in names:
+                    continue
+                c=out.get(name)
+                if c is None:
+                    out[name]=column
+                    continue
+                c.times.extend(column.times)
+                c.values.extend(column.values)
+        return out
+
+    def records(self):
+        '''
+        yields (time, engine_on, {name: (value, unit)}) for each cycle, with
+        the values held at that time, as VehicleService.values had them
+        '''
+        held={}
+        for cycles,columns in self.blocks():
+            # the values of the block, in time order
+            entries=[]
+            for column in columns.values():
+                for t,v in zip(column.times,column.values):
+                    entries.append((t,column.name,v,column.unit))
+            entries.sort(key=lambda e: e[0])
+            i=0
+            for t,engine_on in cycles:
+                while i < len(entries) and entries[i][0] <= t:
+                    held[entries[i][1]]=(entries[i][2],entries[i][3])
+                    i += 1
+                yield t,engine_on,dict(held)
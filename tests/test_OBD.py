@@ -2,11 +2,13 @@
     Tests for the API layer
 """
 
+import time
+
 import obd
 from obd import ECU
 from obd.OBDCommand import OBDCommand
 from obd.decoders import noop
-from obd.protocols.protocol import Message
+from obd.protocols.protocol import Frame, Message
 from obd.utils import OBDStatus
 
 
@@ -178,3 +180,249 @@ def test_fast():
     assert command.fast
     o.query(command, force=True)  # force since this command isn't in the tables
     # assert o.interface._test_last_command(command.command)
+
+
+"""
+    The following tests are for the query_many() function
+"""
+
+
+class FakeCANELM(FakeELM):
+    """
+        Fake ELM327 that answers each PID of a (possibly packed) mode 01/02
+        request from a table, and runs the replies through the real CAN parser
+    """
+
+    # PID : data bytes
+    VALUES = {
+        0x05: [0x7B],  # COOLANT_TEMP
+        0x0C: [0x1A, 0xF8],  # RPM
+        0x0D: [0x32],  # SPEED
+        0x0F: [0x46],  # INTAKE_TEMP
+        0x11: [0x40],  # THROTTLE_POS
+        0x2F: [0x80],  # FUEL_LEVEL
+        0x46: [0x50],  # AMBIANT_AIR_TEMP
+    }
+
+    def __init__(self, port_name, protocol_id="6", packing=True):
+        FakeELM.__init__(self, port_name)
+        self._protocol_id = protocol_id
+        self._packing = packing
+        self._protocol = obd.protocols.ISO_15765_4_11bit_500k(["7E8 06 41 00 BE 3F A8 13"])
+        self.sent = []
+        self._last = b""
+
+    def protocol_id(self):
+        return self._protocol_id
+
+    def send_and_parse(self, cmd):
+        self.sent.append(cmd)
+        if cmd.startswith(b"AT"):
+            return [Message([Frame("OK")])]
+
+        cmd = cmd or self._last  # a bare CR repeats the previous command
+        self._last = cmd
+        if len(cmd) % 2:
+            cmd = cmd[:-1]  # drop the response count digit
+
+        cmd = bytearray.fromhex(cmd.decode())
+        mode, pids = cmd[0], cmd[1:]
+        if mode == 2:
+            pids = pids[::2]  # drop the frame numbers
+        if len(pids) > 1 and not self._packing:
+            return self._protocol(["NO DATA"])
+
+        data = [0x40 + mode]
+        for pid in pids:
+            data += [pid] + ([0x00] if mode == 2 else []) + self.VALUES[pid]
+
+        return self._protocol(self._lines(data))
+
+    def monitor(self, max_pending, can_filter):
+        self.sent.append(b"ATMA")
+        return iter([])
+
+    @staticmethod
+    def _lines(data):
+        """ ISO-TP framing of the response data, as the ELM would print it """
+        if len(data) <= 7:
+            frames = [[len(data)] + data]
+        else:
+            frames = [[0x10, len(data)] + data[:6]]
+            for n, i in enumerate(range(6, len(data), 7)):
+                frames.append([0x21 + n] + data[i:i + 7])
+        return ["7E8 " + " ".join(["%02X" % b for b in f]) for f in frames]
+
+
+def connect_fake_can(*args, **kwargs):
+    o = obd.OBD("/dev/null")
+    o.interface = FakeCANELM("/dev/null", *args, **kwargs)
+    o.supported_commands |= set([obd.commands[m][pid] for m in [1, 2] for pid in FakeCANELM.VALUES])
+    return o
+
+
+def test_query_many_packs():
+    o = connect_fake_can()
+    cmds = [obd.commands.RPM, obd.commands.SPEED, obd.commands.COOLANT_TEMP]
+    r = o.query_many(cmds)
+
+    assert o.interface.sent == [b"010C0D05"]
+    assert [x.command for x in r] == cmds
+    assert r[0].value == 1726 * obd.Unit.rpm
+    assert r[1].value == 50 * obd.Unit.kph
+    assert r[2].value == obd.Unit.Quantity(83, obd.Unit.celsius)
+
+    # frame counts are learned, and repeats are sent as a bare CR
+    o.query_many(cmds)
+    o.query_many(cmds)
+    assert o.interface.sent[1:] == [b"010C0D052", b""]
+
+
+def test_monitor_forgets_last_command():
+    o = connect_fake_can()
+    o.query(obd.commands.RPM)
+    o.query(obd.commands.RPM)
+    assert o.interface.sent[-1] == b"010C1"
+
+    list(o.monitor())
+    # a bare CR would now repeat the monitor command
+    o.query(obd.commands.RPM)
+    assert o.interface.sent[-2:] == [b"ATMA", b"010C1"]
+
+
+def test_query_many_chunks():
+    o = connect_fake_can()
+    cmds = [obd.commands[1][pid] for pid in sorted(FakeCANELM.VALUES)]
+    r = o.query_many(cmds)
+
+    assert o.interface.sent == [b"01050C0D0F112F", b"0146"]
+    assert all([not x.is_null() for x in r])
+    assert r[-1].value == obd.Unit.Quantity(40, obd.Unit.celsius)
+
+
+def test_query_many_mode_2():
+    o = connect_fake_can()
+    cmds = [obd.commands.DTC_RPM, obd.commands.DTC_SPEED]
+    r = o.query_many(cmds)
+
+    assert o.interface.sent == [b"020C000D00"]
+    assert r[0].value == 1726 * obd.Unit.rpm
+    assert r[1].value == 50 * obd.Unit.kph
+
+
+def test_query_many_unsupported():
+    o = connect_fake_can()
+    r = o.query_many([obd.commands.RPM, obd.commands.MAF, obd.commands.SPEED])
+    assert o.interface.sent == [b"010C0D"]
+    assert r[1].is_null()
+    assert not r[2].is_null()
+
+
+def test_query_many_legacy():
+    o = connect_fake_can(protocol_id="3")
+    o.query_many([obd.commands.RPM, obd.commands.SPEED])
+    assert o.interface.sent == [b"010C", b"010D"]
+
+
+def test_query_many_fallback():
+    o = connect_fake_can(packing=False)
+    cmds = [obd.commands.RPM, obd.commands.SPEED]
+    r = o.query_many(cmds)
+    assert o.interface.sent == [b"010C0D", b"010C", b"010D"]
+    assert all([not x.is_null() for x in r])
+
+    # packing is now off for good
+    o.query_many(cmds)
+    assert o.interface.sent[3:] == [b"010C1", b"010D1"]
+
+
+"""
+    Async scheduling
+"""
+
+
+def connect_fake_async():
+    o = obd.Async("/dev/null")
+    o.interface = FakeCANELM("/dev/null")
+    o.supported_commands |= set([obd.commands[1][pid] for pid in FakeCANELM.VALUES])
+    return o
+
+
+def test_async_periods():
+    o = connect_fake_async()
+    o.watch(obd.commands.RPM, period=0.02)
+    o.watch(obd.commands.SPEED, period=0.2)
+    o.watch(obd.commands.COOLANT_TEMP)  # delay_cmds
+    o.start()
+    time.sleep(1.0)
+    o.stop()
+
+    rpm = o.stats(obd.commands.RPM)
+    speed = o.stats(obd.commands.SPEED)
+    coolant = o.stats(obd.commands.COOLANT_TEMP)
+    assert coolant.period == 0.25
+
+    # generous bounds, this runs on busy CI machines
+    assert 30 <= rpm.samples <= 52
+    assert 4 <= speed.samples <= 7
+    assert 3 <= coolant.samples <= 6
+    assert 25 < rpm.rate < 55
+    assert rpm.jitter < 0.02
+    assert o.query(obd.commands.SPEED).value == 50 * obd.Unit.kph
+
+    # commands that fall due together are packed into a single request
+    assert b"010C0D05" in o.interface.sent
+
+
+def test_async_missed_deadlines():
+    o = connect_fake_async()
+    slow = o.interface.send_and_parse
+
+    def send_and_parse(cmd):
+        time.sleep(0.05)  # a slow bus
+        return slow(cmd)
+
+    o.interface.send_and_parse = send_and_parse
+    o.watch(obd.commands.RPM, period=0.01)
+    o.start()
+    time.sleep(0.5)
+    o.stop()
+
+    stats = o.stats(obd.commands.RPM)
+    assert stats.missed >= stats.samples  # several deadlines per read went by
+    assert stats.rate < 25  # and the reads didn't bunch up to catch up
+
+
+def test_async_stats():
+    o = connect_fake_async()
+    assert o.stats(obd.commands.RPM) is None
+    o.watch(obd.commands.RPM, period=0.1)
+    assert list(o.stats()) == [obd.commands.RPM]
+
+    # a new period starts new statistics
+    first = o.stats(obd.commands.RPM)
+    o.watch(obd.commands.RPM, period=0.1)
+    assert o.stats(obd.commands.RPM) is first
+    o.watch(obd.commands.RPM, period=0.5)
+    assert o.stats(obd.commands.RPM).period == 0.5
+
+    o.unwatch(obd.commands.RPM)
+    assert o.stats() == {}
+
+
+def test_async_unwatch_restart():
+    o = connect_fake_async()
+    o.watch(obd.commands.RPM, period=0.02)
+    o.watch(obd.commands.SPEED, period=0.5)
+    o.start()
+    time.sleep(0.1)
+    o.stop()
+
+    # the deadline left by RPM would be in the past by now
+    o.unwatch(obd.commands.RPM)
+    samples = o.stats(obd.commands.SPEED).samples
+    o.start()
+    time.sleep(0.1)
+    assert o.running
+    o.stop()
+    assert o.stats(obd.commands.SPEED).samples == samples + 1
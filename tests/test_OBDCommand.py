@@ -1,5 +1,7 @@
 from obd.OBDCommand import OBDCommand
-from obd.decoders import noop
+from obd.OBDResponse import decode_all
+from obd.UnitsAndScaling import Unit
+from obd.decoders import noop, percent, elm_voltage
 from obd.protocols import *
 
 
@@ -60,6 +62,75 @@ def test_call():
     assert r.value == bytearray([0x41, 0x00, 0xBE, 0x1F, 0xB8])
 
 
+def test_call_quantity():
+    p = SAE_J1850_PWM(["48 6B 10 41 00 FF FF FF FF AA"])
+    messages = p(["48 6B 10 41 11 FF AA"])
+
+    cmd = OBDCommand("", "", b"0111", 3, percent, ECU.ENGINE)
+    r = cmd(messages)
+    # the number and unit, without going through pint
+    assert r.magnitude == 100.0
+    assert r.unit == "percent"
+    assert r._OBDResponse__value is None
+    # the Quantity is built on demand
+    assert r.value == 100.0 * Unit.percent
+    assert r.magnitude == 100.0
+    assert not r.is_null()
+
+    # decoders failing to decode
+    cmd = OBDCommand("", "", b"ATRV", 0, elm_voltage, ECU.UNKNOWN)
+    r = cmd(p(["12.6X"]))
+    assert r.is_null()
+    assert r.value is None and r.magnitude is None and r.unit is None
+
+
+def test_call_lazy():
+    p = SAE_J1850_PWM(["48 6B 10 41 00 FF FF FF FF AA"])
+    messages = p(["48 6B 10 41 11 FF AA"])
+
+    calls = []
+
+    def decoder(messages):
+        calls.append(messages)
+        return percent(messages)
+
+    cmd = OBDCommand("", "", b"0111", 4, decoder, ECU.ENGINE)
+    r = cmd(messages)
+    assert not r.decoded
+    assert calls == []
+
+    # decoded on first access, once
+    assert r.value == 100.0 * Unit.percent
+    assert r.decoded
+    assert r.value == 100.0 * Unit.percent
+    assert not r.is_null()
+    assert len(calls) == 1
+
+    # the decoder saw padded data, the response kept it as received
+    assert calls[0][0].data == bytearray([0x41, 0x11, 0xFF, 0x00])
+    assert r.raw_data == [b"\x41\x11\xFF"]
+    assert messages[0].data == bytearray([0x41, 0x11, 0xFF])
+
+
+def test_from_raw():
+    cmd = OBDCommand("", "", b"0111", 3, percent, ECU.ENGINE)
+    r = cmd.from_raw([b"\x41\x11\xFF"], t=12.5)
+    assert r.time == 12.5
+    assert not r.decoded
+
+    empty = cmd.from_raw([])
+    assert empty.is_null()
+
+    other = OBDCommand("", "", b"0123", 6, noop, ECU.ENGINE).from_raw([b"\x41\x23\x01"])
+    assert decode_all([r, empty, other]) == \
+        [100.0 * Unit.percent, None, bytearray([0x41, 0x23, 0x01, 0x00, 0x00, 0x00])]
+
+    # plain numbers, without pint
+    r = cmd.from_raw([b"\x41\x11\xFF"])
+    assert decode_all([r, empty], quantities=False) == [100.0, None]
+    assert r._OBDResponse__value is None
+
+
 def test_get_mode():
     cmd = OBDCommand("", "", b"0123", 4, noop, ECU.ENGINE)
     assert cmd.mode == 0x01
@@ -0,0 +1,142 @@
+"""
+    Tests for the planning of the acquisition cycles of the vehicle service
+"""
+
+import logging
+import time
+
+import pytest
+
+import obd
+from vehicle_service import AcquisitionPlanner, CycleReport, VehicleService
+
+RPM = obd.commands.RPM
+SPEED = obd.commands.SPEED
+COOLANT_TEMP = obd.commands.COOLANT_TEMP
+FUEL_LEVEL = obd.commands.FUEL_LEVEL
+THROTTLE_POS = obd.commands.THROTTLE_POS
+
+
+class Response(object):
+    """ stands in for an OBDResponse, completed at t """
+
+    def __init__(self, t, magnitude=None, unit=None):
+        self.time = t
+        self.magnitude = magnitude
+        self.unit = unit
+        self.value = magnitude
+
+    def is_null(self):
+        return self.magnitude is None
+
+
+class Connection(object):
+    """ stands in for an obd.OBD, answering query_many() from a dict """
+
+    def __init__(self, values):
+        self.values = values
+        self.queried = []
+
+    def query_many(self, cmds):
+        self.queried.append(list(cmds))
+        return [Response(time.time(), *self.values.get(c, (None, None))) for c in cmds]
+
+    def status(self):
+        return obd.OBDStatus.CAR_CONNECTED
+
+
+def measured(planner, costs, last):
+    # as though each command was read before
+    for cmd, cost in costs.items():
+        planner._cost[cmd] = cost
+        planner._last[cmd] = last
+
+
+def test_deferred_first():
+    planner = AcquisitionPlanner(budget=0.25)
+    cmds = [RPM, COOLANT_TEMP, FUEL_LEVEL]
+    measured(planner, dict.fromkeys(cmds, 0.1), 0.)
+
+    selected, report = planner.plan(cmds, 1.)
+    assert selected == [RPM, COOLANT_TEMP]
+    assert report.deferred == [FUEL_LEVEL]
+    assert report.estimate == pytest.approx(0.2)
+
+    planner.record(selected, [Response(1.1), Response(1.2)], 1.)
+    selected, report = planner.plan(cmds, 2.)
+    assert selected == [FUEL_LEVEL, RPM]  # the most overdue goes first
+    assert report.deferred == [COOLANT_TEMP]
+
+
+def test_never_read_forced():
+    planner = AcquisitionPlanner(budget=0.1)
+    measured(planner, {RPM: 0.1, COOLANT_TEMP: 0.1}, 0.)
+
+    # over the budget, the commands never read yet still get measured
+    selected, report = planner.plan([RPM, COOLANT_TEMP, FUEL_LEVEL, THROTTLE_POS], 1.)
+    assert selected == [FUEL_LEVEL, THROTTLE_POS]
+    assert report.deferred == [RPM, COOLANT_TEMP]
+    assert report.estimate == pytest.approx(0.2)  # at the average cost
+
+
+def test_first_and_intervals():
+    planner = AcquisitionPlanner(budget=1., min_intervals={"COOLANT_TEMP": 10.})
+    measured(planner, {SPEED: 0.1, RPM: 0.1, COOLANT_TEMP: 0.1}, 0.)
+
+    selected, report = planner.plan([RPM, SPEED, COOLANT_TEMP], 5., first=SPEED)
+    assert selected == [SPEED, RPM]  # once, and ahead of the others
+    assert report.skipped == [COOLANT_TEMP]
+
+
+def test_record():
+    planner = AcquisitionPlanner()
+    gap = AcquisitionPlanner.PACKED_GAP
+
+    # RPM and SPEED came in one packed request, COOLANT_TEMP alone after it
+    cmds = [RPM, SPEED, COOLANT_TEMP]
+    report = CycleReport(None)
+    planner.record(cmds, [Response(10.1), Response(10.1 + gap / 2), Response(10.3)], 10., report)
+    assert planner.cost(RPM) == pytest.approx(0.05, abs=gap)
+    assert planner.cost(SPEED) == pytest.approx(0.05, abs=gap)
+    assert planner.cost(COOLANT_TEMP) == pytest.approx(0.2, abs=gap)
+    assert planner._last[COOLANT_TEMP] == 10.3
+    assert report.elapsed > 0
+
+    # later measures are smoothed in
+    planner.record([RPM], [Response(20.15)], 20.)
+    assert planner.cost(RPM) == pytest.approx(0.05 + AcquisitionPlanner.SMOOTHING * 0.1, abs=gap)
+
+    # the average stands for the commands never measured
+    assert planner.cost(FUEL_LEVEL) == pytest.approx(sum(planner._cost.values()) / 3)
+    assert AcquisitionPlanner().cost(FUEL_LEVEL) == AcquisitionPlanner.DEFAULT_COST
+
+
+def vehicle_service(values):
+    vs = VehicleService(logging.getLogger("test"), "0")
+    vs._connected = True
+    vs._obd_status = "Car Connected"
+    vs.odb_connection = Connection(values)
+    vs._request_commands = [RPM, COOLANT_TEMP]
+    return vs
+
+
+def test_read_data():
+    vs = vehicle_service({SPEED: (50., "kph"), RPM: (1726., "rpm")})
+    assert vs.read_data()
+    assert vs.odb_connection.queried == [[SPEED], [RPM, COOLANT_TEMP]]  # SPEED on its own, first
+    assert vs.engine_on
+    assert vs.nbc_read == 2  # COOLANT_TEMP didn't answer
+    assert list(vs.values.keys()) == [RPM]
+    assert vs.values[RPM]._magnitude == 1726.
+    assert vs.cycle_report().read == [SPEED, RPM, COOLANT_TEMP]
+
+
+def test_read_data_engine_off():
+    vs = vehicle_service({RPM: (1726., "rpm")})
+    connection = vs.odb_connection
+    assert not vs.read_data()
+    assert connection.queried == [[SPEED]]  # the others aren't worth querying
+    assert vs.cycle_report().read == [SPEED]
+    assert not vs.engine_on
+    assert not vs._connected
+    assert vs.values == {}
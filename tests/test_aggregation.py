@@ -0,0 +1,136 @@
+"""
+    Tests for the windowed statistics computed by the OBD supervisor
+"""
+
+import random
+import statistics
+
+import pytest
+
+from aggregation import Accumulator, P2Quantile, WindowAggregator
+from conftest import Value
+
+
+class Service(object):
+    """ stands in for a VehicleService, as buildResponse() sees it """
+
+    def __init__(self, values):
+        self.engine_on = True
+        self.values = values
+
+    def last_error(self):
+        return ""
+
+    def clear_error(self):
+        pass
+
+    def get_values(self):
+        return self.values
+
+
+def exact(samples, p):
+    s = sorted(samples)
+    return s[int(round(p * (len(s) - 1)))]
+
+
+def test_p2_quantile():
+    rng = random.Random(1)
+    samples = [rng.gauss(1000., 100.) for _ in range(20000)]
+    for p in [0.5, 0.9, 0.99]:
+        q = P2Quantile(p)
+        for x in samples:
+            q.add(x)
+        assert q.value() == pytest.approx(exact(samples, p), rel=1e-3)
+
+
+def test_p2_few_samples():
+    q = P2Quantile(0.5)
+    assert q.value() is None
+    for x in [5, 1, 3]:
+        q.add(x)
+    assert q.value() == 3  # exact, until there are 5 markers
+
+    for p in [0, 1, 1.5, -0.1]:
+        with pytest.raises(ValueError):
+            P2Quantile(p)
+
+
+def test_accumulator():
+    rng = random.Random(2)
+    samples = [rng.uniform(0., 100.) for _ in range(1000)]
+    acc = Accumulator("kph", [0.5])
+    assert acc.variance == 0.
+    for x in samples:
+        acc.add(x)
+    assert acc.count == 1000
+    assert acc.min == min(samples)
+    assert acc.max == max(samples)
+    assert acc.mean == pytest.approx(statistics.mean(samples))
+    assert acc.variance == pytest.approx(statistics.pvariance(samples))
+    [(level, median)] = acc.quantiles()
+    assert level == 0.5
+    assert median == pytest.approx(exact(samples, 0.5), rel=0.05)
+
+
+def test_window():
+    agg = WindowAggregator(window=10, quantiles=[0.5])
+    assert not agg.due(0.)
+
+    agg.add([Value("RPM", 1000, 0., "rpm"), Value("STATUS", "MIL off", 0., None, 1)], 0.)
+    agg.add([Value("RPM", 1000, 0., "rpm"), Value("SPEED", 40, 4., "kph")], 5.)  # RPM held, not read again
+    agg.add([Value("RPM", 3000, 6., "rpm"), Value("SPEED", 60, 6., "kph")], 6.)
+    assert not agg.due(9.)
+    assert agg.due(10.)
+
+    stats = agg.flush(10.)
+    assert [name for name, acc in stats] == ["RPM", "SPEED"]  # numbers only
+    rpm = stats[0][1]
+    assert (rpm.count, rpm.min, rpm.max, rpm.mean) == (2, 1000, 3000, 2000)
+    assert rpm.unit == "rpm"
+    assert agg.duration == 10.
+
+    # the next window starts empty, and stale values stay out
+    agg.add([Value("RPM", 3000, 6., "rpm"), Value("SPEED", 70, 12., "kph")], 12.)
+    [(name, speed)] = agg.flush(20.)
+    assert (name, speed.count, speed.mean) == ("SPEED", 1, 70)
+
+
+def test_window_rules():
+    assert WindowAggregator.fromRules(None) is None
+    assert WindowAggregator.fromRules({"on_period": 1}) is None
+
+    agg = WindowAggregator.fromRules({"aggregate": {"window": 30, "commands": ["SPEED"], "values": True}})
+    assert agg.window == 30.
+    assert agg.values
+    agg.add([Value("RPM", 1000, 0., "rpm"), Value("SPEED", 40, 0., "kph")], 0.)
+    assert [name for name, acc in agg.flush(30.)] == ["SPEED"]
+
+    for rules in [{"aggregate": 30}, {"aggregate": {"window": 0}}, {"aggregate": {"window": "long"}},
+                  {"aggregate": {"quantiles": [0.5, 1.]}}]:
+        with pytest.raises(ValueError):
+            WindowAggregator.fromRules(rules)
+
+
+def test_build_response():
+    server = pytest.importorskip("vehicle_obd_server")
+
+    values = [Value("RPM", 1000, 0., "rpm"), Value("RPM", 3000, 1., "rpm")]
+    agg = WindowAggregator(window=10, quantiles=[0.5, 0.9])
+    agg.add(values[:1], 0.)
+    agg.add(values[1:], 1.)
+    vs = Service(values[1:])
+
+    # between the windows, nothing goes out
+    r = server.buildResponse(vs, "adapter", None, agg, None)
+    assert len(r.values) == 0 and len(r.stats) == 0
+
+    r = server.buildResponse(vs, "adapter", None, agg, agg.flush(10.))
+    assert len(r.values) == 0  # the statistics only, unless asked for
+    [s] = r.stats
+    assert (s.cmd, s.unit, s.count, s.min, s.max, s.mean, s.window) == ("RPM", "rpm", 2, 1000, 3000, 2000, 10.)
+    assert s.variance == 1000000.
+    assert [q.level for q in s.quantiles] == pytest.approx([0.5, 0.9])
+
+    agg.values = True
+    r = server.buildResponse(vs, "adapter", None, agg, agg.flush(20.))
+    assert [v.cmd for v in r.values] == ["RPM"]
@@ -0,0 +1,88 @@
+"""
+    Tests for the asyncio connection, run against a scripted adapter
+    on the far side of a pseudo terminal
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+import obd
+import obd.aio
+from obd.utils import OBDStatus
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"),
+                                reason="needs a pseudo terminal")
+
+RESPONSES = {
+    b"010C": b"7E8 04 41 0C 1A F8\r\r",
+    b"010C1": b"7E8 04 41 0C 1A F8\r\r",
+    b"010D": b"7E8 03 41 0D 32\r\r",
+    b"010D1": b"7E8 03 41 0D 32\r\r",
+    b"0120": b"7E8 06 41 20 00 00 00 00\r\r",
+}
+
+
+def run(coroutine):
+    """ asyncio.run() is 3.7+, so run each test on a fresh loop by hand """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_connect(scripted_adapter):
+    adapter = scripted_adapter(RESPONSES)
+
+    async def main():
+        async with obd.aio.OBD(adapter.port_name) as connection:
+            assert connection.is_connected()
+            assert connection.protocol_id() == "6"
+            assert connection.supports(obd.commands.RPM)
+            return await connection.query(obd.commands.RPM)
+
+    r = run(main())
+    assert r.value == 1726 * obd.Unit.rpm
+
+
+def test_concurrent_queries(scripted_adapter):
+    adapter = scripted_adapter(RESPONSES)
+
+    async def main():
+        connection = obd.aio.OBD(adapter.port_name)
+        await connection.connect()
+        rpm = [connection.query(obd.commands.RPM) for _ in range(5)]
+        speed = [connection.query(obd.commands.SPEED) for _ in range(5)]
+        r = await asyncio.gather(*(rpm + speed))
+        await connection.close()
+        return r
+
+    r = run(main())
+    assert [x.value for x in r] == [1726 * obd.Unit.rpm] * 5 + [50 * obd.Unit.kph] * 5
+    # the frame counts were learned, and repeats went out as a bare CR
+    assert adapter.received.count(b"") == 6
+
+
+def test_query_many(scripted_adapter):
+    adapter = scripted_adapter(RESPONSES)
+
+    async def main():
+        async with obd.aio.OBD(adapter.port_name) as connection:
+            return await connection.query_many([obd.commands.RPM, obd.commands.SPEED,
+                                                obd.commands.RPM])
+
+    r = run(main())
+    assert [x.value for x in r] == [1726 * obd.Unit.rpm, 50 * obd.Unit.kph, 1726 * obd.Unit.rpm]
+
+
+def test_no_adapter(tmp_path):
+    async def main():
+        connection = obd.aio.OBD(str(tmp_path / "nothing"))
+        assert await connection.connect() == OBDStatus.NOT_CONNECTED
+        return await connection.query(obd.commands.RPM, force=True)
+
+    assert run(main()).is_null()
@@ -0,0 +1,67 @@
+from obd import CANFilter
+
+
+def test_mask():
+    f = CANFilter([0x7E8, 0x7E9, 0x7EA])
+    assert f.mask(11) == (0x7E8, 0x7FC)
+    assert CANFilter([0x7E8]).mask(11) == (0x7E8, 0x7FF)
+    assert CANFilter([0x18DAF110, 0x18DAF118]).mask(29) == (0x18DAF110, 0x1FFFFFF7)
+
+
+def test_accepts():
+    f = CANFilter()
+    assert f.accepts(0x123)  # empty filters let everything through
+    f.add(0x7E8)
+    assert f.accepts(0x7E8)
+    assert not f.accepts(0x7E9)
+
+
+def test_version():
+    f = CANFilter([0x7E8])
+    v = f.version
+    f.add(0x7E8)
+    f.remove(0x123)
+    assert f.version == v  # no change
+    f.add(0x7E9)
+    f.remove(0x7E8)
+    f.clear()
+    assert f.version == v + 3
+
+
+def test_program_elm():
+    f = CANFilter([0x7E8])
+    cmds, state = f.program(None, 11)
+    assert cmds == [b"ATCF 7E8", b"ATCM 7FF"]
+
+    # only what changed is sent
+    f.add(0x7E9)
+    cmds, state = f.program(state, 11)
+    assert cmds == [b"ATCM 7FE"]
+    cmds, state = f.program(state, 11)
+    assert cmds == []
+
+    f.clear()
+    cmds, state = f.program(state, 11)
+    assert cmds == [b"ATCRA"] and state is None
+    assert f.program(state, 11) == ([], None)
+
+    f.add(0x18DAF110)
+    assert f.program(None, 29)[0] == [b"ATCF 18DAF110", b"ATCM 1FFFFFFF"]
+
+
+def test_program_stn():
+    f = CANFilter([0x7E8])
+    cmds, state = f.program(None, 11, stn=True)
+    assert cmds == [b"STFAP 7E8,7FF"]
+
+    f.add(0x3E0)
+    cmds, state = f.program(state, 11, stn=True)
+    assert cmds == [b"STFAP 3E0,7FF"]
+
+    # pass filters can only be cleared all at once
+    f.remove(0x7E8)
+    cmds, state = f.program(state, 11, stn=True)
+    assert cmds == [b"STFCP", b"STFAP 3E0,7FF"]
+
+    f.clear()
+    assert f.program(state, 11, stn=True) == ([b"STFCP"], None)
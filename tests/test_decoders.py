@@ -1,8 +1,8 @@
-from binascii import unhexlify
+from binascii import hexlify, unhexlify
 
 import obd.decoders as d
 from obd.UnitsAndScaling import Unit
-from obd.codes import BASE_TESTS, COMPRESSION_TESTS, SPARK_TESTS, TEST_IDS
+from obd.codes import BASE_TESTS, COMPRESSION_TESTS, SPARK_TESTS, TEST_IDS, DTCDescriptions
 from obd.protocols.protocol import Frame, Message
 
 
@@ -190,6 +190,13 @@ def test_absolute_load():
     assert d.absolute_load(m("4100" + "FFFF")) == 25700 * Unit.percent
 
 
+def test_vin():
+    # CAN, with its leading item count
+    assert d.vin(m("4902" + "01" + hexlify(b"1D4GP00R55B123456").decode())) == "1D4GP00R55B123456"
+    # legacy, padded with zeros
+    assert d.vin(m("4902" + "000000" + hexlify(b"1D4GP00R55B123456").decode())) == "1D4GP00R55B123456"
+
+
 def test_elm_voltage():
     # these aren't parsed as standard hex messages, so manufacture our own
     assert d.elm_voltage([Message([Frame("12.875")])]) == 12.875 * Unit.volt
@@ -296,6 +303,17 @@ def test_dtc():
     ]
 
 
+
+def test_dtc_descriptions():
+    descriptions = DTCDescriptions()
+    assert not descriptions.loaded  # nothing read until asked for
+    assert descriptions["P0104"] == "Mass or Volume Air Flow Circuit Intermittent"
+    assert descriptions.loaded
+    assert descriptions.get("P9999") is None
+    assert "U0431" in descriptions
+    assert len(descriptions) > 2000
+
+
 def test_monitor():
     # single test -----------------------------------------
     #                [      test      ]
@@ -360,3 +378,26 @@ def test_monitor():
     # make sure that the standard tests are null
     for tid in TEST_IDS:
         assert v[tid].is_null()
+
+
+def test_monitor_columns():
+    #                [      test      ][      test      ][   signed test   ]
+    v = d.monitor(m("41" + "01010A0BB00BB00BB00105100048000000640185810096FF9C0064"))
+    assert v.tids == [0x01, 0x05, 0x85]
+    assert v.units == [Unit.millivolt, Unit.millisecond, Unit.count]
+    assert abs(v.values[0] - 365) < 0.1
+    assert v.values[1:] == [72.0, 150.0]
+    assert v.mins[1:] == [0.0, -100.0]
+    assert v.maxs[1:] == [100.0, 100.0]
+    assert v.passed == [True, True, False]
+
+    # MonitorTests are built on lookup, once
+    assert v._tests == {}
+    assert v.RTL_SWITCH_TIME is v[0x05]
+    assert v[0x85].min == -100 * Unit.count
+
+    # booleans
+    v = d.monitor(m("41" + "010B2E000100000001"))
+    assert v.units == [None]
+    assert v.MISFIRE_AVERAGE.value is True
+    assert v.MISFIRE_AVERAGE.min is False
@@ -0,0 +1,134 @@
+"""
+    Tests for the ELM327 emulator, through the connections it stands in for
+"""
+
+import sys
+import time
+
+import pytest
+
+import obd
+from obd import ECU
+from obd.elm327 import ELM327
+from obd.emulator import ELM327Emulator, EmulatedECU, VehicleProfile, dtc_bytes, supported_bitmap
+from obd.utils import OBDStatus
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs a pseudo terminal")
+
+
+def test_supported_bitmap():
+    assert supported_bitmap([0x01, 0x0C, 0x20], 0x00) == b"\x80\x10\x00\x01"
+    assert supported_bitmap([0x0C, 0x21], 0x00) == b"\x00\x10\x00\x01"  # more beyond
+    assert supported_bitmap([0x21, 0x40], 0x20) == b"\x80\x00\x00\x01"
+    assert dtc_bytes("P0143") == b"\x01\x43"
+    assert dtc_bytes("U0100") == b"\xC1\x00"
+
+
+@pytest.mark.parametrize("protocol", ["1", "3", "6", "7"])
+def test_profile(protocol):
+    with ELM327Emulator(VehicleProfile.default(protocol)) as emulator:
+        o = obd.OBD(emulator.port_name)
+        assert o.status() == OBDStatus.CAR_CONNECTED
+        assert o.protocol_id() == protocol
+        assert o.supports(obd.commands.RPM)
+
+        assert o.query(obd.commands.RPM).value == 1726 * obd.Unit.rpm
+        assert o.query(obd.commands.VIN).value == "1D4GP00R55B123456"
+
+        # both ECUs answer
+        r = o.query(obd.commands.GET_DTC)
+        assert [code for code, _ in r.value] == ["P0143", "P0196", "P0700"]
+        assert len(r.messages) == 2 and r.messages[0].ecu == ECU.ENGINE
+        o.close()
+
+
+def test_multi_pid():
+    # the second round goes out with the frame count learned by the first
+    with ELM327Emulator() as emulator:
+        o = obd.OBD(emulator.port_name)
+        cmds = [obd.commands.RPM, obd.commands.SPEED, obd.commands.COOLANT_TEMP]
+        for _ in range(2):
+            assert [r.value.magnitude for r in o.query_many(cmds)] == [1726, 50, 83]
+        o.close()
+
+
+def test_headers():
+    profile = VehicleProfile(ecus=[EmulatedECU(pids={"0D": "32"}),
+                                   EmulatedECU(name="brakes", pids={"0D": "33"})])
+    with ELM327Emulator(profile) as emulator:
+        elm = ELM327(emulator.port_name, 38400, "6", 0.1)
+        assert sorted(m.data[2] for m in elm.send_and_parse(b"010D")) == [0x32, 0x33]
+
+        # a physical address reaches a single ECU
+        elm.send_and_parse(b"ATSH7E1")
+        assert [m.data[2] for m in elm.send_and_parse(b"010D")] == [0x33]
+        elm.close()
+
+
+def test_headers_from_ecu():
+    # the response ID is the ECU's, whatever its place in the answer
+    profile = VehicleProfile(ecus=[EmulatedECU(pids={"0D": "32"}),
+                                   EmulatedECU(name="transmission", pids={"0D": "33"})])
+    with ELM327Emulator(profile) as emulator:
+        elm = ELM327(emulator.port_name, 38400, "6", 0.1)
+        messages = elm.send_and_parse(b"010D")
+        assert sorted((m.frames[0].raw, m.ecu) for m in messages) == \
+            [("7E803410D32", ECU.ENGINE), ("7E903410D33", ECU.TRANSMISSION)]
+
+        elm.send_and_parse(b"ATSH7E1")
+        messages = elm.send_and_parse(b"010D")
+        assert [(m.frames[0].raw, m.ecu) for m in messages] == [("7E903410D33", ECU.TRANSMISSION)]
+        elm.close()
+
+
+def test_faults():
+    with ELM327Emulator(faults={"no_data": 1.0}) as emulator:
+        o = obd.OBD(emulator.port_name)
+        assert o.query(obd.commands.RPM, force=True).is_null()
+        o.close()
+
+    with ELM327Emulator() as emulator:
+        o = obd.OBD(emulator.port_name)
+        emulator.inject("can_error")
+        assert o.query(obd.commands.RPM).is_null()
+        assert not o.query(obd.commands.RPM).is_null()
+
+        # the VIN comes in three frames, one of which goes missing
+        emulator.inject("missing_frame")
+        assert o.query(obd.commands.VIN).is_null()
+
+        emulator.inject("rx_error")
+        assert o.query(obd.commands.RPM).value == 1726 * obd.Unit.rpm
+        o.close()
+
+    with pytest.raises(ValueError):
+        ELM327Emulator(faults={"flat_tire": 0.1})
+
+
+def test_ignition_off():
+    with ELM327Emulator() as emulator:
+        emulator.ignition = False
+        o = obd.OBD(emulator.port_name)
+        assert o.status() == OBDStatus.OBD_CONNECTED
+        o.close()
+
+
+def test_low_power():
+    with ELM327Emulator() as emulator:
+        elm = ELM327(emulator.port_name, 38400, "6", 0.1)
+        assert elm.low_power() == ["OK"]
+        elm.normal_power()
+        assert elm.send_and_parse(b"010D")[0].data[2] == 0x32
+        elm.close()
+
+
+def test_latency():
+    with ELM327Emulator(latency=0.05) as emulator:
+        elm = ELM327(emulator.port_name, 38400, "6", 0.1)
+        t = time.time()
+        elm.send_and_parse(b"0101")  # two ECUs
+        assert time.time() - t >= 0.1
+        t = time.time()
+        elm.send_and_parse(b"01011")  # told to expect one answer
+        assert time.time() - t < 0.1
+        elm.close()
@@ -1,8 +1,10 @@
+import sys
 import time
 
 import pytest
 
 from obd import commands, Unit
+from obd.emulator import ELM327Emulator
 
 # NOTE: This is purposefully tuned slightly higher than the ELM's default
 #       message timeout of 200 milliseconds. This prevents us from
@@ -13,18 +15,29 @@ STANDARD_WAIT_TIME = 0.3
 
 
 @pytest.fixture(scope="module")
-def obd(request):
-    """provides an OBD connection object for obdsim"""
-    import obd
+def port(request):
+    """the --port given (ie: obdsim's), or else an emulated ELM327"""
     port = request.config.getoption("--port")
+    if port:
+        yield port
+    elif not sys.platform.startswith("linux"):
+        pytest.skip("needs --port=<port>, or a pseudo terminal for the emulator")
+    else:
+        with ELM327Emulator() as emulator:
+            yield emulator.port_name
+
+
+@pytest.fixture(scope="module")
+def obd(port):
+    """provides an OBD connection object for the adapter"""
+    import obd
     return obd.OBD(port)
 
 
 @pytest.fixture(scope="module")
-def asynchronous(request):
-    """provides an OBD *Async* connection object for obdsim"""
+def asynchronous(port):
+    """provides an OBD *Async* connection object for the adapter"""
     import obd
-    port = request.config.getoption("--port")
     return obd.Async(port)
 
 
@@ -34,25 +47,19 @@ def good_rpm_response(r):
            (r.value >= 0.0 * Unit.rpm)
 
 
-@pytest.fixture
-def skip_if_port_unspecified(request):
-    if not request.config.getoption("--port"):
-        pytest.skip("needs --port=<port> to run")
-
-
-def test_supports(skip_if_port_unspecified, obd):
+def test_supports(obd):
     assert (len(obd.supported_commands) > 0)
     assert (obd.supports(commands.RPM))
 
 
-def test_rpm(skip_if_port_unspecified, obd):
+def test_rpm(obd):
     r = obd.query(commands.RPM)
     assert (good_rpm_response(r))
 
 
 # Async tests
 
-def test_async_query(skip_if_port_unspecified, asynchronous):
+def test_async_query(asynchronous):
     rs = []
     asynchronous.watch(commands.RPM)
     asynchronous.start()
@@ -69,7 +76,7 @@ def test_async_query(skip_if_port_unspecified, asynchronous):
     assert (all([good_rpm_response(r) for r in rs]))
 
 
-def test_async_callback(skip_if_port_unspecified, asynchronous):
+def test_async_callback(asynchronous):
     rs = []
     asynchronous.watch(commands.RPM, callback=rs.append)
     asynchronous.start()
@@ -82,7 +89,7 @@ def test_async_callback(skip_if_port_unspecified, asynchronous):
     assert (all([good_rpm_response(r) for r in rs]))
 
 
-def test_async_paused(skip_if_port_unspecified, asynchronous):
+def test_async_paused(asynchronous):
     assert (not asynchronous.running)
     asynchronous.watch(commands.RPM)
     asynchronous.start()
@@ -97,7 +104,7 @@ def test_async_paused(skip_if_port_unspecified, asynchronous):
     assert not asynchronous.running
 
 
-def test_async_unwatch(skip_if_port_unspecified, asynchronous):
+def test_async_unwatch(asynchronous):
     watched_rs = []
     unwatched_rs = []
 
@@ -126,7 +133,7 @@ def test_async_unwatch(skip_if_port_unspecified, asynchronous):
     assert (all([r.is_null() for r in unwatched_rs]))
 
 
-def test_async_unwatch_callback(skip_if_port_unspecified, asynchronous):
+def test_async_unwatch_callback(asynchronous):
     a_rs = []
     b_rs = []
     asynchronous.watch(commands.RPM, callback=a_rs.append)
@@ -0,0 +1,124 @@
+"""
+    Tests for connection profiles, and the fast connection path they enable
+"""
+
+import sys
+
+import pytest
+
+import obd
+from obd import ConnectionProfile, ProfileStore, ECU
+from obd.utils import OBDStatus
+
+MAC = "00:11:22:33:44:55"
+VIN = "1D4GP00R55B123456"
+
+
+def make_profile(vin=VIN):
+    return ConnectionProfile(baudrate=38400,
+                             protocol="6",
+                             ecu_map={0: ECU.ENGINE},
+                             supported_commands=["RPM", "SPEED"],
+                             frame_counts={"RPM": 1},
+                             packed_frame_counts={(b"7E0", b"010C0D"): 1},
+                             vin=vin,
+                             chip="ELM327 v1.5",
+                             negotiated_baudrate=500000,
+                             pid_bitmap={0: "BE3FA813"})
+
+
+def test_dict_round_trip():
+    p = make_profile()
+    assert ConnectionProfile.from_dict(p.to_dict()) == p
+
+
+def test_store(tmp_path):
+    store = ProfileStore(str(tmp_path / "vehicle"))  # created on demand
+    assert store.load(MAC) is None
+
+    assert store.save(MAC, make_profile())
+    assert store.load(MAC) == make_profile()
+    assert store.load(MAC.lower(), VIN) == make_profile()
+
+    # a second vehicle becomes the default for this adapter
+    other = make_profile(vin="WVWZZZ1JZXW000001")
+    store.save(MAC, other)
+    assert store.load(MAC) == other
+    assert store.load(MAC, VIN) == make_profile()
+
+    # other adapters are kept apart
+    assert store.load("66:77:88:99:AA:BB") is None
+
+
+def test_store_corrupt(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    with open(store.path(MAC), "w") as fd:
+        fd.write("{not json")
+    assert store.load(MAC) is None
+    assert store.save(MAC, make_profile())
+    assert store.load(MAC) == make_profile()
+
+
+"""
+    Fast connections, against a scripted adapter
+"""
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs a pseudo terminal")
+def test_fast_connect(scripted_adapter):
+    adapter = scripted_adapter({b"010C": b"7E8 04 41 0C 1A F8\r\r"})
+    o = obd.OBD(adapter.port_name)
+    assert o.is_connected()
+    assert b"ATZ" in adapter.received
+    o.supported_commands.add(obd.commands.RPM)
+    o.query(obd.commands.RPM)
+    profile = o.profile(vin=VIN)
+    o.close()
+
+    assert profile.protocol == "6"
+    assert profile.ecu_map == {0: ECU.ENGINE}
+    assert profile.pid_bitmap == {0: "BE3FA813"}
+    assert "RPM" in profile.supported_commands
+    assert profile.frame_counts["RPM"] == 1
+
+    adapter = scripted_adapter({b"010C1": b"7E8 04 41 0C 1A F8\r\r"})
+    o = obd.OBD(adapter.port_name, profile=profile)
+    assert o.is_connected()
+    assert o.interface.from_profile()
+    assert adapter.received == [b"ATE0", b"ATH1", b"ATL0", b"AT RV", b"ATTP6", b"0100"]
+    assert o.supported_commands == set([obd.commands[n] for n in profile.supported_commands])
+
+    # the learned frame count is used right away
+    assert o.query(obd.commands.RPM).value == 1726 * obd.Unit.rpm
+    assert adapter.received[-1] == b"010C1"
+    o.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs a pseudo terminal")
+def test_stale_profile(scripted_adapter):
+    # a different car: the engine answers from another ID
+    profile = make_profile()
+    profile.ecu_map = {1: ECU.ENGINE}
+
+    adapter = scripted_adapter()
+    o = obd.OBD(adapter.port_name, profile=profile)
+    assert o.status() == OBDStatus.CAR_CONNECTED
+    assert not o.interface.from_profile()
+    assert b"ATZ" in adapter.received  # did the full initialization
+    assert b"ATSP0" in adapter.received
+    o.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs a pseudo terminal")
+def test_swapped_car(scripted_adapter):
+    # another car with a single ECU at 7E8, as most CAN cars have, but its
+    # own PIDs: the ECU map matches, the PID bitmap doesn't
+    adapter = scripted_adapter({b"0100": b"7E8 06 41 00 98 18 80 11\r\r"})
+    o = obd.OBD(adapter.port_name, profile=make_profile())
+    assert o.status() == OBDStatus.CAR_CONNECTED
+    assert not o.interface.from_profile()
+    assert b"ATZ" in adapter.received  # did the full initialization
+    assert o.interface.pid_bitmap() == {0: "98188011"}
+    assert obd.commands.SPEED in o.supported_commands
+    assert obd.commands.FUEL_STATUS not in o.supported_commands  # listed by the other car
+    o.close()
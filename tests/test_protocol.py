@@ -27,6 +27,11 @@ def test_frame():
     assert frame.type is None
     assert frame.seq_index is 0
     assert frame.data_len is None
+    assert not frame.data
+
+    # no per-instance dicts
+    assert not hasattr(frame, "__dict__")
+    assert not hasattr(Message([]), "__dict__")
 
 
 def test_message():
@@ -75,3 +80,15 @@ def test_populate_ecu_map():
     # if no messages were received, then the map is empty
     p = SAE_J1850_PWM([])
     assert len(p.ecu_map) == 0
+
+
+def test_bytes_lines():
+    lines = ["7E8 06 41 00 BE 3F A8 13", "NO DATA", "7E9 06 41 00 80 00 00 01", "SEARCHING..."]
+    p = ISO_15765_4_11bit_500k([])
+    from_str = p(lines)
+    from_bytes = p([l.encode() for l in lines])
+
+    assert [(m.ecu, m.data, m.raw()) for m in from_bytes] == \
+        [(m.ecu, m.data, m.raw()) for m in from_str]
+    assert [m.raw() for m in from_bytes if not m.frames[0].data] == ["NO DATA", "SEARCHING..."]
+    assert not any(isinstance(m.raw(), bytes) for m in from_bytes)  # decoded to text
@@ -1,4 +1,7 @@
 import random
+import sys
+
+import pytest
 
 from obd.protocols import *
 
@@ -191,5 +194,155 @@ def test_multi_line_mode_03():
         check_message(r[0], len(test_case), 0, correct_data)
 
 
+def test_compact():
+    """
+        Output from an adapter with spaces turned off (ATS0)
+        should parse exactly like the spaced output
+    """
+
+    for protocol_ in CAN_11_PROTOCOLS:
+        p = protocol_([])
+
+        r = p(["7E80641000001020", "7E8064100000102"])
+        assert len(r) == 1  # the odd sized frame is dropped
+        check_message(r[0], 1, 0x0, [0x41, 0x00, 0x00, 0x01, 0x02])
+
+        spaced = [
+            "7E8 10 20 49 04 00 01 02 03",
+            "7E8 21 04 05 06 07 08 09 0A",
+            "7E8 22 0B 0C 0D 0E 0F 10 11",
+            "7E8 23 12 13 14 15 16 17 18",
+            "7E9 03 41 0D 32",
+            "NO DATA",
+        ]
+        compact = [line.replace(" ", "") for line in spaced[:-1]] + spaced[-1:]
+
+        r = p(compact)
+        assert [m.data for m in r] == [m.data for m in p(spaced)]
+        assert [m.tx_id for m in r] == [0x0, 0x1, None]
+        assert r[-1].raw() == "NO DATA"
+
+    for protocol_ in CAN_29_PROTOCOLS:
+        p = protocol_([])
+        r = p(["18DAF110064100BE3FA813"])
+        assert len(r) == 1
+        check_message(r[0], 1, 0x10, [0x41, 0x00, 0xBE, 0x3F, 0xA8, 0x13])
+
+
+def test_can_id():
+    """ frames keep the full arbitration ID, for CAN filtering """
+
+    for protocol_ in CAN_11_PROTOCOLS:
+        r = protocol_([])(["7E8 03 41 0D 32"])
+        assert r[0].frames[0].can_id == 0x7E8
+
+    for protocol_ in CAN_29_PROTOCOLS:
+        r = protocol_([])(["18 DA F1 10 03 41 0D 32"])
+        assert r[0].frames[0].can_id == 0x18DAF110
+
+
+@pytest.mark.skipif(sys.version_info[0] < 3, reason="frames copy their data on Python 2")
+def test_zero_copy():
+    """ frames are views on their line's buffer, messages own their data """
+
+    p = ISO_15765_4_11bit_500k([])
+    r = p([
+        "7E8 10 14 49 02 01 31 44 34",
+        "7E8 21 47 50 30 30 52 35 35",
+        "7E8 22 42 31 32 33 34 35 36",
+    ])
+    frames = r[0].frames
+    assert isinstance(frames[0].data, memoryview)
+    assert isinstance(r[0].data, bytearray)
+    assert len(r[0].data) == 0x14
+
+    # the frame data is left as it came in
+    assert frames[0].data == bytearray([0x10, 0x14, 0x49, 0x02, 0x01, 0x31, 0x44, 0x34])
+
+
+
+def feed(reassembler, lines):
+    """ feeds lines one by one, returns (line index, Message) of the completed messages """
+    done = []
+    for i, line in enumerate(lines):
+        m = reassembler.feed_line(line.replace(" ", ""))
+        if m is not None:
+            done.append((i, m))
+    return done
+
+
+def test_reassembler():
+    p = ISO_15765_4_11bit_500k(["7E8 06 41 00 BE 3F A8 13"])
+    r = p.reassembler()
+
+    # interleaved answers: the single frame completes before the others
+    lines = [
+        "7E8 10 0E 43 06 01 43 01 96",
+        "7E9 10 0A 43 04 07 01 07 02",
+        "7EA 03 43 00 00",
+        "7E9 21 07 03 07 04 00 00 00",
+        "7E8 21 02 34 02 CD 03 57 0A",
+        "7E8 22 24 00 00 00 00 00 00",
+    ]
+    done = feed(r, lines)
+    assert [(i, m.tx_id) for i, m in done] == [(2, 2), (3, 1), (5, 0)]
+    assert done[2][1].ecu == ECU.ENGINE
+    assert done[1][1].data == bytearray([0x43, 0x04, 0x07, 0x01, 0x07, 0x02, 0x07, 0x03, 0x07, 0x04])
+    assert r.pending() == [] and r.dropped == 0
+
+    # the same messages as parsing everything at once
+    batch = dict((m.tx_id, m) for m in p(lines))
+    for i, m in done:
+        assert (m.ecu, m.data, len(m.frames)) == \
+            (batch[m.tx_id].ecu, batch[m.tx_id].data, len(batch[m.tx_id].frames))
+
+
+def test_reassembler_wrap_around():
+    p = ISO_15765_4_11bit_500k([])
+    r = p.reassembler()
+
+    data = list(range(6 + 7 * 20))
+    lines = ["7E8 10 %02X %s" % (len(data), " ".join("%02X" % b for b in data[:6]))]
+    for n in range(20):
+        chunk = data[6 + 7 * n:13 + 7 * n]
+        lines.append("7E8 %02X %s" % (0x20 | ((n + 1) & 0x0F), " ".join("%02X" % b for b in chunk)))
+
+    done = feed(r, lines)
+    assert len(done) == 1 and done[0][0] == 20
+    assert done[0][1].data == bytearray(data)
+    assert [f.seq_index for f in done[0][1].frames[1:]] == list(range(1, 21))
+
+
+def test_reassembler_errors():
+    p = ISO_15765_4_11bit_500k([])
+    lines = [
+        "7E8 10 14 49 02 01 31 44 34",
+        "7E8 21 47 50 30 30 52 35 35",
+        "7E8 22 42 31 32 33 34 35 36",
+    ]
+
+    # a missing frame abandons the message
+    r = p.reassembler()
+    assert feed(r, [lines[0], lines[2]]) == []
+    assert r.dropped == 1 and r.pending() == []
+
+    # a repeated frame is ignored
+    r = p.reassembler()
+    assert len(feed(r, [lines[0], lines[1], lines[1], lines[2]])) == 1
+    assert r.dropped == 0
+
+    # a consecutive frame on its own
+    r = p.reassembler()
+    assert feed(r, [lines[1]]) == []
+    assert r.dropped == 1
+
+    # an incomplete message, at the end of the response
+    r = p.reassembler()
+    assert feed(r, lines[:2]) == []
+    assert r.pending() == [0]
+    r.reset()
+    assert r.pending() == [] and r.dropped == 1
+
+
 def test_can_29():
     pass
@@ -176,3 +176,24 @@ def test_multi_line_mode_03():
         r = p(test_case)
         assert len(r) == 1
         check_message(r[0], len(test_case), 0x10, correct_data)
+
+
+def test_compact():
+    """
+        Output from an adapter with spaces turned off (ATS0)
+        should parse exactly like the spaced output
+    """
+
+    for protocol_ in LEGACY_PROTOCOLS:
+        p = protocol_([])
+
+        r = p(["486B104100BE3FA813FF"])
+        assert len(r) == 1
+        check_message(r[0], 1, 0x10, [0x41, 0x00, 0xBE, 0x3F, 0xA8, 0x13])
+
+        r = p([
+            "486B10490201000102FF",
+            "486B10490202040506FF",
+        ])
+        assert len(r) == 1
+        check_message(r[0], 2, 0x10, [0x49, 0x02, 0x00, 0x01, 0x02, 0x04, 0x05, 0x06])
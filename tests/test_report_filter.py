@@ -0,0 +1,66 @@
+"""
+    Tests for the report by exception (deadbands and heartbeat) of the OBD supervisor
+"""
+
+import pytest
+
+from conftest import Value
+from report_filter import ReportFilter
+
+
+def test_absolute():
+    f = ReportFilter({"RPM": 100}, heartbeat=0)
+    assert f.report(Value("RPM", 2000), 0.)  # the first value always goes
+    assert not f.report(Value("RPM", 2080), 1.)
+    assert not f.report(Value("RPM", 1900), 2.)  # on the edge of the band
+    assert f.report(Value("RPM", 2101), 3.)
+    assert not f.report(Value("RPM", 2050), 4.)  # from the last value sent
+
+    # the commands not listed have the default: any change
+    assert f.report(Value("SPEED", 50), 0.)
+    assert not f.report(Value("SPEED", 50), 1.)
+    assert f.report(Value("SPEED", 51), 2.)
+
+
+def test_percent():
+    f = ReportFilter({}, "2%", heartbeat=0)
+    assert f.report(Value("COOLANT_TEMP", 90), 0.)
+    assert not f.report(Value("COOLANT_TEMP", 91.5), 1.)
+    assert f.report(Value("COOLANT_TEMP", 92), 2.)
+    assert not f.report(Value("COOLANT_TEMP", 90.2), 3.)  # 2% of 92
+    assert f.report(Value("COOLANT_TEMP", 90), 4.)
+
+
+def test_not_numbers():
+    f = ReportFilter({"STATUS": 100}, heartbeat=0)
+    assert f.report(Value("STATUS", "MIL off", generic_type=1), 0.)
+    assert not f.report(Value("STATUS", "MIL off", generic_type=1), 1.)
+    assert f.report(Value("STATUS", "MIL on", generic_type=1), 2.)
+
+
+def test_heartbeat():
+    f = ReportFilter({"RPM": 100}, heartbeat=10)
+    assert f.report(Value("RPM", 2000), 0.)
+    assert not f.report(Value("RPM", 2000), 9.)
+    assert f.report(Value("RPM", 2000), 10.)  # flat, but not lost
+    assert not f.report(Value("RPM", 2000), 15.)
+
+    f.reset()
+    assert f.report(Value("RPM", 2000), 16.)
+
+
+def test_from_rules():
+    assert ReportFilter.fromRules(None) is None
+    assert ReportFilter.fromRules({"on_period": 1}) is None
+
+    f = ReportFilter.fromRules({"deadbands": {"RPM": 100}, "deadband": None, "heartbeat": None})
+    assert f.report(Value("SPEED", 50), 0.)
+    assert f.report(Value("SPEED", 51), 1.)  # null is no deadband
+    assert f.report(Value("RPM", 2000), 0.)
+    assert not f.report(Value("RPM", 2050), 299.)
+    assert f.report(Value("RPM", 2050), 300.)  # the default heartbeat
+
+    for rules in [{"deadband": "fast"}, {"deadband": -1}, {"deadbands": {"RPM": "x%"}},
+                  {"deadband": 1, "heartbeat": "often"}]:
+        with pytest.raises(ValueError):
+            ReportFilter.fromRules(rules)
@@ -0,0 +1,98 @@
+"""
+    Tests for the event-triggered sampling rules of the OBD supervisor
+"""
+
+import logging
+
+import pytest
+
+import obd
+from conftest import Value
+from sampling_rules import SamplingRules, Trigger, compileCondition
+from vehicle_service import VehicleService
+
+
+def test_condition():
+    c = compileCondition("RPM > 4000")
+    assert c.command == "RPM"
+    assert c({"RPM": (4500, 0.)}, 0.)
+    assert not c({"RPM": (4000, 0.)}, 0.)
+    assert not c({}, 0.)  # not read yet
+    assert compileCondition(" SPEED<=-1.5e1 ")({"SPEED": (-20, 0.)}, 0.)
+
+    for text in ["RPM >> 4000", "RPM > fast", "rate(RPM > 1", "RPM", "> 3", "2 < RPM"]:
+        with pytest.raises(ValueError):
+            compileCondition(text)
+
+
+def test_rate_condition():
+    c = compileCondition("rate(COOLANT_TEMP) > 0.5")
+    assert c.command == "COOLANT_TEMP"
+    assert not c({"COOLANT_TEMP": (80, 0.)}, 0.)  # no rate from a single read
+    assert c({"COOLANT_TEMP": (82, 2.)}, 2.)  # 1 per second
+
+    # a value held over cycles is the same read: the rate stays
+    assert c({"COOLANT_TEMP": (82, 2.)}, 3.)
+    assert c({"COOLANT_TEMP": (82, 2.)}, 4.)
+
+    assert not c({"COOLANT_TEMP": (82, 6.)}, 6.)  # flat since
+    assert compileCondition("rate(COOLANT_TEMP) < 0")({"COOLANT_TEMP": (82, 6.)}, 6.) is False
+
+
+def test_trigger_hold_decay():
+    t = Trigger({"when": "RPM > 4000", "period": 1, "hold": 2}, 10)
+    assert t.evaluate({"RPM": (3000, 0.)}, 0.) is None
+    assert t.evaluate({"RPM": (4500, 1.)}, 1.) == 1
+    assert t.evaluate({"RPM": (3000, 2.)}, 2.) == 1  # held
+    assert t.evaluate({"RPM": (3000, 3.)}, 3.) == 2  # then decays
+    assert t.evaluate({"RPM": (3000, 4.)}, 4.) == 4
+    assert t.evaluate({"RPM": (3000, 5.)}, 5.) == 8
+    assert t.evaluate({"RPM": (3000, 6.)}, 6.) is None  # back to the base period
+    assert t.evaluate({"RPM": (4100, 7.)}, 7.) == 1
+
+    for rule in [{}, {"when": "RPM > 1", "period": 0}, {"when": "RPM > 1", "decay": 1},
+                 {"when": "RPM > 1", "period": "fast"}]:
+        with pytest.raises(ValueError):
+            Trigger(rule, 10)
+
+
+def test_evaluate():
+    rules = SamplingRules([{"when": "RPM > 4000", "period": 1, "commands": ["RPM"]},
+                           {"when": "SPEED > 100", "period": 2}],
+                          10, {"FUEL_LEVEL": 60})
+    assert len(rules) == 2
+
+    period, intervals, default = rules.evaluate([Value("RPM", 3000, 0.)], 0.)
+    assert (period, intervals, default) == (10, {"FUEL_LEVEL": 60}, 0.)
+
+    # only RPM speeds up, the others keep to the base period
+    period, intervals, default = rules.evaluate([Value("RPM", 4500, 1.)], 1.)
+    assert period == 1
+    assert intervals == {"RPM": 0.5, "FUEL_LEVEL": 60}
+    assert default == 9.5
+
+    # everything speeds up
+    period, intervals, default = rules.evaluate([Value("RPM", 3000, 2.), Value("SPEED", 120, 2.)], 2.)
+    assert period == 2  # RPM decaying to 2 s as well
+    assert default == 0.
+    assert intervals == {"RPM": 1, "FUEL_LEVEL": 60}
+
+
+def test_cycle_plan():
+    # the intervals of an active trigger, through to the planner
+    rules = SamplingRules([{"when": "RPM > 4000", "period": 1, "commands": ["RPM"]}], 10)
+    period, intervals, default = rules.evaluate([Value("RPM", 4500, 0.)], 0.)
+
+    vs = VehicleService(logging.getLogger("test"), "0")
+    vs.setCyclePlan(period, intervals, default)
+    planner = vs._planner
+
+    cmds = [obd.commands.RPM, obd.commands.COOLANT_TEMP]
+    for cmd in cmds:
+        planner._last[cmd] = 100.
+    selected, report = planner.plan(cmds, 101.)
+    assert selected == [obd.commands.RPM]
+    assert report.skipped == [obd.commands.COOLANT_TEMP]
+
+    selected, report = planner.plan(cmds, 110.)
+    assert selected == [obd.commands.RPM, obd.commands.COOLANT_TEMP]
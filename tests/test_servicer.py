@@ -0,0 +1,154 @@
+"""
+    Tests for the gRPC servicer, serving several dongles from fake vehicle services
+"""
+
+import time
+
+import pytest
+
+server = pytest.importorskip("vehicle_obd_server")
+
+
+class Parameters(object):
+    """ stands in for the SolidSenseParameters of the gateway """
+
+    values = {"MAC": "00:00:00:00:00:01", "autoconnect": False, "connect_retry": 1, "led": None}
+
+    @classmethod
+    def getParam(cls, name):
+        return cls.values.get(name)
+
+    @classmethod
+    def active_set(cls):
+        return cls.values
+
+
+class Clock(object):
+    """ time for the supervisors, with sleeps cut short """
+
+    @staticmethod
+    def time():
+        return time.time()
+
+    @staticmethod
+    def sleep(seconds):
+        time.sleep(min(seconds, 0.01))
+
+
+class Service(object):
+    """ stands in for a VehicleService, connected to a car with its engine on """
+
+    def __init__(self, number):
+        self.number = number
+        self.engine_on = False
+        self.plugged = True
+        self.connected = False
+        self.reads = 0
+
+    def release(self):
+        pass
+
+    def connect(self, mac):
+        self.connected = self.plugged
+        self.engine_on = self.plugged
+
+    def bound(self):
+        return self.plugged
+
+    def status(self):
+        return (self.connected, self.engine_on)
+
+    def read_data(self):
+        self.reads += 1
+
+    def get_values(self):
+        return []
+
+    def last_error(self):
+        return ""
+
+    def clear_error(self):
+        pass
+
+    def obd_protocol(self):
+        return "ISO 15765-4 (CAN 11/500)"
+
+    def setCyclePlan(self, budget, intervals, default=0.):
+        pass
+
+    def unplug(self):
+        self.plugged = False
+        self.connected = False
+        self.engine_on = False
+
+
+@pytest.fixture
+def servicer(monkeypatch):
+    monkeypatch.setattr(server, "SolidSenseParameters", Parameters)
+    monkeypatch.setattr(server, "time", Clock)
+    services = []
+
+    def factory(n):
+        services.append(Service(n))
+        return services[-1]
+
+    servicer = server.OBD_Servicer(factory)
+    yield servicer
+    # the supervisors give up once their dongle is gone
+    for vs in services:
+        vs.unplug()
+    for supervisor in servicer.select(""):
+        supervisor.join(5.)
+        assert not supervisor.is_alive()
+
+
+def connect(servicer, adapters):
+    return servicer.Connect(server.Start_OBD(adapters=adapters), None)
+
+
+def test_connect(servicer):
+    r = connect(servicer, ["AA", "BB"])
+    assert r.connected and r.engine_on and r.error == ""
+    assert servicer.adapters() == ["AA", "BB"]
+    # each dongle has its own service
+    assert servicer.service("AA") is not servicer.service("BB")
+
+    r = connect(servicer, ["BB"])
+    assert r.adapter == "BB" and r.error == "Attempt to connect while connected"
+
+
+def test_status(servicer):
+    r = servicer.Status(server.OBD_StatusRequest(adapter="BB"), None)
+    assert r.adapter == "BB" and not r.connected and r.state == ""
+
+    connect(servicer, ["AA", "BB"])
+    r = servicer.Status(server.OBD_StatusRequest(adapter="BB"), None)
+    assert r.adapter == "BB" and r.connected and r.engine_on
+    assert r.state == "idle" and list(r.adapters) == ["AA", "BB"]
+
+    # without an adapter, the status is that of the default one
+    r = servicer.Status(server.OBD_StatusRequest(), None)
+    assert r.adapter == "AA" == servicer.default_adapter()
+    assert r.connected and r.protocol == "ISO 15765-4 (CAN 11/500)"
+
+
+def test_stop_one(servicer):
+    connect(servicer, ["AA", "BB"])
+    stream = servicer.Read(server.OBD_cmd(rules='{"on_period": 0.01}'), None)
+    seen = set()
+    while seen != {"AA", "BB"}:
+        seen.add(next(stream).adapter)
+    assert servicer.Status(server.OBD_StatusRequest(adapter="AA"), None).state == "run"
+
+    r = servicer.Stop(server.OBD_cmd(adapter="AA"), None)
+    assert r.adapter == "AA" and r.connected
+    assert servicer.Status(server.OBD_StatusRequest(adapter="AA"), None).state == "idle"
+    assert servicer.Status(server.OBD_StatusRequest(adapter="BB"), None).state == "run"
+
+    # the stream goes on for BB, once AA's queued results are out
+    adapters = [next(stream).adapter for _ in range(30)]
+    assert adapters[-10:] == ["BB"] * 10
+
+    servicer.Stop(server.OBD_cmd(), None)
+    assert all(r.adapter in ("AA", "BB") for r in stream)
+    assert servicer.Status(server.OBD_StatusRequest(adapter="BB"), None).state == "idle"
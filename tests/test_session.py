@@ -0,0 +1,93 @@
+"""
+    Tests for the I/O free parts of a connection, driven without an adapter
+"""
+
+import obd
+from obd.protocols.protocol import Frame, Message
+from obd.session import Handshake, QueryState, Send, Write, Probe, run
+from obd.utils import OBDStatus
+
+
+def script(responses, bauds=()):
+    """ answers a Handshake's requests from a dict, and notes them down """
+    sent = []
+
+    def answer(request):
+        sent.append(request)
+        if isinstance(request, Send):
+            return responses.get(request.cmd, ["OK"])
+        if isinstance(request, Probe):
+            return request.baud in bauds
+        return None
+
+    return sent, answer
+
+
+def test_reset():
+    sent, answer = script({b"ATZ": ["ELM327 v2.1"],
+                           b"AT RV": ["12.5V"],
+                           b"0100": ["7E8 06 41 00 BE 3F A8 13"],
+                           b"ATDPN": ["A6"]})
+    handshake = Handshake("/dev/ttyUSB0")
+    assert run(handshake.reset(), answer)
+    assert handshake.status == OBDStatus.CAR_CONNECTED
+    assert handshake.protocol.ELM_ID == "6"
+    assert [r.cmd for r in sent] == [b"ATZ", b"ATE0", b"ATH1", b"ATL0", b"AT RV",
+                                     b"ATSP0", b"0100", b"ATDPN"]
+    assert sent[0].delay == 1
+
+
+def test_reset_failure():
+    sent, answer = script({b"ATH1": ["ATH1", "OK"]})
+    handshake = Handshake("/dev/ttyUSB0")
+    assert not run(handshake.reset(), answer)
+    assert handshake.status == OBDStatus.NOT_CONNECTED
+    assert "ATH1" in handshake.error
+
+    # no voltage on the socket isn't fatal, the adapter is still there
+    sent, answer = script({b"AT RV": ["0.1V"]})
+    handshake = Handshake("/dev/ttyUSB0")
+    assert run(handshake.reset(), answer)
+    assert handshake.status == OBDStatus.ELM_CONNECTED
+
+
+def test_auto_baudrate():
+    sent, answer = script({}, bauds=[115200])
+    assert run(Handshake("/dev/ttyUSB0").set_baudrate(None), answer)
+    assert [r.baud for r in sent] == [38400, 9600, 230400, 115200]
+
+    # left at a negotiated rate: reset, then found at a boot rate
+    bauds = [500000]
+    sent, answer = script({}, bauds=bauds)
+
+    def reset_answer(request):
+        if isinstance(request, Write):
+            bauds[:] = [38400]  # the reset brings back the boot rate
+        return answer(request)
+
+    assert run(Handshake("/dev/ttyUSB0").set_baudrate(None, [2000000, 500000]), reset_answer)
+    assert isinstance(sent[-2], Write) and sent[-2].cmd == b"ATZ"
+    assert sent[-1].baud == 38400
+
+    # pseudo terminals have no baud rate
+    sent, answer = script({})
+    assert run(Handshake("/dev/pts/3").set_baudrate(None), answer)
+    assert sent == []
+
+
+def test_query_state():
+    state = QueryState()
+    cmd = obd.commands.RPM
+    assert state.command_string(cmd) == b"010C"
+
+    message = Message([Frame(""), Frame("")])
+    state.command_sent(cmd, b"010C", [message])
+    assert state.frame_counts[cmd] == 2
+    assert state.command_string(cmd) == b"010C2"  # waits for 2 frames only
+
+    state.command_sent(cmd, b"010C2", [message])
+    assert state.command_string(cmd) == b""  # repeated by a bare CR
+    assert state.command_string(cmd, fast=False) == b"010C"
+
+    assert state.header_command(obd.protocols.ECU_HEADER.ENGINE) is None
+    assert state.header_command(b"7E1") == b"AT SH 7E1 "
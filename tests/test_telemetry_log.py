@@ -0,0 +1,127 @@
+"""
+    Tests for the columnar telemetry log of the vehicle service, and its reader
+"""
+
+import struct
+
+from conftest import Value
+from telemetry_log import MAGIC, TelemetryLog, TelemetryReader
+
+
+def write(log, cycles):
+    # cycles: [(time, engine_on, [Value, ...]), ...]
+    for t, engine_on, values in cycles:
+        log.append(values, engine_on, t)
+
+
+CYCLES = [
+    (100., True, [Value("RPM", 800, 99.9, "rpm"), Value("STATUS", "MIL off", 99.9, None, 1)]),
+    (101., True, [Value("RPM", 2500, 100.9, "rpm"), Value("STATUS", "MIL off", 99.9, None, 1)]),
+    (102., False, [Value("RPM", 2500, 100.9, "rpm"), Value("STATUS", "MIL on", 101.9, None, 1)]),
+]
+
+
+def test_round_trip(tmp_path):
+    log = TelemetryLog(str(tmp_path), block_rows=2)
+    write(log, CYCLES)
+    log.close()
+
+    [path] = TelemetryReader.files(str(tmp_path))
+    assert TelemetryReader.isLog(path)
+    reader = TelemetryReader(path)
+    assert len(list(reader.blocks())) == 2
+
+    records = list(reader.records())
+    assert [(t, engine_on) for t, engine_on, values in records] == [(100., True), (101., True), (102., False)]
+    assert records[0][2] == {"RPM": (800., "rpm"), "STATUS": ("MIL off", None)}
+    assert records[2][2] == {"RPM": (2500., "rpm"), "STATUS": ("MIL on", None)}
+
+    # a value held over cycles is logged once per read
+    columns = reader.columns()
+    assert list(columns["RPM"].times) == [99.9, 100.9]
+    assert list(columns["RPM"].values) == [800., 2500.]
+    assert columns["RPM"].unit == "rpm"
+    assert columns["STATUS"].values == ["MIL off", "MIL on"]
+    assert list(reader.columns(["STATUS"]).keys()) == ["STATUS"]
+
+
+def block_offsets(path):
+    # where each block starts, and where the file ends
+    with open(path, "rb") as fd:
+        data = fd.read()
+    offsets = [len(MAGIC)]
+    while offsets[-1] < len(data):
+        tag, raw_length, length, crc = struct.unpack_from("<2sIII", data, offsets[-1])
+        offsets.append(offsets[-1] + 14 + length)
+    return offsets
+
+
+def test_truncated(tmp_path):
+    log = TelemetryLog(str(tmp_path), block_rows=1)
+    write(log, CYCLES)
+    log.close()
+    path = log.path
+    offsets = block_offsets(path)
+    assert len(offsets) == 4
+
+    # a crash in the middle of the last block
+    with open(path, "r+b") as fd:
+        fd.truncate(offsets[3] - 5)
+    assert [t for t, engine_on, values in TelemetryReader(path).records()] == [100., 101.]
+
+    # and in the middle of its header
+    with open(path, "r+b") as fd:
+        fd.truncate(offsets[2] + 3)
+    assert [t for t, engine_on, values in TelemetryReader(path).records()] == [100., 101.]
+
+    # a corrupted block stops the reading there
+    with open(path, "r+b") as fd:
+        fd.seek(offsets[2] - 1)
+        last = fd.read(1)
+        fd.seek(offsets[2] - 1)
+        fd.write(bytes([last[0] ^ 0xFF]))
+    assert [t for t, engine_on, values in TelemetryReader(path).records()] == [100.]
+
+    other = tmp_path / "other.tlog"
+    other.write_bytes(b"not a log")
+    assert not TelemetryReader.isLog(str(other))
+    assert not TelemetryReader.isLog(str(tmp_path / "nothing.tlog"))
+
+
+def test_rotation(tmp_path):
+    # every block starts a file, within the same second
+    log = TelemetryLog(str(tmp_path), block_rows=1, max_bytes=1)
+    base = 1000000000.
+    for i in range(4):
+        log.append([Value("RPM", 800 + i, base + i * 0.1, "rpm"), Value("STATUS", "MIL off", base, None, 1)],
+                   True, base + i * 0.1)
+    log.close()
+
+    files = TelemetryReader.files(str(tmp_path))
+    assert len(files) == 4
+    assert files[-1] == log.path
+    # the names sort in time order, and held values are logged again in each file
+    firsts = [next(TelemetryReader(f).records())[2] for f in files]
+    assert [values["RPM"][0] for values in firsts] == [800., 801., 802., 803.]
+    assert all([values["STATUS"] == ("MIL off", None) for values in firsts])
+
+    # a file gets too old
+    log = TelemetryLog(str(tmp_path), prefix="aged", max_age=60.)
+    log.append([], True, base)
+    log.append([], True, base + 30.)
+    log.flush(base + 30.)
+    log.append([], True, base + 61.)
+    log.close()
+    assert len(TelemetryReader.files(str(tmp_path), "aged")) == 2
+
+
+def test_prune(tmp_path):
+    log = TelemetryLog(str(tmp_path), block_rows=1, max_bytes=1, keep=2)
+    base = 1000000000.
+    for i in range(5):
+        log.append([Value("RPM", 800 + i, base + i, "rpm")], True, base + i)
+    log.close()
+
+    files = TelemetryReader.files(str(tmp_path))
+    assert len(files) == 2
+    assert [next(TelemetryReader(f).records())[2]["RPM"][0] for f in files] == [803., 804.]
@@ -0,0 +1,55 @@
+import sys
+import time
+
+import pytest
+
+import obd.utils
+from obd.utils import scan_serial, BitArray
+
+
+def test_bitarray():
+    bits = BitArray(bytearray([0xF0, 0x0A]))
+    assert str(bits) == bits.bits == "1111000000001010"
+    assert len(bits) == 16
+    assert bits[0] and bits[3] and not bits[4] and bits[14]
+    assert not bits[-1] and not bits[16]  # out of range
+    assert bits[2:6] == [True, True, False, False]
+    assert bits[12:] == [True, False, True, False]
+    assert bits[::4] == [True, False, False, True]
+    assert bits[20:] == []
+    assert list(bits)[-4:] == [True, False, True, False]
+    assert bits.value(0, 4) == 0xF
+    assert bits.value(4, 16) == 0x00A
+    assert bits.value(-4, None) == 0xA
+    assert bits.value(6, 6) == 0
+    assert (bits.num_set(), bits.num_cleared()) == (6, 10)
+
+    empty = BitArray(b"")
+    assert str(empty) == "" and len(empty) == 0 and list(empty) == []
+    assert empty.num_set() == 0 and empty.value(0, 8) == 0
+
+
+def test_isHex():
+    for hex in ("", "0123456789abcdefABCDEF", "7E8"):
+        assert obd.utils.isHex(hex)
+        assert obd.utils.isHex(hex.encode())
+    for other in ("7E8 01", "NO DATA", "G", "SEARCHING..."):
+        assert not obd.utils.isHex(other)
+        assert not obd.utils.isHex(other.encode())
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="linux port names")
+def test_scan_serial_parallel(monkeypatch):
+    ports = ["/dev/rfcomm%d" % i for i in range(8)]
+    monkeypatch.setattr(obd.utils.glob, "glob",
+                        lambda pattern: ports if "rfcomm" in pattern else [])
+
+    def try_port(port):
+        time.sleep(0.2)  # a slow bluetooth connection
+        return port[-1] in "136"
+
+    monkeypatch.setattr(obd.utils, "try_port", try_port)
+
+    t = time.time()
+    assert scan_serial() == ["/dev/rfcomm1", "/dev/rfcomm3", "/dev/rfcomm6"]
+    assert time.time() - t < 0.2 * len(ports) / 2
@@ -30,6 +30,9 @@ from solidsense_parameters import *
 from solidsense_led import *
 from vehicle_service import *
 from simulator import *
+from sampling_rules import SamplingRules
+from report_filter import ReportFilter
+from aggregation import WindowAggregator
 
 import grpc
 from OBD_Service_pb2  import *
@@ -43,15 +46,38 @@ state_CONNECTED=2
 state_ENGINE_ON=3
 
 
-def buildResponse(vs):
+def buildResponse(vs,adapter,report_filter=None,aggregator=None,stats=None):
     r= OBD_Result()
+    r.adapter=adapter
     r.connected=True
     r.engine_on=vs.engine_on
     r.obd_time=datetime.datetime.now().isoformat(' ')
     r.error=vs.last_error()
     vs.clear_error()
+    if stats != None :
+        for name,acc in stats:
+            s=r.stats.add()
+            s.cmd=name
+            if acc.unit != None :
+                s.unit=acc.unit
+            s.count=acc.count
+            s.min=acc.min
+            s.max=acc.max
+            s.mean=acc.mean
+            s.variance=acc.variance
+            for level,value in acc.quantiles():
+                q=s.quantiles.add()
+                q.level=level
+                q.value=value
+            s.window=aggregator.duration
+    # when aggregating, the values go (if asked for) with the statistics only
+    if aggregator != None and (stats == None or not aggregator.values) :
+        return r
     if r.engine_on :
+        now=time.time()
         for c in vs.get_values():
+            if report_filter != None and not report_filter.report(c,now) :
+                continue
             v=r.values.add()
             v.cmd=c._cmd
             v.type=c._genericType
@@ -76,6 +102,12 @@ class OBD_Supervisor(threading.Thread):
         self._connect_retry = SolidSenseParameters.active_set().get('connect_retry')
         self._on_period=10.
         self._off_period=30.
+        self._period=self._on_period    # of the next cycle, shortened by the triggers
+        self._rules=None
+        self._cycle_budget=None
+        self._report_filter=None
+        self._aggregator=None
+        self._last_sent=None        # (connected, engine_on) of the last response queued
         lednum= SolidSenseParameters.active_set().get('led')
         if lednum != None:
             self.led=SolidSenseLed.ledref(lednum)
@@ -85,28 +117,37 @@ class OBD_Supervisor(threading.Thread):
     def run(self):
         self._state=state_ACTIVE
         self._connect_lock.acquire()
-        # release all rfcomm bound connections
-        self._vs.release()
+        # release our rfcomm bound connection
+        if not self._mac.startswith('/dev/') :
+            self._vs.release()
         nb_retries = 0
         while True:
             c_stat,e_stat=self._vs.status()
             if c_stat :
                 if self._running_read :
+                    cycle_start=time.time()
                     if self.led != None : self.led.green_only(255)
                     try:
                         self._vs.read_data()
                     except VehicleOBDException :
                         pass
-                    r= buildResponse(self._vs)
+                    if self._last_sent != None and not self._last_sent[1] and self._vs.engine_on :
+                        # the engine restarted
+                        self.restart_reports()
+                    stats=self.aggregate()
+                    r= buildResponse(self._vs,self._mac,self._report_filter,self._aggregator,stats)
                     if self.led != None : self.led.off()
-                    try:
-                        self._queue.put(r,timeout=30.)
-                    except queue.Full :
-                        loc_log.error("Vehicle service OBD queue full")
-                        # stop reading
-                        self._running_read = False
-                        # return
-                    time.sleep(self._on_period) # adjustable
+                    if self.to_send(r) :
+                        try:
+                            self._queue.put(r,timeout=30.)
+                        except queue.Full :
+                            loc_log.error("Vehicle service OBD queue full")
+                            # stop reading
+                            self._running_read = False
+                            # return
+                    self.apply_rules()
+                    # the period runs from the start of the cycle
+                    time.sleep(max(self._period-(time.time()-cycle_start),0.))
                 else:
                     time.sleep(10.)
             else:
@@ -124,6 +165,7 @@ class OBD_Supervisor(threading.Thread):
                     if not c_stat:
                         # push a response
                         r= OBD_Result()
+                        r.adapter=self._mac
                         r.connected=False
                         r.engine_on=False
                         r.obd_time=datetime.datetime.now().isoformat(' ')
@@ -138,18 +180,83 @@ class OBD_Supervisor(threading.Thread):
                         time.sleep(self._off_period)
                     else:
                         nb_retries=0
+                        self.restart_reports()
                 else:
                     # no bind possible on MAC nothing else to do
                     return
 
 
     def start_read(self,param):
-        self._running_read=True
         if param != None :
             if param.get('on_period') != None :
                 self._on_period =  param.get('on_period')
             if param.get('off_period') != None :
-                self._on_period =  param.get('off_period')
+                self._off_period =  param.get('off_period')
+            self._cycle_budget=param.get('cycle_budget')
+            try:
+                self._rules=SamplingRules(param.get('triggers'),self._on_period,param.get('min_intervals'))
+            except (ValueError,TypeError,AttributeError) as err :
+                loc_log.error("Vehicle service - Read request wrong triggers:"+str(err))
+                self._rules=SamplingRules(None,self._on_period,param.get('min_intervals'))
+            try:
+                self._report_filter=ReportFilter.fromRules(param)
+            except ValueError as err :
+                loc_log.error("Vehicle service - Read request wrong deadbands:"+str(err))
+                self._report_filter=None
+            try:
+                self._aggregator=WindowAggregator.fromRules(param)
+            except ValueError as err :
+                loc_log.error("Vehicle service - Read request wrong aggregation:"+str(err))
+                self._aggregator=None
+        else:
+            self._rules=None
+            self._cycle_budget=None
+            self._report_filter=None
+            self._aggregator=None
+        self._last_sent=None
+        self._period=self._on_period
+        if self._rules != None :
+            self.set_cycle_plan(self._rules.min_intervals)
+        else:
+            self.set_cycle_plan({})
+        self._running_read=True
+
+    def aggregate(self):
+        # the window's statistics, when it is over or the engine stopped
+        if self._aggregator == None : return None
+        now=time.time()
+        self._aggregator.add(self._vs.get_values(),now)
+        engine_stopped= self._last_sent != None and self._last_sent[1] and not self._vs.engine_on
+        if self._aggregator.due(now) or engine_stopped :
+            return self._aggregator.flush(now)
+        return None
+
+    def to_send(self,r):
+        # with report by exception or aggregation, a response with nothing new is dropped
+        state=(r.connected,r.engine_on)
+        if (self._report_filter != None or self._aggregator != None) and state == self._last_sent and \
+                len(r.values) == 0 and len(r.stats) == 0 and r.error == "" :
+            return False
+        self._last_sent=state
+        return True
+
+    def restart_reports(self):
+        # after a reconnection or an engine restart, the values sent before are stale
+        if self._report_filter != None :
+            self._report_filter.reset()
+
+    def apply_rules(self):
+        # the triggers set the next cycle's period, and what it reads
+        if self._rules == None : return
+        self._period,intervals,default=self._rules.evaluate(self._vs.get_values(),time.time())
+        self.set_cycle_plan(intervals,default)
+
+    def set_cycle_plan(self,intervals,default=0.):
+        # the reads of a cycle have to fit in its period, unless told otherwise
+        budget=self._cycle_budget
+        if budget == None :
+            budget=self._period
+        self._vs.setCyclePlan(budget,intervals,default)
 
     def stop_read(self):
         self._running_read=False
@@ -160,67 +267,150 @@ class OBD_Supervisor(threading.Thread):
 
 
 class OBD_Servicer(OBD_Service_pb2_grpc.OBD_ServiceServicer):
+    '''
+    Serves any number of OBD dongles, each with its own VehicleService
+    and supervision thread (connection state machine and response queue).
+    Dongles are keyed by MAC address, or serial port for wired ones.
+    '''
 
-    def __init__(self,vehicle):
+    def __init__(self,factory):
         self._state=state_UNKNOWN
-        self._supervisor=None
-        self._vs=vehicle
+        self._factory=factory   # rfcomm device number -> VehicleService
+        self._services={}       # adapter -> VehicleService
+        self._supervisors={}    # adapter -> OBD_Supervisor
+        # the requests are served by a pool of threads: _services and
+        # _supervisors are only changed, or walked through, under this lock
+        self._lock=threading.Lock()
         self._stop_flag=False
         self._MAC=SolidSenseParameters.getParam("MAC")
 
+    def service(self,adapter):
+        with self._lock :
+            return self._service(adapter)
+
+    def _service(self,adapter):
+        # the same VehicleService (and rfcomm device) is kept across reconnections
+        # called with the lock held
+        try:
+            return self._services[adapter]
+        except KeyError :
+            vs=self._factory(len(self._services))
+            self._services[adapter]=vs
+            return vs
+
+    def lookup(self,adapter):
+        # the VehicleService and supervisor of an adapter, None if it has none
+        with self._lock :
+            return self._services.get(adapter),self._supervisors.get(adapter)
+
+    def running(self,adapters):
+        # (adapter,VehicleService) of those with a live supervisor, in one go
+        with self._lock :
+            return [(a,self._services[a]) for a in adapters
+                    if a in self._supervisors and self._supervisors[a].is_alive()]
+
+    def select(self,adapter):
+        # the supervisors a request is for: the given adapter, or all of them
+        with self._lock :
+            if adapter != "" :
+                sup=self._supervisors.get(adapter)
+                if sup == None : return []
+                return [sup]
+            return list(self._supervisors.values())
+
+    def adapters(self):
+        with self._lock :
+            return sorted(self._services)
+
+    def default_adapter(self):
+        with self._lock :
+            if self._MAC in self._services or len(self._services) == 0 :
+                return self._MAC
+            return sorted(self._services)[0]
+
+    def autoconnect_adapters(self):
+        adapters=SolidSenseParameters.getParam('adapters')
+        if adapters :
+            return list(adapters)
+        return [self._MAC]
 
     def Status(self,request,context):
         loc_log.debug('Vehicle service gRPC - Status request')
         res=OBD_status()
-        res.connected, res.engine_on = self._vs.status()
-        # res.error=self._vs.last_error()
+        adapter=request.adapter or self.default_adapter()
+        res.adapter=adapter
+        res.adapters.extend(self.adapters())
+        vs,supervisor=self.lookup(adapter)
+        if vs != None :
+            res.connected, res.engine_on = vs.status()
+        # res.error=vs.last_error()
         res.autoconnect = SolidSenseParameters.getParam('autoconnect')
         if res.autoconnect :
             res.MAC=self._MAC
         if res.connected :
-            res.protocol=self._vs.obd_protocol()
-            if self._supervisor != None and  self._supervisor.is_alive() :
-                if self._supervisor._running_read:
+            res.protocol=vs.obd_protocol()
+            if supervisor != None and  supervisor.is_alive() :
+                if supervisor._running_read:
                     res.state="run"
                 else:
                     res.state="idle"
             else:
                 res.state="inactive"
             if request.request == "vehicle_cmds" :
-                res.commands=self._vs.getAllCmdsList()
+                res.commands=vs.getAllCmdsList()
             elif request.request == "actual_cmds"  :
-                res.commands=self._vs.getActualCmdsList()
+                res.commands=vs.getActualCmdsList()
         return res
 
     def Connect(self,request,context):
         loc_log.debug("Vehicle Service gRPC - CONNECT request")
-        if self._supervisor != None :
-            # first check if the Thread is running if yes, this is an eoor, if not
-            if self._supervisor.is_alive() :
-                loc_log.error("Vehicle Service gRPC - Already connected")
-                res=OBD_Result()
-                res.connected, res.engine_on = self._vs.status()
-                res.error="Attempt to connect while connected"
-                return res
-        self.start_connection(request.MAC)
+        adapters=list(request.adapters)
+        if len(adapters) == 0 :
+            adapters=[request.MAC]
+        running=self.running(adapters)
+        if len(running) > 0 :
+            loc_log.error("Vehicle Service gRPC - Already connected:"+",".join(a for a,vs in running))
+            res=OBD_Result()
+            res.adapter,vs=running[0]
+            res.connected, res.engine_on = vs.status()
+            res.error="Attempt to connect while connected"
+            return res
+        self.start_connections(adapters)
         res=OBD_Result()
-        res.connected, res.engine_on = self._vs.status()
-        res.error=self._vs.last_error()
-        if res.error == "" :
-            self._MAC=request.MAC
+        errors=[]
+        res.connected=True
+        res.engine_on=True
+        for adapter in adapters :
+            vs=self.service(adapter)
+            connected,engine_on=vs.status()
+            res.connected = res.connected and connected
+            res.engine_on = res.engine_on and engine_on
+            if vs.last_error() != "" :
+                errors.append(vs.last_error())
+        if len(adapters) == 1 :
+            res.adapter=adapters[0]
+            res.error="".join(errors)
+            if res.error == "" :
+                self._MAC=adapters[0]
+        else:
+            res.error="\n".join(errors)
         res.obd_time=datetime.datetime.now().isoformat(' ')
         return res
 
 
     def Read(self,request,context):
         loc_log.debug("Vehicle service gRPC - READ request")
-        if self._supervisor == None or not self._supervisor.is_alive() :
+        supervisors=[s for s in self.select(request.adapter) if s.is_alive()]
+        if len(supervisors) == 0 :
             # We are not ready no active connection to OBD
             if SolidSenseParameters.getParam('autoconnect') and self._MAC != None :
-                loc_log.info("Performing auto connection on:"+self._MAC)
-                self.start_connection(self._MAC)
+                adapters=[request.adapter] if request.adapter != "" else self.autoconnect_adapters()
+                loc_log.info("Performing auto connection on:"+",".join(adapters))
+                self.start_connections(adapters)
+                supervisors=self.select(request.adapter)
             else:
                 res=OBD_Result()
+                res.adapter=request.adapter
                 res.error="Attempt to read an un-activated OBD connection"
                 loc_log.error(res.error)
                 res.connected=False
@@ -238,60 +428,99 @@ class OBD_Servicer(OBD_Service_pb2_grpc.OBD_ServiceServicer):
             if request.commands != None and type(request.commands) == str:
                 commands=request.commands.split(',')
                 if len(commands) > 0 :
-                    self._vs.setRequestCommands(commands)
-                    loc_log.info("Vehicle service number of actual commands:"+str(self._vs.actualCmdsNum()))
+                    for supervisor in supervisors :
+                        supervisor._vs.setRequestCommands(commands)
+                        loc_log.info("Vehicle service number of actual commands:"+str(supervisor._vs.actualCmdsNum()))
 
-        self._supervisor.start_read(rules)
+        for supervisor in supervisors :
+            supervisor.start_read(rules)
         self._stop_flag=False
         while True:
-            if not self._supervisor.is_alive() :
-                # the supervision thread is dead
+            alive=[s for s in supervisors if s.is_alive()]
+            if len(alive) == 0 :
+                # the supervision threads are dead
                 # no connection to vehicle possible
                 loc_log.error("OBD supervision stopped => stop reading")
                 return
             if self._stop_flag :
-                # empty the queue
-                # to be done
+                # empty the queues
                 loc_log.debug("Stop vehicle read flag detected")
-                self._supervisor.stop_read()
-                while not self._queue.empty() :
-                    resp=self.__queue.get()
-                    yield resp
-                    self._queue.task_done()
-                loc_log.debug("Response queue is now empty")
+                for supervisor in supervisors :
+                    supervisor.stop_read()
+                    while not supervisor._queue.empty() :
+                        resp=supervisor._queue.get()
+                        yield resp
+                        supervisor._queue.task_done()
+                loc_log.debug("Response queues are now empty")
                 if self._stop_flag:
                     return
-            else:
+            elif len(alive) == 1 :
                 try:
-                    resp=self._queue.get(timeout=5.)
+                    resp=alive[0]._queue.get(timeout=5.)
                     loc_log.debug("Vehicle publish with:"+resp.error)
                     yield resp
-                    self._queue.task_done()
+                    alive[0]._queue.task_done()
                 except queue.Empty :
                     pass
+            else:
+                # each dongle has its own queue, so a stalled one can't hold up the others
+                published=False
+                for supervisor in alive :
+                    try:
+                        resp=supervisor._queue.get_nowait()
+                    except queue.Empty :
+                        continue
+                    loc_log.debug("Vehicle publish "+resp.adapter+" with:"+resp.error)
+                    yield resp
+                    supervisor._queue.task_done()
+                    published=True
+                if not published :
+                    time.sleep(0.1)
 
 
 
     def Stop(self,request,context):
         loc_log.debug("Vehicle service gRPC - STOP READ request")
-        self._stop_flag=True
         res=OBD_Result()
-        res.connected, res.engine_on = self._vs.status()
-        res.error=self._vs.last_error()
+        if request.adapter != "" :
+            # stop that one only, the stream goes on for the others
+            vs,supervisor=self.lookup(request.adapter)
+            if supervisor != None :
+                supervisor.stop_read()
+            adapter=request.adapter
+        else:
+            self._stop_flag=True
+            adapter=self.default_adapter()
+            vs,supervisor=self.lookup(adapter)
+        res.adapter=adapter
+        if vs != None :
+            res.connected, res.engine_on = vs.status()
+            res.error=vs.last_error()
         res.obd_time=datetime.datetime.now().isoformat(' ')
         return res
 
-    def start_connection(self,MAC):
-        self._queue=queue.Queue(10)
-        self._supervisor=OBD_Supervisor(self._vs,MAC,self._queue)
-        self._supervisor.start()
-        self._supervisor.wait()
+    def start_connections(self,adapters):
+        # all the supervisors are started before waiting on any of them,
+        # so that the discoveries (rfcomm binding, ELM initialization) run in parallel
+        started=[]
+        with self._lock :
+            for adapter in adapters :
+                supervisor=self._supervisors.get(adapter)
+                if supervisor != None and supervisor.is_alive() :
+                    # started by a concurrent request
+                    continue
+                supervisor=OBD_Supervisor(self._service(adapter),adapter,queue.Queue(10))
+                self._supervisors[adapter]=supervisor
+                supervisor.start()
+                started.append(supervisor)
+        for supervisor in started :
+            supervisor.wait()
 
 class Vehicle_GRPC_Service():
 
-    def __init__(self,vehicle):
+    def __init__(self,factory):
         self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-        OBD_Service_pb2_grpc.add_OBD_ServiceServicer_to_server(OBD_Servicer(vehicle),self._server)
+        OBD_Service_pb2_grpc.add_OBD_ServiceServicer_to_server(OBD_Servicer(factory),self._server)
         self._endEvent=threading.Event()
         l_address = SolidSenseParameters.active_set().get('address')
         port=SolidSenseParameters.active_set().get('port')
@@ -324,7 +553,8 @@ default_parameters= {
             "interface": "hci0",
             "obd_trace": "info",
             "autoconnect": True,
-            "MAC": "00:01:02:03:04:05"
+            "MAC": "00:01:02:03:04:05",
+            "adapters": []      # several dongles (MAC or serial port) to autoconnect, instead of MAC
             }
 
 def main():
@@ -359,13 +589,14 @@ def main():
     log_obd.setLevel(obd_trace_level)
 
     print("Creating the service")
+    # one vehicle service per dongle, each on its own rfcomm device
     if simul:
-        vs=VehicleSimulator(log_vs,file)
+        factory=lambda n: VehicleSimulator(log_vs,file)
     else:
         interface=param.get('interface','hci0')[3:4]
-        vs=VehicleService(log_vs,interface)
+        factory=lambda n: VehicleService(log_vs,interface,int(interface)+n)
 
-    grpc_server=Vehicle_GRPC_Service(vs)
+    grpc_server=Vehicle_GRPC_Service(factory)
     grpc_server.start()
 
     try:
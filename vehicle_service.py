@@ -9,7 +9,6 @@
 # Copyright:   (c) Laurent Carre - Sterwen Technology / Solid Run 2019
 # Licence:     <your licence>
 #-------------------------------------------------------------------------------
-import datetime
 import time
 import sys
 import json
@@ -22,9 +21,14 @@ import logging
 import serial
 import threading
 
+from telemetry_log import TelemetryLog
+
 
 loc_log=logging.getLogger("VehicleService")
 
+PROFILE_DIR="/data/solidsense/vehicle"
+LOG_DIR="/data/solidsense/obd_log"
+
 class VehicleOBDException (Exception) :
     pass
 
@@ -56,13 +60,138 @@ def  OBDCmdList(cmds):
     return out
 
 
+class CycleReport():
+    '''
+    What an acquisition cycle read, and what it had to leave out
+    '''
+
+    def __init__(self,budget):
+        self.budget=budget      # seconds, None when unlimited
+        self.read=[]            # commands read this cycle
+        self.deferred=[]        # due, but over the budget: first in line next cycle
+        self.skipped=[]         # not due yet (minimum interval)
+        self.elapsed=0.
+        self.estimate=0.        # what the planner expected the reads to cost
+
+    @property
+    def overrun(self):
+        return self.budget is not None and self.elapsed > self.budget
+
+    def __str__(self):
+        out="read %d in %.3fs" % (len(self.read),self.elapsed)
+        if self.budget is not None:
+            out += " (budget %.3fs%s)" % (self.budget," OVERRUN" if self.overrun else "")
+        if len(self.deferred) > 0:
+            out += " deferred:"+OBDCmdList(self.deferred)
+        return out
+
+
+class AcquisitionPlanner():
+    '''
+    Picks the commands read on each acquisition cycle so that the cycle
+    fits its time budget (the target period), rather than overrunning it.
+    Each command may also have a minimum interval between reads.
+
+    The cost of each command is learned from the round trips: the responses
+    returned by query_many() are timestamped as they complete, and the
+    commands packed into one request share its cost.
+    Due commands are taken most overdue first while they fit; the others
+    are deferred, and so come first next time. The most overdue command
+    is always read, so that nothing starves when the budget is too short,
+    and so is a command never read yet, to measure it.
+    '''
+
+    DEFAULT_COST=0.1        # seconds, until a command has been measured
+    SMOOTHING=0.3           # weight of the latest measure in the learned cost
+    PACKED_GAP=0.002        # responses completing closer than this came in one request
+
+    def __init__(self,budget=None,min_intervals=None):
+        self.budget=budget
+        self.min_intervals=min_intervals or {}  # {command name: seconds}
+        self.default_interval=0.                # for the commands not listed
+        self._cost={}   # {OBDCommand: seconds per read}
+        self._last={}   # {OBDCommand: time of the last read}
+
+    def cost(self,cmd):
+        if cmd in self._cost:
+            return self._cost[cmd]
+        if len(self._cost) > 0:
+            return sum(self._cost.values())/len(self._cost)
+        return self.DEFAULT_COST
+
+    def plan(self,cmds,now,first=None):
+        '''
+        returns the commands to read this cycle, and its CycleReport
+        first is read on every cycle, ahead of the others (the engine check)
+        '''
+        report=CycleReport(self.budget)
+        due=[]
+        for cmd in cmds:
+            if cmd == first : continue
+            interval=self.min_intervals.get(cmd.name,self.default_interval)
+            last=self._last.get(cmd)
+            if last is None:
+                due.append((float('inf'),cmd))
+            elif now-last >= interval:
+                due.append((now-last-interval,cmd))
+            else:
+                report.skipped.append(cmd)
+        # most overdue first, request order otherwise
+        due.sort(key=lambda d: -d[0])
+
+        selected=[] if first is None else [first]
+        spent=sum([self.cost(c) for c in selected])
+        for i,(lateness,cmd) in enumerate(due):
+            c=self.cost(cmd)
+            if self.budget is None or spent+c <= self.budget or i == 0 or lateness == float('inf'):
+                selected.append(cmd)
+                spent += c
+            else:
+                report.deferred.append(cmd)
+        report.read=selected
+        report.estimate=spent
+        return selected,report
+
+    def record(self,cmds,responses,start,report=None):
+        '''
+        learns the cost of each command from the completion times of its
+        response, queried from start on
+        '''
+        done=sorted(zip([r.time for r in responses],range(len(cmds))))
+        previous=start
+        group=[]
+        for i,(t,index) in enumerate(done):
+            group.append(index)
+            nxt=done[i+1][0] if i+1 < len(done) else None
+            if nxt is not None and nxt-t < self.PACKED_GAP:
+                continue
+            # the round trip ending here was shared by the group
+            share=max(t-previous,0.)/len(group)
+            for n in group:
+                cmd=cmds[n]
+                if cmd in self._cost:
+                    self._cost[cmd] += self.SMOOTHING*(share-self._cost[cmd])
+                else:
+                    self._cost[cmd]=share
+                self._last[cmd]=t
+            previous=t
+            group=[]
+        if report is not None:
+            report.elapsed=time.time()-start
+
+
 class VehicleService(object):
 
-    def __init__(self, logger, interface):
+    def __init__(self, logger, interface, device=None):
 
 
         self._logger = logger
         self.INTERFACE = interface
+        # rfcomm device number, one per adapter when several are managed
+        if device is None :
+            self.DEVICE = interface
+        else:
+            self.DEVICE = str(device)
         self._connected=False
         self.engine_on=False
         self._actual_commands=None
@@ -71,6 +200,11 @@ class VehicleService(object):
         self._error=""
         self._bound=False
         self._all_cmds=None
+        self._profiles=obd.ProfileStore(PROFILE_DIR)
+        self._vin=None
+        self._save_profile=False
+        self._planner=AcquisitionPlanner()
+        self._cycle_report=None
 
         self.values={}
         #
@@ -119,6 +253,20 @@ class VehicleService(object):
     def actualCmdsNum(self):
         return len(self._request_commands)
 
+    def setCyclePlan(self,budget=None,min_intervals=None,default_interval=0.):
+        '''
+        budget: seconds an acquisition cycle may spend reading (the target period)
+        min_intervals: {command name: seconds} between reads of a command
+        default_interval: seconds between reads of the commands not listed
+        '''
+        self._planner.budget=budget
+        if min_intervals is not None:
+            self._planner.min_intervals=dict(min_intervals)
+        self._planner.default_interval=default_interval
+
+    def cycle_report(self):
+        return self._cycle_report
+
     def clear_error(self):
         self._error=""
 
@@ -126,7 +274,15 @@ class VehicleService(object):
         '''
         Initiate the Bluetooth connection via rfcomm bind
         and connect to the OBD device
+        Wired adapters are given by their serial port instead (ie: /dev/ttyUSB0)
         '''
+        if MAC.startswith('/dev/') :
+            self.MAC_ADDRESS=MAC
+            self._port=MAC
+            self._bound=True
+            self._logger.info('VEHICLE_SERVICE: Starting on port:' + self._port)
+            return self.connectToOBD()
+
         self.MAC_ADDRESS=MAC.upper()
         if not self.checkMAC() :
             self.bind()
@@ -141,34 +297,34 @@ class VehicleService(object):
 
     def checkMAC(self):
         # check if the MAC address is already bound with rfcomm
+        # other adapters of the same gateway have their own devices
         res=subprocess.Popen("rfcomm",stdout=subprocess.PIPE)
-        val=res.stdout.readline().decode('utf-8')
-        self._logger.debug("rfcomm returned values: "+val)
-        if len(val) > 0 :
+        self._bound=False
+        for line in res.stdout.readlines():
+            val=line.decode('utf-8')
+            self._logger.debug("rfcomm returned values: "+val)
             v=val.split()
-        #print (v)
-            if self.MAC_ADDRESS !=v[1] :
-               self.release()
-               self._bound=False
-               return False
-            self._port='/dev/'+v[0].rstrip(':')
-            self._bound=True
-            return True
-        else:
-            self._bound=False
-            return False
+            if len(v) < 2 : continue
+            dev=v[0].rstrip(':')
+            if self.MAC_ADDRESS == v[1] :
+                self._port='/dev/'+dev
+                self._bound=True
+            elif dev == 'rfcomm'+self.DEVICE :
+                # our device is bound to another dongle
+                self.release()
+        return self._bound
 
 
     def bind(self):
         self._logger.debug("Binding address:"+self.MAC_ADDRESS)
-        res=subprocess.Popen(["rfcomm","bind",self.INTERFACE,self.MAC_ADDRESS],stderr=subprocess.PIPE)
+        res=subprocess.Popen(["rfcomm","bind",self.DEVICE,self.MAC_ADDRESS],stderr=subprocess.PIPE)
 
     def bound(self):
         return self._bound
 
     def release(self):
-        self._logger.debug("Releasing all Bluetooth bound devices")
-        res=subprocess.Popen(["rfcomm","release","all"])
+        self._logger.debug("Releasing Bluetooth bound device rfcomm"+self.DEVICE)
+        res=subprocess.Popen(["rfcomm","release",self.DEVICE])
 
 
     def connectToOBD(self):
@@ -177,8 +333,13 @@ class VehicleService(object):
         self._connected=False
 
             # print ("OBD serial port:",port)
+        # what we learned last time about this adapter lets us skip discovery
+        profile=self._profiles.load(self.MAC_ADDRESS)
+        if profile is not None:
+            self._logger.info('VEHICLE_SERVICE: using '+str(profile))
         try:
-            self.odb_connection = obd.OBD(portstr=self._port)
+            # compact responses: a third fewer bytes over rfcomm
+            self.odb_connection = obd.OBD(portstr=self._port,profile=profile,compact=True)
         except Exception as err:
             self._error="Cannot connect to OBD:"+str(err)
             self._logger.error(self._error)
@@ -193,6 +354,12 @@ class VehicleService(object):
             # self._logger.debug("OBD connection:"+self._obd_status+' protocol ' + self.odb_connection.protocol_name())
             self._error= 'CONNECTED! Protocol '+self.odb_connection.protocol_name()+' #CMDS:'+str(len(self._all_cmds))
             self._logger.info('VEHICLE_SERVICE: '+self._error)
+            if self.odb_connection.interface.from_profile():
+                self._vin=profile.vin
+            else:
+                self._vin=self._read_odb(obd.commands.VIN)
+            # saved after the first read, to include the frame counts
+            self._save_profile=True
             self.read_elm327()
             self.engine_on=True
             return True
@@ -228,46 +395,33 @@ class VehicleService(object):
     def retryConnect(self):
         if self._connected :
             self.disconnect()
-        if self.connectToOBD() :
-            self.checkEngine()
-        else:
-            return False
-
-    def checkEngine(self):
-        '''
-        Check if the engine is running while connected
-        '''
-        if self._connected :
-
-            tmp_speed = self._read_odb(obd.commands.SPEED)
-
-            if tmp_speed is None:
-            # maybe we have lost connection
-                self._obd_status=self.odb_connection.status()
-                self._status =  self._obd_status
-                self.engine_on = False
-                self._logger.debug('VEHICLE_SERVICE: Engine not running - Status:'+self._obd_status)
-                self.disconnect()
-                return False
-            else:
-                self.engine_on = True
-                return True
-        else:
-            return False
+        # the engine is checked by the SPEED read that starts each cycle
+        return self.connectToOBD()
 
     def _read_odb(self,cmd):
         # actual read to odb
         try:
             res = self.odb_connection.query(cmd).value
         except serial.SerialException as err :
-            self._error='VEHICLE SERVICE: OBD Communication error:'+str(err)
-            self._logger.error(self._error)
-            self._status = 'OBD Disconnected'
-            self.engine_on = False
-            self.disconnect()
-            raise VehicleOBDException(self._error)
+            self._obd_error(err)
         return res
 
+    def _read_odb_many(self,cmds):
+        # packed read to odb, one response per command
+        try:
+            res = self.odb_connection.query_many(cmds)
+        except serial.SerialException as err :
+            self._obd_error(err)
+        return res
+
+    def _obd_error(self,err):
+        self._error='VEHICLE SERVICE: OBD Communication error:'+str(err)
+        self._logger.error(self._error)
+        self._status = 'OBD Disconnected'
+        self.engine_on = False
+        self.disconnect()
+        raise VehicleOBDException(self._error)
+
     def read_data(self):
 
         self._logger.debug('VEHICLE_SERVICE: reading OBD data')
@@ -278,28 +432,54 @@ class VehicleService(object):
             self.engine_on = False
             self._logger.debug('VEHICLE_SERVICE: No OBD connection, engine off?')
             return False
-        if not self.checkEngine() :
-            return False
         #
-        # if we are here let's go for the reading
+        # SPEED is read on its own ahead of the others, and tells if the engine runs:
+        # when it doesn't, the rest of the cycle is not queried
         #
-        self.nbc_read=1
-        for cmd in self._request_commands:
-
-            res=self._read_odb(cmd)  # exception is raised if problems lies below
+        cmds,report=self._planner.plan(self._request_commands,time.time(),first=obd.commands.SPEED)
+        start=time.time()
+        results=self._read_odb_many(cmds[:1])  # exception is raised if problems lies below
+        if not results[0].is_null() and len(cmds) > 1 :
+            results += self._read_odb_many(cmds[1:])
+        else:
+            cmds=report.read=cmds[:1]
+        self._planner.record(cmds,results,start,report)
+        self._cycle_report=report
+        if results[0].is_null():
+            # maybe we have lost connection
+            self._obd_status=self.odb_connection.status()
+            self._status =  self._obd_status
+            self.engine_on = False
+            self._logger.debug('VEHICLE_SERVICE: Engine not running - Status:'+self._obd_status)
+            self.disconnect()
+            return False
+        self.nbc_read=0
+        for cmd,res in zip(cmds,results):
 
-            if res is not None:
+            if not res.is_null():
                 self.nbc_read +=1
-                self.values[cmd]=CMD_Value(cmd,res)
+                if cmd in self._request_commands :
+                    self.values[cmd]=CMD_Value(cmd,res)
             else:
                 self._logger.debug('VEHICLE SERVICE: ERROR ON OBD COMMAND:'+cmd.name)
+        if report.overrun or len(report.deferred) > 0 :
+            self._logger.info('VEHICLE_SERVICE: cycle '+str(report))
 
         # out['dtc'] = self.odb_connection.query(obd.commands.GET_DTC, force=True).value
         self._status = self._obd_status+'- data read'
         self.engine_on= True
         self._logger.debug('VEHICLE_SERVICE: Data received #commands:'+str(self.nbc_read))
+        if self._save_profile :
+            self.saveProfile()
         return True
 
+    def saveProfile(self):
+        profile=self.odb_connection.profile(self._vin)
+        if profile is not None :
+            self._logger.debug('VEHICLE_SERVICE: saving '+str(profile))
+            self._profiles.save(self.MAC_ADDRESS,profile)
+        self._save_profile=False
+
 
     def status(self):
         return (self._connected,self.engine_on)
@@ -351,35 +531,27 @@ class VehicleService(object):
         for cdm in self._default_commands.values():
             print(cdm.command)
 
-    def storeValues(self,fd):
-        out={}
-        out["timestamp"]=datetime.datetime.now().isoformat(' ')
-        out["engine_on"]=self.engine_on
-        values=[]
-        for cmd,val in self.values.items():
-            if val._genericType == 0:
-                res=(cmd.name,val._magnitude,val._unit)
-            else:
-                res=(cmd.name,str(val._magnitude))
-            values.append(res)
-        out["values"]=values
-        buf=json.dumps(out)
-        fd.write(buf)
-        fd.write('\n')
-        fd.flush()
+    def storeValues(self,log):
+        # log is a TelemetryLog, the values are written out by blocks
+        log.append(self.values.values(),self.engine_on)
 
 
 class CMD_Value:
 
-    def __init__(self,cmd,result):
+    def __init__(self,cmd,response):
         self._cmd= cmd.name
-        self._type=type(result)
-        if 'Quantity' in str(type(result)):
+        self._time=response.time
+        # physical values come as a number and a unit name, no pint Quantity is built
+        magnitude=response.magnitude
+        if magnitude is not None:
+            self._type=float
             self._genericType=0
-            self._magnitude=result.m
-            self._unit=str(result.u)
-            loc_log.debug("Qty cmd="+cmd.name+" value="+str(result))
+            self._magnitude=magnitude
+            self._unit=response.unit
+            loc_log.debug("Qty cmd=%s value=%s %s",cmd.name,magnitude,self._unit)
         else:
+            result=response.value
+            self._type=type(result)
             self._genericType=1
             self._magnitude=str(result)
             self._unit=None
@@ -417,7 +589,7 @@ def main():
         vs.dumpDefaultCMD()
         return
     if len(sys.argv) > 2 and sys.argv[2]  == "store" :
-        fd=open('/data/solidsense/obd_result.log','w')
+        log=TelemetryLog(LOG_DIR)
         store=True
     else:
         store=False
@@ -431,14 +603,14 @@ def main():
         while True:
             vs.read_data()
             if store :
-                vs.storeValues(fd)
+                vs.storeValues(log)
             vs.printValues()
             time.sleep(10.)
     except Exception as e :
         print("OBD read stopped by:",e)
         vs.disconnect()
     if store :
-        fd.close()
+        log.close()
     '''
     vs.fromMAC(sys.argv[1])
     try: